@@ -0,0 +1,142 @@
+import itertools
+import queue
+import threading
+import time
+from datetime import datetime
+
+from plan_ops import DAYS, slot_key
+from prefetch import MEAL_RANK
+
+# Pre-generated alternates for each unlocked slot of the current week, so
+# a 🎲 reroll pops one locally instead of waiting on the model.
+#
+# schedule(plan) tops up every unlocked slot holding fewer than `low`
+# candidates (locked slots are emptied). A filler thread gathers queued
+# slots and asks for `size` candidates each in one call per `batch_slots`
+# slots, tonight's dinner first. take() pops a candidate for a slot, skipping
+# any already in the week, and queues a refill once the slot runs low.
+# reset() drops everything when the week is regenerated; candidates from a
+# call that was in flight when their slot was dropped are thrown away.
+
+class AlternatePool:
+    def __init__(self, generate, size=3, low=2, batch_slots=6, gather=0.2):
+        self.generate = generate # [(day, meal_type, count, current name)] -> [[meal]] per slot; raises on failure
+        self.size = size
+        self.low = low
+        self.batch_slots = batch_slots
+        self.gather = gather # Seconds to wait for more slots to share a call
+        self.stats = {"hits": 0, "misses": 0, "calls": 0, "generated": 0, "dropped": 0, "failed": 0}
+        self._pools = {} # slot -> [meal]
+        self._epochs = {} # slot -> bumped whenever its pool is dropped
+        self._queued = set()
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._fill_loop, name="alternates-fill", daemon=True).start()
+
+    @property
+    def hit_rate(self):
+        asked = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / asked if asked else 0.0
+
+    def available(self, day_name, meal_type):
+        with self._lock:
+            return len(self._pools.get(slot_key(day_name, meal_type), []))
+
+    def wait_idle(self, timeout=10):
+        # True once every queued slot has been filled (or failed)
+        end = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._queued:
+                    return True
+            if time.monotonic() > end:
+                return False
+            time.sleep(0.01)
+
+    def schedule(self, plan, today=None):
+        today = today or datetime.now().strftime("%A")
+        start = DAYS.index(today) if today in DAYS else 0
+        for day in plan.get('days', []):
+            if day.get('day') not in DAYS:
+                continue
+            offset = (DAYS.index(day['day']) - start) % len(DAYS)
+            for m_type, meal in day.get('meals', {}).items():
+                key = slot_key(day['day'], m_type)
+                if meal.get('locked', False):
+                    with self._lock:
+                        self._drop(key)
+                    continue
+                # Today's breakfast and lunch are probably eaten already: go last
+                when = len(DAYS) if offset == 0 and m_type != 'dinner' else offset
+                self._top_up(day['day'], m_type, meal.get('name'), (when, MEAL_RANK.get(m_type, len(MEAL_RANK))))
+
+    def reset(self):
+        with self._lock:
+            for key in list(self._pools):
+                self._drop(key)
+            for key in list(self._queued):
+                self._epochs[key] = self._epochs.get(key, 0) + 1
+            self._queued.clear()
+
+    def take(self, day_name, meal_type, exclude=()):
+        # Next candidate for the slot not named in exclude, else None
+        key = slot_key(day_name, meal_type)
+        exclude = set(exclude)
+        with self._lock:
+            pool = self._pools.get(key, [])
+            while pool and pool[0].get('name') in exclude:
+                pool.pop(0)
+                self.stats["dropped"] += 1
+            meal = pool.pop(0) if pool else None
+            self.stats["hits" if meal else "misses"] += 1
+        self._top_up(day_name, meal_type, meal.get('name') if meal else None, (0, 0))
+        return meal
+
+    def _drop(self, key):
+        self.stats["dropped"] += len(self._pools.pop(key, []))
+        self._epochs[key] = self._epochs.get(key, 0) + 1
+        self._queued.discard(key)
+
+    def _top_up(self, day_name, meal_type, current, priority):
+        key = slot_key(day_name, meal_type)
+        with self._lock:
+            have = len(self._pools.get(key, []))
+            if have >= self.low or key in self._queued:
+                return
+            self._queued.add(key)
+            job = (day_name, meal_type, self.size - have, current, self._epochs.get(key, 0))
+        self._queue.put((priority, next(self._seq), job))
+
+    def _next_batch(self):
+        jobs = [self._queue.get()[2]]
+        while len(jobs) < self.batch_slots:
+            try:
+                jobs.append(self._queue.get(timeout=self.gather)[2])
+            except queue.Empty:
+                break
+        with self._lock:
+            # Dropped since they were queued: not wanted any more
+            return [j for j in jobs if self._epochs.get(slot_key(j[0], j[1]), 0) == j[4]]
+
+    def _fill_loop(self):
+        while True:
+            jobs = self._next_batch()
+            if not jobs:
+                continue
+            try:
+                lists = self.generate([j[:4] for j in jobs])
+                failed = False
+            except Exception:
+                lists, failed = [[] for _ in jobs], True
+            with self._lock:
+                self.stats["calls"] += 1
+                self.stats["failed"] += failed
+                for (day_name, meal_type, count, _, epoch), meals in zip(jobs, lists):
+                    key = slot_key(day_name, meal_type)
+                    if self._epochs.get(key, 0) != epoch:
+                        self.stats["dropped"] += len(meals)
+                        continue
+                    self._queued.discard(key)
+                    self._pools.setdefault(key, []).extend(meals[:count])
+                    self.stats["generated"] += len(meals[:count])
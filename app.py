@@ -1,355 +1,261 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
-from openai import OpenAI
-import json
-import random
-from datetime import datetime
+from llm_cache import LLMCache
+from llm import LLM
+from gateway import LLMGateway
+from planner import Planner, MealLocked, DEFAULT_FAMILY_ID, shopping_view
+from plan_ops import PlanWriter, DAYS, MEAL_TYPES
+from prefetch import RecipePrefetcher, has_recipe
+from alternates import AlternatePool
+from recipe_library import RecipeLibrary
+from family_cache import FamilyDocCache, load_members_snapshot, save_members_snapshot
+from metrics import Metrics, instrument_firestore
+from lazy import Background, Deferred
+from local_store import LocalStore, SyncWorker
+import os
+import time
 
 # --- 1. CONFIG ---
 st.set_page_config(page_title="Family OS", page_icon="🏡", layout="centered", initial_sidebar_state="collapsed")
+RUN_STARTED = time.perf_counter()
+# The family this deployment serves; `family_id` in secrets.toml overrides it
+FAMILY_ID = st.secrets["family_id"] if "family_id" in st.secrets else DEFAULT_FAMILY_ID
 
-# --- 2. DATABASE CONNECTION ---
 @st.cache_resource
-def get_db():
+def get_metrics():
+    return Metrics()
+
+metrics = get_metrics()
+
+# --- 2. CONNECTIONS ---
+# firebase_admin/openai imports and client setup are slow, so they run on
+# background threads (once per process) while the first screen is drawn.
+def connect_firestore(firebase_conf):
+    import firebase_admin
+    from firebase_admin import credentials, firestore
     if not firebase_admin._apps:
-        if "firebase" in st.secrets:
+        if firebase_conf:
             try:
-                key_dict = dict(st.secrets["firebase"])
+                key_dict = dict(firebase_conf)
                 if "\\n" in key_dict["private_key"]:
                     key_dict["private_key"] = key_dict["private_key"].replace("\\n", "\n")
                 cred = credentials.Certificate(key_dict)
-                firebase_admin.initialize_app(cred)
             except Exception as e:
-                st.error(f"❌ Secret Error: {e}")
-                return None
+                raise ValueError(f"Secret Error: {e}") from e
         else:
             try:
                 cred = credentials.Certificate("serviceAccountKey.json")
-                firebase_admin.initialize_app(cred)
-            except:
-                st.warning("⚠️ No database connection found.")
-                return None
+            except Exception as e:
+                raise FileNotFoundError("No database connection found.") from e
+        firebase_admin.initialize_app(cred)
     return firestore.client()
 
-db = get_db()
+def connect_openai(api_key):
+    from openai import OpenAI
+    # The client's own retries are off; the gateway owns them.
+    return OpenAI(api_key=api_key, max_retries=0)
 
-# --- 3. OPENAI SETUP ---
-if "OPENAI_API_KEY" in st.secrets:
-    client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-else:
-    client = OpenAI(api_key="sk-placeholder")
+@st.cache_resource
+def get_connections():
+    firebase_conf = dict(st.secrets["firebase"]) if "firebase" in st.secrets else None
+    api_key = st.secrets["OPENAI_API_KEY"] if "OPENAI_API_KEY" in st.secrets else "sk-placeholder"
+    return {
+        "firestore": Background(lambda: connect_firestore(firebase_conf), name="firestore-connect"),
+        "openai": Background(lambda: connect_openai(api_key), name="openai-connect"),
+    }
+
+connections = get_connections()
+
+# --- 3. WHO IS THIS? (no waiting on the database) ---
+# Known members come from the last saved snapshot; only a first-ever run
+# falls through and waits for Firestore (section 8).
+if not st.session_state.get('user'):
+    snapshot = load_members_snapshot()
+    if snapshot:
+        st.title("🏡 Who is this?")
+        cols = st.columns(len(snapshot))
+        for i, m in enumerate(snapshot):
+            if cols[i].button(f"👤\n{m['name']}", use_container_width=True):
+                st.session_state['user'] = m
+                st.rerun()
+        st.session_state['last_run_ms'] = (time.perf_counter() - RUN_STARTED) * 1000
+        st.stop()
+
+# --- 4. DATABASE ---
+# Reads and writes go to a copy on this machine; a background worker syncs
+# it with Firestore (see local_store.py), so a slow or missing connection
+# never stalls the page
+def connect_db():
+    return instrument_firestore(connections["firestore"].result(), metrics)
+
+@st.cache_resource
+def get_store():
+    store = LocalStore()
+    return store, SyncWorker(store, connect_db)
+
+db, sync = get_store()
+
+# --- 5. OPENAI SETUP ---
+# Built on first use: sessions that never call the model never wait for it
+client = Deferred(lambda: connections["openai"].result())
+
+@st.cache_resource
+def get_llm_gateway():
+    # Shared by every session: one concurrency limit and breaker per process
+    return LLMGateway(client)
+
+@st.cache_resource
+def get_llm_cache():
+    return LLMCache()
+
+llm_cache = get_llm_cache()
+llm_gateway = get_llm_gateway()
+llm = LLM(client, cache=llm_cache, metrics=metrics, gateway=llm_gateway)
+
+# --- 6. DATA LOGIC ---
+@st.cache_resource
+def get_family_cache():
+    # One listener per process; every session reads from it
+    try:
+        return FamilyDocCache(db.collection("families").document(FAMILY_ID)).start()
+    except Exception as e:
+        st.error(f"Data Fetch Error: {e}")
+        return None
+
+family_cache = get_family_cache()
 
-# --- 4. DATA LOGIC ---
-@st.cache_data(ttl=600)
 def get_data_cached():
-    if db is None: return {}
+    if family_cache is None: return {}
     try:
-        doc = db.collection("families").document("fam_8829_xyz").get()
-        if doc.exists:
-            return doc.to_dict()
-        else:
-            default = {
-                "members": [{"name": "Dad", "role": "parent"}, {"name": "Kid", "role": "child"}],
-                "kitchen_profile": {"current_inventory": ["Pasta", "Tomato Sauce"]},
-                "current_week_plan": {}
-            }
-            db.collection("families").document("fam_8829_xyz").set(default)
-            return default
+        data = family_cache.get()
+        if data is not None:
+            return data
+        default = {
+            "members": [{"name": "Dad", "role": "parent"}, {"name": "Kid", "role": "child"}],
+            "kitchen_profile": {"current_inventory": ["Pasta", "Tomato Sauce"]},
+            "current_week_plan": {}
+        }
+        db.collection("families").document(FAMILY_ID).set(default)
+        return default
     except Exception as e:
         st.error(f"Data Fetch Error: {e}")
         return {}
 
 def force_refresh():
-    get_data_cached.clear()
+    # No read here: wait briefly for the listener to deliver our own write
+    if family_cache is not None:
+        family_cache.wait_for_update(st.session_state.get('family_version', 0))
     if 'family_data' in st.session_state:
         del st.session_state['family_data']
-    st.session_state['family_data'] = get_data_cached()
-
-# --- 5. AGENT LOGIC ---
-ALL_STYLES = [
-    "Jamie Oliver 15-Minute Meals (Quick, fresh, rustic)",
-    "Ottolenghi (Middle Eastern, veg-heavy, complex spices)",
-    "Italian Nonna (Classic pasta, slow sauces, comfort)",
-    "Mexican Street Food (Tacos, fresh salsas, grilled meats)",
-    "Japanese Izakaya (Rice bowls, teriyaki, miso, clean flavors)",
-    "Modern British (Roasts, pies, seasonal veg)",
-    "Thai Street Food (Pad Thai, curries, zesty salads)",
-    "Mediterranean Diet (Grilled fish, olive oil, salads)",
-    "American Diner (Burgers, mac n cheese, ribs)",
-    "French Bistro (Steak frites, quiches, rich sauces)",
-    "Indian Curry House (Rich curries, naan, tandoori)",
-    "Greek Taverna (Souvlaki, fresh salads, feta)"
-]
-
-def get_style_preferences(family_data):
-    prefs = family_data.get('style_preferences', {})
-    favorites = [s for s in ALL_STYLES if prefs.get(s, 0) > 2]
-    disliked = [s for s in ALL_STYLES if prefs.get(s, 0) < -1]
-    return favorites, disliked
-
-# --- CORE GENERATOR (Used for Week & Day) ---
-def generate_week_plan():
-    data = get_data_cached()
-    # 1. Capture Lock State
-    current_plan = data.get('current_week_plan', {})
-    locked_meals = {} # Store locked meal objects to restore later
-    
-    if current_plan:
-        for day in current_plan.get('days', []):
-            for m_type, m_data in day.get('meals', {}).items():
-                if m_data.get('locked', False):
-                    # Save the whole meal object (including recipe details if they exist)
-                    locked_meals[f"{day['day']}_{m_type}"] = m_data
-
-    # 2. Prepare Prompt
-    favorites, disliked = get_style_preferences(data)
-    family_count = len(data.get('members', []))
-    
-    prompt = f"""
-    Plan a 7-day menu (Mon-Sun) for {family_count} PEOPLE.
-    
-    CRITICAL RULES:
-    1. INGREDIENTS: You MUST include specific quantities scaled for {family_count} people. 
-       (e.g., "500g Beef Mince", "4 Burger Buns", "1 tbsp Oil"). DO NOT just say "Beef".
-    2. VARIETY: Do not repeat dinner cuisines.
-    3. BREAKFAST: Western/UK Standard.
-    4. LUNCH: Light/Packed.
-    
-    PREFERENCES:
-    - LOVES: {", ".join(favorites) if favorites else "Any"}
-    - HATES: {", ".join(disliked) if disliked else "None"}
-    - STYLES: {", ".join(ALL_STYLES)}
-    
-    OUTPUT JSON:
-    {{
-      "days": [
-        {{
-          "day": "Monday",
-          "meals": {{
-            "breakfast": {{ "name": "...", "ingredients": ["2 slices Toast", "2 Eggs"], "method": "...", "style_tag": "Western" }},
-            "lunch": {{ "name": "...", "ingredients": ["..."], "method": "...", "style_tag": "Packed" }},
-            "dinner": {{ "name": "...", "ingredients": ["500g Pasta", "400g Sauce"], "method": "...", "style_tag": "Italian" }}
-          }}
-        }}
-      ]
-    }}
-    """
-    
+    load_family_data()
+
+def load_family_data():
+    version = family_cache.version if family_cache else 0
+    if 'family_data' in st.session_state and version <= st.session_state.get('local_edit_version', -1):
+        return # Our own edit hasn't echoed back yet; keep the local model
+    if 'family_data' not in st.session_state or version != st.session_state.get('family_version'):
+        st.session_state['family_data'] = get_data_cached()
+        st.session_state['family_version'] = version
+        # Lets the next cold start draw the member picker straight away
+        save_members_snapshot(st.session_state['family_data'].get('members'))
+
+def set_local_plan(plan):
+    # Apply an edit to this session's plan model without waiting for the listener
+    st.session_state['family_data']['current_week_plan'] = plan
+    st.session_state['local_edit_version'] = family_cache.version if family_cache else 0
+
+def session_plan():
+    return st.session_state.get('family_data', {}).get('current_week_plan') or get_data_cached().get('current_week_plan', {})
+
+# --- 7. AGENT LOGIC ---
+# The logic lives in planner.py; these wrappers add the Streamlit side
+@st.cache_resource
+def get_prefetcher():
+    # Its own Planner: background threads must not touch Streamlit state
+    background = Planner(db, llm, family_id=FAMILY_ID)
+    return RecipePrefetcher(
+        background.fetch_recipe,
+        lambda: PlanWriter(db, background.fam_ref),
+    )
+
+prefetcher = get_prefetcher()
+@st.cache_resource
+def get_recipe_library():
+    # Every generated meal, so rerolls can skip the model
+    return RecipeLibrary()
+
+recipe_library = get_recipe_library()
+@st.cache_resource
+def get_price_book(path="price_book.csv"):
+    # Read (and numpy imported) the first time a list is priced, not at start-up
+    def load():
+        from prices import PriceBook
+        return PriceBook.from_csv(path)
+    return Deferred(load) if os.path.exists(path) else None
+
+price_book = get_price_book()
+@st.cache_resource
+def get_alternates():
+    # Refilled on a background thread by its own Planner, like the prefetcher
+    pool = AlternatePool(Planner(db, llm, family_id=FAMILY_ID, compact=True).generate_alternates)
+    pool.schedule(get_data_cached().get('current_week_plan', {}))
+    return pool
+
+alternates = get_alternates()
+planner = Planner(db, llm, family_id=FAMILY_ID, load=get_data_cached, prefetcher=prefetcher, library=recipe_library,
+                  compact=True, prices=price_book, alternates=alternates)
+
+def record_write():
+    if planner.last_write:
+        st.session_state['last_plan_write'] = planner.last_write
+
+def generate_week_plan(on_day=None, on_meal=None):
     try:
-        res = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={ "type": "json_object" }
-        )
-        new_plan = json.loads(res.choices[0].message.content)
-        
-        # 3. Restore Locked Meals (The Merge)
-        for day in new_plan.get('days', []):
-            for m_type in ['breakfast', 'lunch', 'dinner']:
-                key = f"{day['day']}_{m_type}"
-                if key in locked_meals:
-                    # Overwrite the AI's new suggestion with the old locked meal
-                    day['meals'][m_type] = locked_meals[key]
-        
-        db.collection("families").document("fam_8829_xyz").update({"current_week_plan": new_plan})
+        planner.generate_week_plan(on_day=on_day, on_meal=on_meal)
     except Exception as e:
         st.error(f"AI Error: {e}")
 
-# --- SINGLE MEAL REGENERATOR ---
-def regenerate_single_meal(day_name, meal_type):
-    data = get_data_cached()
-    family_count = len(data.get('members', []))
-    
-    # Check if locked
-    current_plan = data.get('current_week_plan', {})
-    for day in current_plan.get('days', []):
-        if day['day'] == day_name:
-            if day['meals'][meal_type].get('locked', False):
-                st.toast("🔒 Cannot regenerate a locked meal!")
-                return # Abort
-
-    prompt = f"""
-    Generate ONE single meal idea.
-    Type: {meal_type.upper()}
-    Day: {day_name}
-    Family Size: {family_count} people.
-    
-    RULES:
-    1. Ingredients MUST have quantities (e.g. "500g Chicken").
-    2. If Dinner, pick a fun style from: {", ".join(ALL_STYLES)}.
-    
-    OUTPUT JSON:
-    {{
-      "name": "...", 
-      "ingredients": ["Qty Item", "Qty Item"], 
-      "method": "...", 
-      "style_tag": "..." 
-    }}
-    """
-    
+def regenerate_single_meal(day_name, meal_type, fresh=False):
     try:
-        res = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={ "type": "json_object" }
-        )
-        new_meal = json.loads(res.choices[0].message.content)
-        
-        # Save to specific slot
-        for day in current_plan.get('days', []):
-            if day['day'] == day_name:
-                day['meals'][meal_type] = new_meal
-                break
-        
-        db.collection("families").document("fam_8829_xyz").update({"current_week_plan": current_plan})
-        
+        new_plan = planner.regenerate_single_meal(day_name, meal_type, plan=session_plan(), fresh=fresh)
+        record_write()
+        return new_plan
+    except MealLocked:
+        st.toast("🔒 Cannot regenerate a locked meal!")
     except Exception as e:
         st.error(f"Error: {e}")
 
-# --- SINGLE DAY REGENERATOR ---
-def regenerate_day(day_name):
-    data = get_data_cached()
-    family_count = len(data.get('members', []))
-    current_plan = data.get('current_week_plan', {})
-    
-    # Find the specific day object
-    target_day_idx = next((i for i, d in enumerate(current_plan.get('days', [])) if d['day'] == day_name), None)
-    if target_day_idx is None: return
-
-    # Preserve locks for this day
-    day_data = current_plan['days'][target_day_idx]
-    locked_meals = {}
-    for m_type, m_data in day_data.get('meals', {}).items():
-        if m_data.get('locked', False):
-            locked_meals[m_type] = m_data
-            
-    prompt = f"""
-    Generate 3 meals (Breakfast, Lunch, Dinner) for {day_name}.
-    Family Size: {family_count}.
-    Ingredients MUST have specific quantities.
-    
-    OUTPUT JSON:
-    {{
-       "breakfast": {{ "name": "...", "ingredients": ["..."], "method": "...", "style_tag": "..." }},
-       "lunch": {{ "name": "...", "ingredients": ["..."], "method": "...", "style_tag": "..." }},
-       "dinner": {{ "name": "...", "ingredients": ["..."], "method": "...", "style_tag": "..." }}
-    }}
-    """
-    
+def regenerate_day(day_name, on_meal=None):
     try:
-        res = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={ "type": "json_object" }
-        )
-        new_meals = json.loads(res.choices[0].message.content)
-        
-        # Merge logic (restore locks)
-        for m_type, m_data in new_meals.items():
-            if m_type in locked_meals:
-                new_meals[m_type] = locked_meals[m_type]
-        
-        # Save
-        current_plan['days'][target_day_idx]['meals'] = new_meals
-        db.collection("families").document("fam_8829_xyz").update({"current_week_plan": current_plan})
-        
+        planner.regenerate_day(day_name, plan=session_plan(), on_meal=on_meal)
+        record_write()
     except Exception as e:
         st.error(f"Error: {e}")
 
-# --- RECIPE GENERATOR ---
-def generate_recipe_instructions(meal_name, ingredients, style):
-    prompt = f"""
-    Write a cooking guide for "{meal_name}".
-    Style: {style}
-    Ingredients available: {", ".join(ingredients)}
-    
-    OUTPUT JSON:
-    {{
-        "steps": ["Step 1...", "Step 2..."],
-        "tips": "Chef's secret tip..."
-    }}
-    Provide 5-8 concise steps.
-    """
+def generate_recipe_instructions(meal_name, ingredients, style, on_step=None):
     try:
-        res = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={ "type": "json_object" }
-        )
-        return json.loads(res.choices[0].message.content)
-    except:
-        return {"steps": ["Could not generate recipe."], "tips": ""}
+        return {**planner.fetch_recipe(meal_name, ingredients, style, on_step=on_step), "for_meal": meal_name}
+    except Exception as e:
+        st.toast(f"Couldn't write the recipe: {e}")
 
 def save_recipe_to_db(day_name, meal_type, recipe_data):
-    data = get_data_cached()
-    plan = data.get('current_week_plan', {})
-    for day in plan.get('days', []):
-        if day['day'] == day_name:
-            day['meals'][meal_type]['recipe_details'] = recipe_data
-            break
-    db.collection("families").document("fam_8829_xyz").update({"current_week_plan": plan})
-
-# --- SHOPPING ---
-def generate_shopping_list(plan):
-    all_ing = []
-    for day in plan.get('days', []):
-        if 'meals' in day:
-            for m in day['meals'].values():
-                all_ing.extend(m.get('ingredients', []))
-                
-    prompt = f"""
-    1. Consolidate these ingredients: {", ".join(all_ing)}
-    2. Sum up quantities (e.g. 500g + 500g = 1kg Beef).
-    3. Estimate UK Price (GBP).
-    
-    JSON: {{ "items": [ {{ "item": "Beef Mince", "quantity": "1kg", "est_price": 5.50 }} ] }}
-    """
-    try:
-        res = client.chat.completions.create(
-            model="gpt-4o", 
-            messages=[{"role": "user", "content": prompt}],
-            response_format={ "type": "json_object" }
-        )
-        return json.loads(res.choices[0].message.content)['items']
-    except:
-        return []
-
-def calculate_comparison(items):
-    if not items: return []
-    total = sum(i['est_price'] for i in items)
-    index = { "Waitrose": 1.22, "Sainsbury's": 1.0, "Tesco": 0.96, "Asda": 0.92, "Aldi": 0.83 }
-    return sorted([{"store": s, "total": total * m} for s, m in index.items()], key=lambda x: x['total'])
+    new_plan = planner.save_recipe(day_name, meal_type, recipe_data, plan=session_plan())
+    record_write()
+    return new_plan
 
 def rate_meal(name, rating, user, style):
-    db.collection("families").document("fam_8829_xyz").collection("meal_history").add({
-        "meal": name, "rating": rating, "user": user, "style": style, "date": datetime.now().isoformat()
-    })
-    
-    fam_ref = db.collection("families").document("fam_8829_xyz")
-    data = get_data_cached() 
-    prefs = data.get("style_preferences", {})
-    matched = next((s for s in ALL_STYLES if style.split(" ")[0] in s), None)
-    if matched:
-        score = prefs.get(matched, 0)
-        if rating == "like": prefs[matched] = score + 1
-        if rating == "dislike": prefs[matched] = score - 1
-        fam_ref.update({"style_preferences": prefs})
+    planner.rate_meal(name, rating, user, style)
 
 def toggle_lock(day_name, meal_type):
-    data = get_data_cached()
-    plan = data.get('current_week_plan', {})
-    for d in plan.get('days', []):
-        if d['day'] == day_name:
-            d['meals'][meal_type]['locked'] = not d['meals'][meal_type].get('locked', False)
-    db.collection("families").document("fam_8829_xyz").update({"current_week_plan": plan})
+    new_plan = planner.toggle_lock(day_name, meal_type, plan=session_plan())
+    record_write()
+    return new_plan
 
 
-# --- 6. INITIALIZE STATE ---
-if 'family_data' not in st.session_state:
-    st.session_state['family_data'] = get_data_cached()
+# --- 8. INITIALIZE STATE ---
+# Every rerun picks up the listener's latest copy; this is a memory read
+load_family_data()
 
-# --- 7. AUTH SCREEN ---
+# --- 9. AUTH SCREEN ---
 data = st.session_state['family_data']
 if 'user' not in st.session_state or not st.session_state['user']:
     st.title("🏡 Who is this?")
@@ -364,14 +270,21 @@ if 'user' not in st.session_state or not st.session_state['user']:
         if st.button("Retry"): force_refresh(); st.rerun()
     st.stop()
 
-# --- 8. MAIN APP ---
-user = st.session_state['user']
+# --- 10. MAIN APP ---
+# A pick from the snapshot carries only name/role; swap in the full record
+user = next((m for m in data.get('members', []) if m.get('name') == st.session_state['user'].get('name')),
+            st.session_state['user'])
 c1, c2 = st.columns([3,1])
 with c1: st.title(f"Hi, {user['name']}!")
 with c2: 
     if st.button("Logout"): 
         st.session_state['user'] = None
         st.rerun()
+if not sync.online:
+    waiting = db.stats()['pending']
+    st.caption("⏳ Offline: showing the copy on this device" + (f"; {waiting} change(s) waiting to sync." if waiting else "."))
+elif family_cache is not None and family_cache.is_stale:
+    st.caption("⏳ Live sync is reconnecting; showing the last copy we have.")
 
 # CHILD VIEW
 if user.get('role') == 'child':
@@ -393,11 +306,91 @@ if user.get('role') == 'child':
 # PARENT VIEW
 else:
     t1, t2, t3 = st.tabs(["📅 Plan", "🛒 Shop", "⚙️ Admin"])
+
+    def local_meal(d_name, m_type):
+        plan = st.session_state['family_data'].get('current_week_plan', {})
+        day = next((d for d in plan.get('days', []) if d['day'] == d_name), None)
+        return day.get('meals', {}).get(m_type) if day else None
+
+    @st.fragment
+    def meal_card(d_name, m_type):
+        # Each card reruns on its own: a click redraws this card, not the page.
+        # Rerolls change the ingredients, so they redraw the page for the Shop tab
+        card_started = time.perf_counter()
+        m_data = local_meal(d_name, m_type)
+        if m_data is None: return
+
+        # Header Row: Name + Controls
+        r1_c1, r1_c2, r1_c3, r1_c4 = st.columns([6, 1, 1, 1])
+        r1_c1.write(f"**{m_data['name']}**")
+        
+        is_locked = m_data.get('locked', False)
+        
+        # Lock Button
+        if r1_c2.button("🔒" if is_locked else "🔓", key=f"l_{d_name}_{m_type}"):
+             set_local_plan(toggle_lock(d_name, m_type))
+             st.rerun(scope="fragment")
+             
+        # Regenerate Single Meal Button (Only if not locked)
+        if not is_locked:
+            if r1_c3.button("🎲", help="Reroll this meal", key=f"rr_{d_name}_{m_type}"):
+                with st.spinner("Rerolling dish..."):
+                    new_plan = regenerate_single_meal(d_name, m_type)
+                    if new_plan: set_local_plan(new_plan)
+                    st.rerun()
+            if r1_c4.button("✨", help="Something new (ask the chef)", key=f"rn_{d_name}_{m_type}"):
+                with st.spinner("Inventing a new dish..."):
+                    new_plan = regenerate_single_meal(d_name, m_type, fresh=True)
+                    if new_plan: set_local_plan(new_plan)
+                    st.rerun()
+        
+        st.caption(m_data.get('method', ''))
+        st.text(f"Ing: {', '.join(m_data.get('ingredients', []))}")
+        
+        # Recipe
+        if has_recipe(m_data):
+            with st.expander("👨‍🍳 Method (Step-by-Step)", expanded=False):
+                details = m_data['recipe_details']
+                for idx, step in enumerate(details.get('steps', [])):
+                    st.write(f"**{idx+1}.** {step}")
+                if details.get('tips'):
+                    st.info(f"💡 **Tip:** {details['tips']}")
+        else:
+            if st.button("👨‍🍳 Get Recipe", key=f"rec_{d_name}_{m_type}"):
+                with st.spinner("Writing recipe..."):
+                    steps_box = st.container()
+                    # Prefetch may already have it; only ask the model if not
+                    details = prefetcher.take(d_name, m_type, m_data) or generate_recipe_instructions(
+                        m_data['name'], 
+                        m_data.get('ingredients', []), 
+                        m_data.get('style_tag', 'General'),
+                        on_step=lambda idx, step: steps_box.write(f"**{idx+1}.** {step}")
+                    )
+                    if details:
+                        set_local_plan(save_recipe_to_db(d_name, m_type, details))
+                        st.rerun(scope="fragment")
+
+        # Ratings
+        b1, b2 = st.columns(2)
+        if b1.button("👍", key=f"u_{d_name}_{m_type}"):
+             rate_meal(m_data['name'], "like", user['name'], m_data.get('style_tag', 'General'))
+             st.toast("Saved!")
+        if b2.button("👎", key=f"d_{d_name}_{m_type}"):
+             rate_meal(m_data['name'], "dislike", user['name'], m_data.get('style_tag', 'General'))
+             st.toast("Noted")
+        st.session_state['last_card_ms'] = (time.perf_counter() - card_started) * 1000
     
     with t1:
         if st.button("⚡ Generate Week (Respects Locks)", type="primary"):
             with st.spinner("Chef is cooking..."):
-                generate_week_plan()
+                # One placeholder per slot, filled the moment its meal streams in
+                live = {}
+                for d_name in DAYS:
+                    box = st.expander(f"**{d_name}**", expanded=True)
+                    live.update({(d_name, m): box.empty() for m in MEAL_TYPES})
+                def show_meal(d_name, m_type, meal):
+                    live[(d_name, m_type)].write(f"{m_type.title()}: **{meal.get('name', '...')}**")
+                generate_week_plan(on_meal=show_meal)
                 force_refresh()
                 st.rerun()
         
@@ -409,86 +402,48 @@ else:
                     # REGENERATE DAY BUTTON
                     if st.button(f"🔄 Regenerate {day['day']}", key=f"regen_day_{day['day']}"):
                          with st.spinner("Rethinking today..."):
-                             regenerate_day(day['day'])
+                             live = {m: st.empty() for m in MEAL_TYPES}
+                             regenerate_day(day['day'], on_meal=lambda d_name, m_type, meal: live[m_type].write(
+                                 f"{m_type.title()}: **{meal.get('name', '...')}**"))
                              force_refresh()
                              st.rerun()
 
                     tb, tl, td = st.tabs(["Breakfast", "Lunch", "Dinner"])
-                    
-                    def render(m_type, m_data, d_name):
-                        # Header Row: Name + Controls
-                        r1_c1, r1_c2, r1_c3 = st.columns([6, 1, 1])
-                        r1_c1.write(f"**{m_data['name']}**")
-                        
-                        is_locked = m_data.get('locked', False)
-                        
-                        # Lock Button
-                        if r1_c2.button("🔒" if is_locked else "🔓", key=f"l_{d_name}_{m_type}"):
-                             toggle_lock(d_name, m_type)
-                             force_refresh()
-                             st.rerun()
-                             
-                        # Regenerate Single Meal Button (Only if not locked)
-                        if not is_locked:
-                            if r1_c3.button("🎲", help="Reroll this meal", key=f"rr_{d_name}_{m_type}"):
-                                with st.spinner("Rerolling dish..."):
-                                    regenerate_single_meal(d_name, m_type)
-                                    force_refresh()
-                                    st.rerun()
-                        
-                        st.caption(m_data.get('method', ''))
-                        st.text(f"Ing: {', '.join(m_data.get('ingredients', []))}")
-                        
-                        # Recipe
-                        if 'recipe_details' in m_data:
-                            with st.expander("👨‍🍳 Method (Step-by-Step)", expanded=False):
-                                details = m_data['recipe_details']
-                                for idx, step in enumerate(details.get('steps', [])):
-                                    st.write(f"**{idx+1}.** {step}")
-                                if details.get('tips'):
-                                    st.info(f"💡 **Tip:** {details['tips']}")
-                        else:
-                            if st.button("👨‍🍳 Get Recipe", key=f"rec_{d_name}_{m_type}"):
-                                with st.spinner("Writing recipe..."):
-                                    details = generate_recipe_instructions(
-                                        m_data['name'], 
-                                        m_data.get('ingredients', []), 
-                                        m_data.get('style_tag', 'General')
-                                    )
-                                    save_recipe_to_db(d_name, m_type, details)
-                                    force_refresh()
-                                    st.rerun()
-
-                        # Ratings
-                        b1, b2 = st.columns(2)
-                        if b1.button("👍", key=f"u_{d_name}_{m_type}"):
-                             rate_meal(m_data['name'], "like", user['name'], m_data.get('style_tag', 'General'))
-                             st.toast("Saved!")
-                        if b2.button("👎", key=f"d_{d_name}_{m_type}"):
-                             rate_meal(m_data['name'], "dislike", user['name'], m_data.get('style_tag', 'General'))
-                             st.toast("Noted")
-                    
-                    with tb: render('breakfast', day['meals']['breakfast'], day['day'])
-                    with tl: render('lunch', day['meals']['lunch'], day['day'])
-                    with td: render('dinner', day['meals']['dinner'], day['day'])
+                    with tb: meal_card(day['day'], 'breakfast')
+                    with tl: meal_card(day['day'], 'lunch')
+                    with td: meal_card(day['day'], 'dinner')
 
     with t2:
+        # Kept up to date by every plan edit; the button catches up lists
+        # made before that, or after edits elsewhere
         if st.button("📝 Calculate List"):
             with st.spinner("Checking prices..."):
-                items = generate_shopping_list(data['current_week_plan'])
-                comp = calculate_comparison(items)
-                db.collection("families").document("fam_8829_xyz").update({"shopping_list": items, "price_comparison": comp})
+                try:
+                    planner.update_shopping_list(data['current_week_plan'])
+                    updated = True
+                except Exception as e:
+                    st.error(f"Error: {e}")
+                    updated = False
+            if updated:
                 force_refresh()
                 st.rerun()
-        
-        comp = data.get('price_comparison', [])
-        items = data.get('shopping_list', [])
+
+        # The listener's copy: this session's model only tracks plan edits
+        items, comp, split, unlisted = shopping_view(get_data_cached() or data, price_book)
+        if unlisted:
+            st.warning(f"Couldn't price {len(unlisted)} item(s), add them by hand: " + ", ".join(unlisted))
         
         if comp and items:
             best = comp[0]
             sains = next((x for x in comp if x['store'] == "Sainsbury's"), None)
             if sains and best['store'] != "Sainsbury's":
                 st.info(f"💡 Swap Sainsbury's for **{best['store']}** to save **£{sains['total'] - best['total']:.2f}**")
+            if split and len(split['stores']) > 1:
+                st.info(f"🛒 Split the shop between **{' & '.join(split['stores'])}** for £{split['total']:.2f}, "
+                        f"another **£{split['saving']:.2f}** off")
+                with st.expander("What to buy where"):
+                    for store, names in split['items'].items():
+                        st.write(f"**{store}:** " + ", ".join(names))
             
             for s in comp:
                 st.progress(min(s['total'] / (comp[-1]['total']*1.1), 1.0))
@@ -498,7 +453,39 @@ else:
             st.write(f"**Your Items ({len(items)})**")
             for i in items:
                 label = f"{i.get('quantity', '')} {i['item']}"
-                st.checkbox(label, key=i['item'])
+                st.checkbox(label, key=f"shop_{i['item']}_{i.get('quantity', '')}")
                 
     with t3:
-        st.json(data.get('members', []))
\ No newline at end of file
+        st.json(data.get('members', []))
+        cache_stats = llm_cache.stats()
+        st.caption(f"LLM cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['entries']} entries)")
+        gw = llm_gateway.stats
+        st.caption(f"AI gateway: {gw['calls']} calls, {gw['retries']} retries, {gw['timeouts']} timeouts, "
+                   f"{gw['hedges']} hedged ({gw['hedge_wins']} won), {gw['rejected']} rejected"
+                   + (" · circuit OPEN" if llm_gateway.circuit_open else ""))
+        lib = recipe_library.stats()
+        st.caption(f"Recipe library: {lib['meals']} meals, {lib['hits']} rerolls served / {lib['misses']} sent to the model")
+        store_stats = db.stats()
+        st.caption(f"Local store: {store_stats['docs']} docs, {store_stats['pending']} change(s) waiting, "
+                   f"{sync.stats['pushed']} pushed, {sync.stats['conflicts']} conflict(s) merged, {store_stats['failed']} failed"
+                   + (f" · last error: {sync.last_error}" if sync.last_error else ""))
+        alt = alternates.stats
+        st.caption(f"Reroll alternates: {alt['hits']} served / {alt['misses']} missed ({alternates.hit_rate:.0%}), "
+                   f"{alt['generated']} made in {alt['calls']} call(s), {alt['dropped']} thrown away")
+        pf = prefetcher.stats
+        st.caption(f"Recipe prefetch: {pf['fetched']} fetched, {pf['cancelled']} cancelled, {pf['failed']} failed in {pf['writes']} write(s)")
+        if 'last_run_ms' in st.session_state:
+            st.caption(f"Last full page run: {st.session_state['last_run_ms']:.0f} ms · last card redraw: {st.session_state.get('last_card_ms', 0):.1f} ms")
+        last_write = st.session_state.get('last_plan_write')
+        if last_write:
+            st.caption(f"Last plan write: {last_write['bytes']:,} bytes for {last_write['edits']} edit(s) (whole plan: {last_write['full_plan_bytes']:,} bytes)")
+
+        st.subheader("📈 Calls")
+        rows = metrics.summary()
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+            st.download_button("Export (JSONL)", metrics.to_jsonl(), file_name="family_os_metrics.jsonl")
+        else:
+            st.caption("No calls recorded yet.")
+
+st.session_state['last_run_ms'] = (time.perf_counter() - RUN_STARTED) * 1000
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from gateway import LLMGateway
+from lazy import lazy_module
+from llm import LLM
+from local_store import VERSION_FIELD
+from metrics import percentile
+from planner import Planner
+
+# Imported on first use, so importing this module stays cheap
+firestore = lazy_module("firebase_admin.firestore")
+
+# Plans next week for many families at once, with no Streamlit: the same
+# Planner.generate_week_plan the app runs (locked meals kept, style
+# preferences and member count in the prompt), one family per worker.
+#
+# Plan saves are queued and committed BATCH_SIZE families at a time. A
+# family counts as done once its batch has committed; the checkpoint file
+# records those, so a rerun after a crash or Ctrl-C carries on with the
+# rest. Failed families are left out of the checkpoint and retried. Each
+# save bumps the family's _version, as the app's sync worker does, so open
+# sessions on a LocalStore take the new week.
+#
+#   python batch_plan.py --all --workers 8          # every family (serviceAccountKey.json, OPENAI_API_KEY)
+#   python batch_plan.py fam_a fam_b                # just these
+#   python batch_plan.py --all --emulator           # FIRESTORE_EMULATOR_HOST, seeded by seed_db.py
+#   python batch_plan.py --fake 200 --workers 16    # in-memory Firestore + OpenAI, seeded here
+
+CHECKPOINT = "batch_checkpoint.json"
+BATCH_SIZE = 20 # Families per commit; a plan is ~15KB, well under the 10MiB request limit
+
+class Checkpoint:
+    def __init__(self, path=CHECKPOINT, restart=False):
+        self.path = path
+        self.done = set()
+        if path and not restart and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = set(json.load(f).get("done", []))
+        self._lock = threading.Lock()
+
+    def mark(self, family_ids):
+        with self._lock:
+            self.done |= set(family_ids)
+            if self.path:
+                # Written aside and renamed, so a crash mid-write keeps the old file
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"done": sorted(self.done), "updated": time.time()}, f)
+                os.replace(tmp, self.path)
+
+
+class BatchWriter:
+    # Planner's save hook: queues (fam_ref, updates) and commits them
+    # `size` at a time in one batch
+    def __init__(self, db, size=BATCH_SIZE, on_commit=None, on_error=None):
+        self.db = db
+        self.size = size
+        self.on_commit = on_commit # (family ids) after a batch lands
+        self.on_error = on_error # (family ids, error) when one doesn't
+        self.commits = 0
+        self._queue = []
+        self._lock = threading.Lock()
+
+    def __call__(self, fam_ref, updates):
+        with self._lock:
+            self._queue.append((fam_ref, updates))
+            if len(self._queue) < self.size:
+                return
+            queued, self._queue = self._queue, []
+        self._commit(queued)
+
+    def flush(self):
+        with self._lock:
+            queued, self._queue = self._queue, []
+        if queued:
+            self._commit(queued)
+
+    def _commit(self, queued):
+        ids = [ref.id for ref, _ in queued]
+        batch = self.db.batch()
+        for ref, updates in queued:
+            batch.update(ref, {**updates, VERSION_FIELD: firestore.Increment(1)})
+        try:
+            batch.commit()
+        except Exception as e:
+            if self.on_error:
+                self.on_error(ids, e)
+            return
+        self.commits += 1
+        if self.on_commit:
+            self.on_commit(ids)
+
+
+def list_families(db):
+    return [ref.id for ref in db.collection("families").list_documents()]
+
+def run(db, llm, family_ids, workers=8, batch_size=BATCH_SIZE, checkpoint=None, **planner_kwargs):
+    # Plans every family not already in the checkpoint -> report dict
+    checkpoint = checkpoint or Checkpoint(None)
+    todo = [f for f in family_ids if f not in checkpoint.done]
+    planned, failed, timings = [], {}, []
+    lock = threading.Lock()
+
+    def committed(ids):
+        checkpoint.mark(ids)
+        with lock:
+            planned.extend(ids)
+
+    def lost(ids, error):
+        with lock:
+            failed.update({f: f"write failed: {error}" for f in ids})
+
+    writer = BatchWriter(db, batch_size, committed, lost)
+
+    def plan(family_id):
+        start = time.perf_counter()
+        # Days in one call: the pool already keeps `workers` calls in flight
+        Planner(db, llm, family_id=family_id, parallel=False, save=writer, **planner_kwargs).generate_week_plan()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(plan, f): f for f in todo}
+        for fut in as_completed(futures):
+            try:
+                timings.append(fut.result())
+            except Exception as e:
+                failed[futures[fut]] = f"{type(e).__name__}: {e}"
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    return {
+        "families": len(family_ids), "skipped": len(family_ids) - len(todo), "planned": len(planned),
+        "failed": failed, "commits": writer.commits, "elapsed_s": elapsed,
+        "per_min": len(planned) / elapsed * 60 if elapsed else 0.0,
+        "p50_s": percentile(timings, 50), "p95_s": percentile(timings, 95),
+    }
+
+def report(result, llm_calls=None):
+    line = (f"{result['planned']} planned, {len(result['failed'])} failed, {result['skipped']} already done "
+            f"in {result['elapsed_s']:.1f}s ({result['per_min']:.0f} families/min, {result['commits']} commits); "
+            f"per family p50 {result['p50_s']:.2f}s p95 {result['p95_s']:.2f}s")
+    if llm_calls is not None:
+        line += f"; {llm_calls} LLM calls"
+    return line
+
+
+if __name__ == "__main__":
+    from seed_db import connect_firestore, seed
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("families", nargs="*", help="family ids, or --all")
+    ap.add_argument("--all", action="store_true", help="every family in the database")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    ap.add_argument("--checkpoint", default=CHECKPOINT, help="resume file (default %(default)s, git-ignored)")
+    ap.add_argument("--restart", action="store_true", help="ignore the checkpoint and plan everyone again")
+    ap.add_argument("--emulator", action="store_true", help="use the Firestore emulator")
+    ap.add_argument("--fake", type=int, metavar="N", help="in-memory backends with N synthetic families")
+    args = ap.parse_args()
+    if not (args.families or args.all):
+        ap.error("name some families or pass --all")
+
+    if args.fake:
+        from fakes import FakeFirestore, FakeOpenAI
+        db, client = FakeFirestore(), FakeOpenAI()
+        seed(db, args.fake)
+        args.checkpoint = None # Nothing to resume against a fresh fake
+    else:
+        from openai import OpenAI
+        db, client = connect_firestore(args.emulator), OpenAI()
+    gateway = LLMGateway(client, max_concurrency=args.workers)
+    llm = LLM(client, gateway=gateway)
+    family_ids = args.families or list_families(db)
+    result = run(db, llm, family_ids, args.workers, args.batch_size,
+                 Checkpoint(args.checkpoint, args.restart), compact=True)
+    print(report(result, gateway.stats["calls"]))
+    for family_id, error in sorted(result["failed"].items()):
+        print(f"  ✗ {family_id}: {error}")
@@ -0,0 +1,696 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import combinations
+
+from family_cache import FamilyDocCache
+from fakes import FakeFirestore, FakeOpenAI, FakeOpenAIServer
+from alternates import AlternatePool
+from batch_plan import Checkpoint, run as run_batch
+from gateway import LLMGateway, LLMTimeout, LLMUnavailable, is_retryable
+from history import ARCHIVE, HISTORY, aggregate, compact, load_summaries, summarise
+from llm import LLM
+from local_store import VERSION_FIELD, LocalStore, SyncWorker
+from metrics import Metrics, percentile
+from plan_ops import DAYS, MEAL_TYPES, materialise
+from planner import LEDGER, Planner, calculate_comparison, shopping_view
+from prices import PRICE_BOOK, PriceBook
+from ratings import record_rating, style_field
+from seed_db import seed
+from recipe_library import RecipeLibrary
+from styles import ALL_STYLES, match_style
+
+# Offline benchmarks of the planner's user actions against the fake
+# Firestore and OpenAI backends, plus correctness checks under load.
+#
+#   python bench.py                    # print results
+#   python bench.py --check            # compare with bench_baseline.json, exit 1 on regression
+#   python bench.py --update-baseline  # record the current numbers as the baseline
+#
+# Round trips, bytes and LLM calls are deterministic, so any increase is a
+# regression; latency is compared with --threshold headroom since it depends
+# on the machine.
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+FAMILY_ID = "fam_bench"
+LATENCY_SLACK_MS = 10
+MEMBERS = [
+    {"name": "Dad", "role": "Parent", "pin": "1234", "avatar": "👨"},
+    {"name": "Mum", "role": "Parent", "pin": "1234", "avatar": "👩"},
+    {"name": "Kid", "role": "Child", "pin": "0000", "avatar": "👦"},
+    {"name": "Baby", "role": "Child", "pin": "0000", "avatar": "👶"},
+]
+
+
+def make_env(llm_latency=0.02, per_token=0.0005, db_latency=0.0, seed=0, history=20, compact=True):
+    # A seeded family with a full week plan, served through the same
+    # listener cache the app uses
+    random.seed(seed) # Dinner styles are shuffled into the prompts
+    db = FakeFirestore(latency=db_latency)
+    client = FakeOpenAI(latency=llm_latency, per_token=per_token)
+    metrics = Metrics()
+    llm = LLM(client, metrics=metrics)
+    fam = db.collection("families").document(FAMILY_ID)
+    fam.set({"members": MEMBERS, "style_preferences": {}})
+    cache = FamilyDocCache(fam).start()
+    # A few past weeks' meals, served long enough ago to be pickable
+    library = RecipeLibrary(":memory:")
+    for i in range(history):
+        for m_type, meal in client.respond("Generate 3 meals", f"history{i}").items():
+            library.add(meal, m_type, served=False)
+    planner = Planner(db, llm, family_id=FAMILY_ID, load=cache.get, library=library, compact=compact)
+    planner.generate_week_plan()
+    db.reset_counters()
+    client.calls = 0
+    return {"db": db, "client": client, "metrics": metrics, "planner": planner, "cache": cache}
+
+
+# Auto ids for meal_history entries, as a freshly started app mints them
+IDS_SNIPPET = """
+import sys
+sys.path.insert(0, {here!r})
+from local_store import LocalStore
+history = LocalStore(":memory:").collection("families").document("fam").collection("meal_history")
+print(" ".join(history.document().id for _ in range(50)))
+"""
+
+
+def _slot(i):
+    return DAYS[i % len(DAYS)], MEAL_TYPES[(i // len(DAYS)) % len(MEAL_TYPES)]
+
+# (planner, iteration, on_item) -> None; on_item is passed where the action streams
+SCENARIOS = {
+    "generate_week": lambda p, i, on: p.generate_week_plan(on_meal=on),
+    "regenerate_day": lambda p, i, on: p.regenerate_day(DAYS[i % len(DAYS)], on_meal=on),
+    "reroll_meal": lambda p, i, on: p.regenerate_single_meal(*_slot(i)),
+    "reroll_meal_new": lambda p, i, on: p.regenerate_single_meal(*_slot(i), fresh=True),
+    "get_recipe": lambda p, i, on: p.fetch_recipe("Fish Pie", ["4 Salmon Fillets"], "Modern British", on_step=on),
+    "toggle_lock": lambda p, i, on: p.toggle_lock(*_slot(i)),
+    "rate_meal": lambda p, i, on: p.rate_meal("Bench Meal", "like" if i % 2 else "dislike", "Kid", "Italian"),
+    "calculate_list": lambda p, i, on: p.update_shopping_list(),
+}
+
+
+def run_scenario(name, repeats=5, llm_latency=0.02, per_token=0.0005):
+    env = make_env(llm_latency=llm_latency, per_token=per_token)
+    db, client, planner = env["db"], env["client"], env["planner"]
+    action = SCENARIOS[name]
+    times, firsts = [], []
+    for i in range(repeats):
+        before = env["cache"].version
+        start = time.perf_counter()
+        first = []
+        def on_item(*_):
+            if not first: first.append(time.perf_counter() - start)
+        action(planner, i, on_item)
+        times.append(time.perf_counter() - start)
+        firsts += first
+        env["cache"].wait_for_update(before, timeout=0.5)
+    env["cache"].stop()
+    return {
+        "latency_ms": round(statistics.median(times) * 1000, 2),
+        # Time until the first meal/step could be drawn
+        "first_item_ms": round(statistics.median(firsts) * 1000, 2) if firsts else None,
+        "round_trips": db.round_trips / repeats,
+        "bytes": (db.bytes_read + db.bytes_written) / repeats,
+        "llm_calls": client.calls / repeats,
+    }
+
+
+def bench_concurrent_ratings(taps=400, workers=16):
+    # Many simultaneous "Yummy"/"Yuck" taps must all land in style_preferences
+    db = FakeFirestore()
+    fam = db.collection("families").document("fam_bench")
+    fam.set({"members": [], "style_preferences": {}})
+    votes = [(ALL_STYLES[i % len(ALL_STYLES)].split(" (")[0], "like" if i % 3 else "dislike") for i in range(taps)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda v: record_rating(db, fam, "Bench Meal", v[1], "Kid", v[0]), votes))
+    elapsed = time.perf_counter() - start
+
+    expected = {}
+    for tag, rating in votes:
+        style = next(s for s in ALL_STYLES if s.startswith(tag))
+        expected[style] = expected.get(style, 0) + (1 if rating == "like" else -1)
+    prefs = fam.get().to_dict()["style_preferences"]
+    history = list(fam.collection("meal_history").stream())
+    lost = sum(abs(expected[s] - prefs.get(s, 0)) for s in expected) + (taps - len(history))
+    return {"taps": taps, "workers": workers, "seconds": elapsed, "taps_per_s": taps / elapsed, "lost": lost}
+
+
+def bench_prompt_variants():
+    # Tokens per call for each generator, verbose vs compact prompts
+    rows = {}
+    for variant, flag in (("verbose", False), ("compact", True)):
+        env = make_env(llm_latency=0, per_token=0, compact=flag)
+        planner = env["planner"]
+        env["metrics"].reset()
+        planner.generate_week_plan()
+        planner.generate_week_plan_single()
+        planner.regenerate_day("Tuesday")
+        planner.regenerate_single_meal("Wednesday", "dinner", fresh=True)
+        env["cache"].stop()
+        for row in env["metrics"].summary():
+            if row["kind"] == "llm":
+                site = row["site"].split("/")[0]
+                rows.setdefault(site, {})[variant] = (row["prompt_tokens"] / row["calls"], row["completion_tokens"] / row["calls"])
+    return rows
+
+
+def bench_shopping_ledger(rerolls=30):
+    # The list kept per slot through rerolls must match one built from scratch
+    env = make_env(llm_latency=0, per_token=0)
+    planner, cache = env["planner"], env["cache"]
+    for i in range(rerolls):
+        planner.regenerate_single_meal(*_slot(i), fresh=i % 3 == 0)
+        if i % 10 == 0:
+            planner.regenerate_day(DAYS[i % len(DAYS)])
+    data = cache.get()
+    items, comp, _, _ = shopping_view(data)
+    full = planner.generate_shopping_list(data["current_week_plan"])
+    drift = abs(comp[0]["total"] - calculate_comparison(full)[0]["total"]) if comp else None
+
+    plan, slots = data["current_week_plan"], [_slot(i) for i in range(rerolls)]
+    start = time.perf_counter()
+    for d, m in slots:
+        planner.sync_ledger({"days": []}, [(d, m)], data) # Slot emptied: one slot's lines out
+    per_slot = (time.perf_counter() - start) / len(slots) * 1e6
+    start = time.perf_counter()
+    planner.generate_shopping_list(plan)
+    whole = (time.perf_counter() - start) * 1e6
+    cache.stop()
+    ok = items == full and drift is not None and drift < 0.05 and LEDGER in data
+    return ok, f"{len(items)} items match a full rebuild; {per_slot:.0f}µs per slot vs {whole:.0f}µs for the week"
+
+
+def _synthetic_book(items, stores, seed=0):
+    rng = random.Random(seed)
+    names = [f"item x{''.join(chr(97 + (i // 26 ** p) % 26) for p in range(3))}" for i in range(items)]
+    rows = [(n, rng.choice(["kg", "l", "each"]), [None if rng.random() < 0.05 else round(rng.uniform(0.2, 20), 2)
+                                                   for _ in range(stores)]) for n in names]
+    return PriceBook(rows, [f"Store {j}" for j in range(stores)]), rows
+
+def _basket(rows, size, rng):
+    dims = {"kg": ("g", ""), "l": ("ml", ""), "each": ("count", "")}
+    return [((name, *dims[unit]), rng.uniform(1, 1000), 1.0) for name, unit, _ in rng.sample(rows, size)]
+
+def bench_prices(families=200, items=5000, stores=8):
+    # Item-by-item store prices: splits must be optimal, and pricing many
+    # families against a big catalogue must stay cheap
+    checks = {}
+
+    # The benchmark family's list against the shipped price book
+    env = make_env(llm_latency=0, per_token=0)
+    data = env["cache"].get()
+    env["cache"].stop()
+    book = PriceBook.from_csv(PRICE_BOOK)
+    items_, comp, split, _ = shopping_view(data, book)
+    checks["family list"] = (bool(comp) and split["total"] <= comp[0]["total"] + 1e-6 and comp[0]["from_book"] > 0,
+                             f"{comp[0]['from_book']}/{len(items_)} items from the book, "
+                             f"{comp[0]['store']} £{comp[0]['total']:.2f}, split {' & '.join(split['stores'])} £{split['total']:.2f}")
+
+    # Splits against brute force, on baskets small enough to enumerate
+    small, rows = _synthetic_book(40, 6)
+    rng = random.Random(1)
+    worst = 0.0
+    for _ in range(20):
+        lines = _basket(rows, 12, rng)
+        cost, _ = small.cost(lines)
+        brute = min(sum(min(cost[i, j] for j in combo) for i in range(len(lines)))
+                    for k in (1, 2, 3) for combo in combinations(range(6), k))
+        worst = max(worst, abs(small.best_split(lines, max_stores=3)["total"] - brute))
+    checks["split"] = (bool(worst < 0.01), f"3-store split within £{worst:.3f} of brute force")
+
+    # SQLite price book loads the same prices as the rows it came from
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prices.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE prices (item TEXT, unit TEXT, store TEXT, price REAL)")
+        conn.executemany("INSERT INTO prices VALUES (?, ?, ?, ?)", [(n, u, small.stores[j], p) for n, u, ps in rows
+                                                                    for j, p in enumerate(ps) if p is not None])
+        conn.commit()
+        conn.close()
+        loaded = PriceBook.from_sqlite(path)
+    lines = _basket(rows, 30, rng)
+    same = {c["store"]: c["total"] for c in loaded.compare(lines)} == {c["store"]: c["total"] for c in small.compare(lines)}
+    checks["sqlite"] = (same, f"{len(loaded)} items x {len(loaded.stores)} stores")
+
+    # Scale: many families against a big catalogue
+    big, rows = _synthetic_book(items, stores)
+    rng = random.Random(2)
+    baskets = [_basket(rows, 40, rng) for _ in range(families)]
+    start = time.perf_counter()
+    totals = big.totals_many(baskets)
+    many = (time.perf_counter() - start) * 1000
+    one = max(abs(totals[i].sum() - big.cost(b)[0].sum()) for i, b in enumerate(baskets[:20]))
+    start = time.perf_counter()
+    for b in baskets:
+        big.best_split(b, max_stores=3)
+    per_split = (time.perf_counter() - start) / len(baskets) * 1000
+    checks["scale"] = (bool(one < 1e-6), f"{families} baskets x {stores} stores over {len(big)} items in {many:.1f}ms, "
+                                   f"{per_split:.2f}ms per 3-store split")
+    return checks
+
+
+def _meal_call(gateway, deadline=None):
+    start = time.perf_counter()
+    messages = [{"role": "user", "content": "Generate ONE single meal idea.\nType: DINNER"}]
+    gateway.create("meal", deadline=deadline, model="gpt-4o", messages=messages, response_format={"type": "json_object"})
+    return time.perf_counter() - start
+
+def bench_gateway():
+    # Gateway behaviour against injected faults; each check must hold
+    checks = {}
+
+    # 30% of calls get a 429: every call still succeeds via retries
+    gw = LLMGateway(FakeOpenAI(latency=0.005, error_rate=0.3, retry_after=0.01), backoff=0.01, hedge_sites=set())
+    ok = sum(1 for _ in range(60) if _meal_call(gw) is not None)
+    checks["retries"] = (ok == 60, f"60/60 ok with 429s, {gw.stats['retries']} retries")
+
+    # 2% of calls stall for 200ms: a hedge sent after the p95 cuts the p99
+    tails = {}
+    for name, sites in (("plain", set()), ("hedged", {"meal"})):
+        gw = LLMGateway(FakeOpenAI(latency=0.01, slow_rate=0.02, slow_latency=0.2, seed=1), hedge_sites=sites, hedge_min_samples=50)
+        for _ in range(100):
+            _meal_call(gw)
+        lat = [_meal_call(gw) for _ in range(200)]
+        tails[name] = percentile(lat, 99) * 1000
+    checks["hedging"] = (tails["hedged"] < tails["plain"] / 2,
+                         f"p99 {tails['plain']:.0f}ms plain -> {tails['hedged']:.0f}ms hedged")
+
+    # Server down: breaker opens and later calls fail fast
+    gw = LLMGateway(FakeOpenAI(latency=0.005, error_rate=1.0, error_status=503), backoff=0.005, max_retries=2,
+                    breaker_failures=3, breaker_cooldown=5)
+    fast = []
+    for _ in range(5):
+        start = time.perf_counter()
+        try:
+            _meal_call(gw)
+        except LLMUnavailable:
+            fast.append(time.perf_counter() - start)
+    checks["breaker"] = (gw.circuit_open and gw.stats["rejected"] >= 3 and min(fast) < 0.005,
+                         f"open={gw.circuit_open}, {gw.stats['rejected']} rejected")
+
+    # Hung call: the deadline wins
+    gw = LLMGateway(FakeOpenAI(latency=0.005, slow_rate=1.0, slow_latency=2.0), hedge_sites=set())
+    start = time.perf_counter()
+    try:
+        _meal_call(gw, deadline=0.2)
+        timed_out = False
+    except LLMTimeout:
+        timed_out = True
+    took = time.perf_counter() - start
+    checks["deadline"] = (timed_out and took < 0.4, f"gave up after {took * 1000:.0f}ms")
+    checks.update(bench_gateway_http())
+    return checks
+
+
+def bench_gateway_http():
+    # The real openai client against a local HTTP stub, so its own error
+    # types (APIConnectionError, APITimeoutError, RateLimitError, ...) are
+    # what the gateway has to classify
+    try:
+        from openai import OpenAI
+    except ImportError:
+        return {"http": (True, "skipped, openai not installed")}
+    checks = {}
+    server = FakeOpenAIServer(["drop", 429, 503], retry_after=0.01)
+    try:
+        client = OpenAI(base_url=server.base_url, api_key="sk-bench", max_retries=0)
+        gw = LLMGateway(client, backoff=0.01, hedge_sites=set())
+        _meal_call(gw)
+        checks["http retries"] = (gw.stats["retries"] == 3 and server.requests == 4,
+                                  f"dropped connection, 429 and 503 retried: {gw.stats['retries']} retries, "
+                                  f"{server.requests} requests")
+
+        # A stalled server: the client's timeout is a retryable error, and
+        # the gateway's deadline still ends the call on time
+        server.faults = ["stall:1"]
+        try:
+            client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "hi"}], timeout=0.1)
+            error = None
+        except Exception as e:
+            error = e
+        server.faults = ["stall:2", "stall:2"]
+        gw = LLMGateway(client, backoff=0.01, hedge_sites=set())
+        start = time.perf_counter()
+        try:
+            _meal_call(gw, deadline=0.3)
+            timed_out = False
+        except LLMTimeout:
+            timed_out = True
+        took = time.perf_counter() - start
+        checks["http timeout"] = (type(error).__name__ == "APITimeoutError" and is_retryable(error) and timed_out and took < 0.6,
+                                  f"client raised {type(error).__name__}, gateway gave up after {took * 1000:.0f}ms")
+    finally:
+        server.close()
+    return checks
+
+
+def bench_locked_styles(weeks=50):
+    # A locked dinner keeps its cuisine, so no other dinner in a regenerated
+    # week may share it; the model writes the tag short ("Italian")
+    env = make_env(llm_latency=0, per_token=0)
+    planner = env["planner"]
+    writer = planner.writer()
+    writer.replace_meal("Monday", "dinner", {"name": "Nonna's Lasagne", "ingredients": ["500g Beef Mince"],
+                                             "style_tag": "Italian", "locked": True})
+    planner.flush(writer, [("Monday", "dinner")])
+    env["cache"].wait_for_update(0, timeout=0.5)
+    locked = match_style("Italian")
+    repeats = 0
+    for _ in range(weeks):
+        dinners = []
+        planner.generate_week_plan(on_meal=lambda d, m, meal: m == "dinner" and d != "Monday" and dinners.append(meal))
+        repeats += any(match_style(meal.get("style_tag")) == locked for meal in dinners)
+    env["cache"].stop()
+    return repeats == 0, f"{repeats}/{weeks} weeks gave another dinner the locked cuisine"
+
+
+def bench_alternates(streaks=6, rerolls=4, pause=0.15):
+    # 🎲 pressed a few times in a row on several slots: with the pool warm,
+    # rerolls are local pops; the model only runs in the background
+    env = make_env()
+    planner, client, db = env["planner"], env["client"], env["db"]
+    pool = AlternatePool(Planner(db, planner.llm, family_id=FAMILY_ID, compact=True).generate_alternates, gather=0.05)
+    plan = env["cache"].get()["current_week_plan"]
+    start = time.perf_counter()
+    pool.schedule(plan)
+    warm = pool.wait_idle()
+    fill_ms = (time.perf_counter() - start) * 1000
+    fill_calls = client.calls
+
+    times = {"pool": [], "model": []}
+    for variant in times:
+        planner.alternates = pool if variant == "pool" else None
+        for i in range(streaks):
+            d, m = DAYS[i % len(DAYS)], MEAL_TYPES[i % len(MEAL_TYPES)]
+            for _ in range(rerolls):
+                t = time.perf_counter()
+                planner.regenerate_single_meal(d, m, fresh=variant == "model")
+                times[variant].append(time.perf_counter() - t)
+                time.sleep(pause) # The parent reads the new meal; the pool tops up meanwhile
+    env["cache"].stop()
+    pooled, model = statistics.median(times["pool"]) * 1000, statistics.median(times["model"]) * 1000
+
+    # A locked slot empties, and a new week starts from nothing
+    planner.alternates = pool
+    pool.wait_idle()
+    planner.toggle_lock("Friday", "dinner")
+    locked_empty = pool.available("Friday", "dinner") == 0
+    pool.reset()
+    emptied = not any(pool.available(d, m) for d in DAYS for m in MEAL_TYPES)
+    ok = warm and locked_empty and emptied and pool.hit_rate >= 0.9 and pooled < model / 3
+    s = pool.stats
+    return ok, (f"hit rate {pool.hit_rate:.0%}, reroll p50 {pooled:.1f}ms vs {model:.1f}ms from the model; "
+                f"warm-up {fill_calls} call(s) / {fill_ms:.0f}ms, {s['generated']} made in {s['calls']} call(s), "
+                f"{s['dropped']} thrown away")
+
+
+def bench_batch_plan(families=120, workers=16):
+    # Many families planned headless; a run that loses some batch commits
+    # must finish them on the rerun from its checkpoint, and nobody twice
+    db = FakeFirestore(error_rate=0.2, seed=3)
+    ids = seed(db, families)
+    client = FakeOpenAI(latency=0.02, per_token=0.0001)
+    llm = LLM(client, gateway=LLMGateway(client, max_concurrency=workers))
+    # A family with the app open on an offline-first store while the batch runs
+    store = LocalStore(":memory:")
+    sync = SyncWorker(store, lambda: db)
+    family = f"families/{ids[0]}"
+    store.read(family)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "checkpoint.json")
+        first = run_batch(db, llm, ids, workers, 10, Checkpoint(path), compact=True)
+        db.error_rate = 0.0
+        second = run_batch(db, llm, ids, workers, 10, Checkpoint(path), compact=True)
+    planned = sum(1 for f in ids if len(db.docs[f"families/{f}"].get("current_week_plan", {}).get("days", [])) == 7)
+    seen = store.read(family).get("current_week_plan") == db.docs[family]["current_week_plan"]
+    bumped = store.remote_version(family) == db.docs[family].get(VERSION_FIELD) == 1
+    sync.stop()
+    ok = (planned == families and first["planned"] + second["planned"] == families
+          and second["skipped"] == first["planned"] and not second["failed"] and seen and bumped)
+    return ok, (f"{first['planned']} planned, {len(first['failed'])} lost to write errors, then {second['planned']} "
+                f"on resume; {first['per_min']:.0f} families/min on {workers} workers, p95 {first['p95_s']:.2f}s; "
+                f"open session {'has' if seen else 'MISSED'} the new week at version {store.remote_version(family)}")
+
+
+def bench_history(entries=3000, weeks=20, page_size=200):
+    # Summaries built page by page must equal a tally of the whole log, and
+    # compaction must neither lose entries nor change the summaries
+    checks = {}
+    db = FakeFirestore()
+    fam = db.collection("families").document(FAMILY_ID)
+    fam.set({"members": MEMBERS})
+    now = datetime(2026, 10, 16, 12)
+    rng = random.Random(0)
+    def tap(date):
+        entry = {"meal": f"Meal {rng.randrange(60)}", "rating": rng.choice(["like", "like", "dislike"]),
+                 "user": "Kid", "style": rng.choice(ALL_STYLES), "date": date.isoformat()}
+        fam.collection(HISTORY).document().set(entry)
+        return entry
+    log = [tap(now - timedelta(seconds=rng.uniform(2 * 86400, weeks * 7 * 86400))) for _ in range(entries)]
+
+    start = time.perf_counter()
+    added = aggregate(db, fam, page_size, now)
+    elapsed = (time.perf_counter() - start) * 1000
+    checks["aggregate"] = (added == entries and load_summaries(fam) == summarise(sorted(log, key=lambda e: e["date"])),
+                           f"{added} entries in {-(-added // page_size)} pages of {page_size}, {elapsed:.0f}ms")
+
+    # New taps: only those are read, and the last day's wait for stragglers
+    log += [tap(now - timedelta(hours=rng.uniform(25, 47))) for _ in range(50)]
+    fresh = [tap(now - timedelta(hours=rng.uniform(0, 23))) for _ in range(5)]
+    added = aggregate(db, fam, page_size, now)
+    checks["incremental"] = (added == 50 and load_summaries(fam) == summarise(sorted(log, key=lambda e: e["date"])),
+                             f"{added} new entries folded in, {len(fresh)} too recent left for later")
+
+    before = load_summaries(fam)
+    archived = compact(db, fam, timedelta(weeks=8), page_size, now)
+    kept = list(fam.collection(HISTORY).stream())
+    stored = sum(len(s.to_dict()["entries"]) for s in fam.collection(ARCHIVE).stream())
+    cutoff = (now - timedelta(weeks=8)).isoformat()
+    ok = (archived == stored == sum(e["date"] < cutoff for e in log) and len(kept) + archived == len(log) + len(fresh)
+          and load_summaries(fam) == before and aggregate(db, fam, page_size, now) == 0)
+    checks["compact"] = (ok, f"{archived} entries archived, {len(kept)} kept")
+    return checks
+
+
+def bench_local_store(db_latency=0.02, taps=40):
+    # Offline-first store in front of a slow, flaky server: reads stay local,
+    # and after an outage and a concurrent edit elsewhere both sides agree
+    checks = {}
+    remote = FakeFirestore(latency=db_latency, error_rate=0.2, seed=2)
+    # Seeded like seed_db.py does, with a Firestore timestamp on the doc
+    created = datetime(2026, 1, 5, 9, 30, tzinfo=timezone.utc)
+    remote.collection("families").document(FAMILY_ID).set({"members": MEMBERS, "style_preferences": {}, "created_at": created})
+    store = LocalStore(":memory:")
+    sync = SyncWorker(store, lambda: remote, backoff=0.01, max_backoff=0.05)
+    client = FakeOpenAI(latency=0, per_token=0)
+    planner = Planner(store, LLM(client), family_id=FAMILY_ID, compact=True)
+    hydrated = planner.data() # First read fills the store from the server
+    checks["timestamps"] = (hydrated.get("created_at") == created, f"created_at read back as {hydrated.get('created_at')!r}")
+    remote.reset_counters()
+
+    start = time.perf_counter()
+    for _ in range(20):
+        planner.data()
+    read_ms = (time.perf_counter() - start) / 20 * 1000
+    checks["local reads"] = (remote.reads == 0, f"{read_ms:.2f}ms per read, {remote.reads} server reads")
+
+    planner.generate_week_plan()
+    # A second device with its own store, on the same family
+    other_store = LocalStore(":memory:")
+    other = SyncWorker(other_store, lambda: remote, backoff=0.01, max_backoff=0.05)
+    other_fam = other_store.collection("families").document(FAMILY_ID)
+    other_fam.get()
+    remote.down = True
+    start = time.perf_counter()
+    for i in range(taps):
+        planner.rate_meal("Bench Meal", "like", "Kid", "Italian")
+        planner.toggle_lock(*_slot(i))
+    write_ms = (time.perf_counter() - start) / taps * 1000
+    # Both devices edited offline from the same version: one push conflicts
+    thai = match_style("Thai")
+    other_fam.update({"kitchen_profile.current_inventory": ["Rice"], style_field(thai): 5})
+    remote.down = False
+    drained = sync.wait_idle(timeout=30) and other.wait_idle(timeout=30)
+    checks["offline writes"] = (drained and sync.stats["failed"] == 0,
+                                f"{write_ms:.2f}ms per write while down, {sync.stats['retries']} retries")
+
+    time.sleep(0.05) # Let the last listener pushes land
+    copies = [db.collection("families").document(FAMILY_ID).get().to_dict() for db in (store, other_store, remote)]
+    copies[2].pop(VERSION_FIELD, None)
+    history = len(list(remote.collection("families").document(FAMILY_ID).collection("meal_history").stream()))
+    prefs = copies[2]["style_preferences"]
+    score = prefs.get(match_style("Italian"))
+    conflicts = sync.stats["conflicts"] + other.stats["conflicts"]
+    agreed = copies[0] == copies[1] == copies[2]
+    checks["converged"] = (agreed and history == taps and score == taps and prefs.get(thai) == 5 and conflicts >= 1,
+                           f"{sync.stats['pushed']} pushed, {conflicts} conflict(s) merged, "
+                           f"{history}/{taps} ratings, score {score}")
+
+    # Ratings are pushed and forgotten; a device joining later fetches the
+    # family doc alone, however long the log has grown
+    kept = len(store.paths(f"families/{FAMILY_ID}/meal_history/"))
+    remote.reset_counters()
+    joined = LocalStore(":memory:")
+    joining = SyncWorker(joined, lambda: remote)
+    joined.collection("families").document(FAMILY_ID).get()
+    joining.stop()
+    checks["history not mirrored"] = (kept == 0 and remote.reads == 1 and joined.stats()["docs"] == 1,
+                                      f"{kept} entries kept after the push; joining took {remote.reads} read(s) "
+                                      f"and {joined.stats()['docs']} doc(s) with {history} in the log")
+
+    # Entry ids minted by a restarted app or another device, each a fresh
+    # process, must miss the ids already on the server and each other's
+    on_server = {path.rsplit("/", 1)[-1] for path in remote.paths(f"families/{FAMILY_ID}/meal_history/")}
+    fresh = [set(subprocess.run([sys.executable, "-c", IDS_SNIPPET.format(here=os.path.dirname(os.path.abspath(__file__)))],
+                                capture_output=True, text=True, check=True).stdout.split()) for _ in range(2)]
+    clashes = len(fresh[0] & fresh[1]) + len((fresh[0] | fresh[1]) & on_server)
+    checks["entry ids"] = (clashes == 0 and all(len(ids) == 50 for ids in fresh),
+                           f"{clashes} of {sum(map(len, fresh))} ids from two fresh processes already taken")
+
+    # A writer that leaves _version alone (a console edit, seed_db.py)
+    remote.error_rate = 0.0
+    remote.collection("families").document(FAMILY_ID).update({"kitchen_profile.current_inventory": ["Eggs"]})
+    seen = [db.collection("families").document(FAMILY_ID).get().to_dict()["kitchen_profile"]["current_inventory"]
+            for db in (store, other_store)]
+    checks["outside writes"] = (seen == [["Eggs"], ["Eggs"]], f"both devices see {seen[0]}")
+
+    # Both devices rewrite the days array offline, on different slots, with
+    # meals that share ingredients so both move the same shopping totals
+    remote.down = True
+    planners = [planner, Planner(other_store, LLM(client), family_id=FAMILY_ID, compact=True)]
+    writers = [p.writer() for p in planners]
+    writers[0].replace_meal("Monday", "dinner", {"name": "Device A Dinner", "ingredients": ["250g Halloumi", "1 Lemon"]})
+    writers[1].replace_meal("Tuesday", "dinner", {"name": "Device B Dinner", "ingredients": ["250g Halloumi", "2 Peppers"]})
+    writers[1].set_field("Wednesday", "lunch", "locked", True)
+    planners[0].flush(writers[0], [("Monday", "dinner")])
+    planners[1].flush(writers[1], [("Tuesday", "dinner")])
+    remote.down = False
+    drained = sync.wait_idle(timeout=30) and other.wait_idle(timeout=30)
+    time.sleep(0.05)
+    plans = [materialise(db.collection("families").document(FAMILY_ID).get().to_dict()["current_week_plan"])
+             for db in (store, other_store, remote)]
+    meals = [{d["day"]: d["meals"] for d in plan["days"]} for plan in plans]
+    kept = [(m["Monday"]["dinner"]["name"], m["Tuesday"]["dinner"]["name"], m["Wednesday"]["lunch"].get("locked", False))
+            for m in meals]
+    checks["concurrent plan edits"] = (drained and kept[0] == kept[1] == kept[2] == ("Device A Dinner", "Device B Dinner", True),
+                                       f"server keeps {kept[2]}")
+    # The server's shopping list must be the one its own plan makes (the
+    # pantry left aside: a full rebuild doesn't know about it)
+    server = remote.collection("families").document(FAMILY_ID).get().to_dict()
+    items, comp, _, _ = shopping_view({LEDGER: server[LEDGER]})
+    full = planner.generate_shopping_list(plans[2])
+    drift = abs(comp[0]["total"] - calculate_comparison(full)[0]["total"]) if comp else None
+    checks["concurrent ledger"] = (items == full and drift is not None and drift < 0.05,
+                                   f"{len(items)} items, total off a full rebuild by £{drift:.2f}")
+    other.stop()
+    sync.stop()
+    return checks
+
+
+def compare(results, baseline, threshold):
+    failures = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for field in ("round_trips", "bytes", "llm_calls"):
+            if res[field] > base.get(field, res[field]) * 1.001:
+                failures.append(f"{name}: {field} {base[field]:g} -> {res[field]:g}")
+        for field in ("latency_ms", "first_item_ms"):
+            limit = base.get(field)
+            # Ignore a few ms of jitter on the cheap actions
+            if limit is not None and res[field] is not None and res[field] > max(limit * (1 + threshold), limit + LATENCY_SLACK_MS):
+                failures.append(f"{name}: {field} {limit:.1f} -> {res[field]:.1f}")
+    return failures
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--check", action="store_true")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed latency regression (0.25 = 25%%)")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--llm-latency", type=float, default=0.02, help="fake OpenAI delay per call (s)")
+    ap.add_argument("--per-token", type=float, default=0.0005, help="fake OpenAI delay per completion token (s)")
+    ap.add_argument("--only", nargs="*", choices=sorted(SCENARIOS))
+    args = ap.parse_args()
+
+    results = {}
+    for name in args.only or SCENARIOS:
+        results[name] = res = run_scenario(name, repeats=args.repeats, llm_latency=args.llm_latency, per_token=args.per_token)
+        first = f"{res['first_item_ms']:6.1f}" if res['first_item_ms'] is not None else "     -"
+        print(f"{name:16} {res['latency_ms']:8.1f} ms  {first} ms first  {res['round_trips']:5.1f} rt  "
+              f"{res['bytes']:9.0f} B  {res['llm_calls']:4.1f} llm")
+
+    ratings = bench_concurrent_ratings()
+    print(f"rate_meal (concurrent): {ratings['taps']} taps on {ratings['workers']} threads, "
+          f"{ratings['taps_per_s']:.0f} taps/s, {ratings['lost']} lost")
+    failed = bool(ratings["lost"])
+
+    ok, detail = bench_shopping_ledger()
+    print(f"shopping ledger: {'ok' if ok else 'FAILED'} ({detail})")
+    failed = failed or not ok
+
+    print("tokens per call (prompt + completion):")
+    for site, variants in bench_prompt_variants().items():
+        print(f"  {site:8} " + "  ".join(f"{v} {p:5.0f} + {c:5.0f}" for v, (p, c) in variants.items()))
+
+    for name, (ok, detail) in bench_gateway().items():
+        print(f"gateway {name}: {'ok' if ok else 'FAILED'} ({detail})")
+        failed = failed or not ok
+
+    for name, (ok, detail) in bench_prices().items():
+        print(f"prices {name}: {'ok' if ok else 'FAILED'} ({detail})")
+        failed = failed or not ok
+
+    ok, detail = bench_alternates()
+    print(f"reroll alternates: {'ok' if ok else 'FAILED'} ({detail})")
+    failed = failed or not ok
+
+    ok, detail = bench_locked_styles()
+    print(f"locked dinner styles: {'ok' if ok else 'FAILED'} ({detail})")
+    failed = failed or not ok
+
+    ok, detail = bench_batch_plan()
+    print(f"batch planner: {'ok' if ok else 'FAILED'} ({detail})")
+    failed = failed or not ok
+
+    for name, (ok, detail) in bench_history().items():
+        print(f"history {name}: {'ok' if ok else 'FAILED'} ({detail})")
+        failed = failed or not ok
+
+    for name, (ok, detail) in bench_local_store().items():
+        print(f"local store {name}: {'ok' if ok else 'FAILED'} ({detail})")
+        failed = failed or not ok
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE}")
+    elif args.check:
+        with open(BASELINE, encoding="utf-8") as f:
+            failures = compare(results, json.load(f), args.threshold)
+        for line in failures:
+            print("REGRESSION", line)
+        failed = failed or bool(failures)
+
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,111 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+# Plan tab script-run timings on a seeded full week, app.py driven by
+# Streamlit's AppTest against the fake backends:
+# - a full page run (what every click cost before the meal cards became
+#   fragments: all seven days redrawn)
+# - a 🔒 click, rerunning only its card's fragment, the way the browser
+#   asks for it
+# AppTest has no public call for a fragment rerun, so the snippet queues
+# one the way ScriptRunner receives it from the browser. It then clicks 🎲
+# from inside a card fragment and checks the Shop tab shows the same list
+# a fresh page run does.
+#
+#   python bench_page.py [--runs 30]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PAGE_SNIPPET = """
+import statistics, sys, time
+sys.path.insert(0, {here!r})
+import firebase_admin, openai
+from firebase_admin import credentials, firestore
+from fakes import FakeFirestore, FakeOpenAI
+from planner import DEFAULT_FAMILY_ID
+
+remote = FakeFirestore()
+client = FakeOpenAI(latency=0)
+members = [{{"name": "Dad", "role": "parent"}}, {{"name": "Kid", "role": "child"}}]
+remote.collection("families").document(DEFAULT_FAMILY_ID).set({{
+    "members": members, "current_week_plan": client.respond("Plan a 7-day menu", "bench"),
+    "kitchen_profile": {{"current_inventory": []}}, "style_preferences": {{}}}})
+credentials.Certificate = lambda *a, **k: object()
+firebase_admin.initialize_app = lambda *a, **k: firebase_admin._apps.setdefault("[DEFAULT]", object())
+firestore.client = lambda *a, **k: remote
+openai.OpenAI = lambda *a, **k: client
+
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import local_script_runner as lsr
+sent = []
+forward_msgs = lsr.LocalScriptRunner.forward_msgs
+def keep(self):
+    sent[:] = forward_msgs(self)
+    return sent
+lsr.LocalScriptRunner.forward_msgs = keep
+
+at = AppTest.from_file({app!r}, default_timeout=60)
+at.secrets["OPENAI_API_KEY"] = "sk-bench"
+at.session_state["user"] = members[0]
+at.run()
+at.run()
+
+def ms(fn):
+    t = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t) * 1000
+
+def fragment_of(key):
+    return next(m.delta.fragment_id for m in sent if m.HasField("delta") and m.delta.HasField("new_element")
+                and m.delta.new_element.WhichOneof("type") == "button" and m.delta.new_element.button.id.endswith(key))
+
+full = [ms(at.run) for _ in range({runs})]
+key = "l_Tuesday_dinner"
+fragment = fragment_of(key)
+rerun_data = lsr.RerunData
+lsr.RerunData = lambda **kw: rerun_data(fragment_id_queue=[fragment], is_fragment_scoped_rerun=True, **kw)
+card = [ms(lambda: at.button(key=key).click().run()) for _ in range({runs})]
+card_ms = at.session_state["last_card_ms"]
+
+lsr.RerunData = rerun_data
+at.run()
+fragment = fragment_of("rr_Wednesday_dinner")
+lsr.RerunData = lambda **kw: rerun_data(fragment_id_queue=[fragment], is_fragment_scoped_rerun=True, **kw)
+at.button(key="rr_Wednesday_dinner").click().run()
+shop = sorted(c.label for c in at.checkbox)
+lsr.RerunData = rerun_data
+at.run()
+print(statistics.median(full))
+print(statistics.median(card))
+print(card_ms)
+print(int(bool(shop) and shop == sorted(c.label for c in at.checkbox)))
+print(len(at.exception))
+"""
+
+
+def page_timings(runs=30):
+    with tempfile.TemporaryDirectory() as cwd:
+        out = subprocess.run([sys.executable, "-c", PAGE_SNIPPET.format(here=HERE, app=os.path.join(HERE, "app.py"), runs=runs)],
+                             cwd=cwd, capture_output=True, text=True, timeout=600)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed")
+    full, card, card_code, shop_current, errors = out.stdout.strip().splitlines()[-5:]
+    return float(full), float(card), float(card_code), shop_current == "1", int(errors)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=30)
+    args = ap.parse_args()
+
+    full, card, card_code, shop_current, errors = page_timings(args.runs)
+    print(f"full page run (7 days)  {full:8.1f} ms")
+    print(f"🔒 click, card fragment  {card:8.1f} ms  (card code {card_code:.1f} ms, the rest is the script runner)")
+    print(f"🎲 click, Shop tab       {'current' if shop_current else 'STALE'}")
+    if errors:
+        print(f"{errors} exception(s) drawn on the page")
+    if errors or not shop_current:
+        raise SystemExit(1)
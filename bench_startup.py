@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Cold-start timings, each in a fresh interpreter so nothing is cached:
+# - import time of the app's own modules vs the SDKs they used to pull in
+# - time to first render: running app.py until the "Who is this?" picker
+#   is drawn (Streamlit's AppTest), with and without a members snapshot.
+#   Firestore and OpenAI are the fakes, patched in the way bench_page.py
+#   does it, before the clock starts; the SDK rows above show what their
+#   imports cost on top
+# Exits 1 if a render raises or never draws the picker.
+#
+#   python bench_startup.py [--runs 3]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# What `import app` costs before anything is drawn
+APP_MODULES = ["llm_cache", "llm", "gateway", "planner", "plan_ops", "prefetch",
+               "recipe_library", "family_cache", "metrics", "lazy"]
+SDKS = ["streamlit", "firebase_admin.firestore", "openai"]
+
+IMPORT_SNIPPET = """
+import sys, time
+sys.path.insert(0, {here!r})
+t = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(time.perf_counter() - t)
+loaded = [m for m in ("firebase_admin.firestore", "openai") if m in sys.modules]
+print(",".join(loaded))
+"""
+
+RENDER_SNIPPET = """
+import sys, time
+sys.path.insert(0, {here!r})
+import firebase_admin, openai
+from firebase_admin import credentials, firestore
+from fakes import FakeFirestore, FakeOpenAI
+from planner import DEFAULT_FAMILY_ID
+
+remote = FakeFirestore()
+remote.collection("families").document(DEFAULT_FAMILY_ID).set({{"members": {members!r}}})
+credentials.Certificate = lambda *a, **k: object()
+firebase_admin.initialize_app = lambda *a, **k: firebase_admin._apps.setdefault("[DEFAULT]", object())
+firestore.client = lambda *a, **k: remote
+openai.OpenAI = lambda *a, **k: FakeOpenAI(latency=0)
+
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=60)
+at.secrets["OPENAI_API_KEY"] = "sk-bench"
+at.run()
+took = time.perf_counter() - t
+print(took)
+print(any("Who is this?" in t.value for t in at.title))
+print(len(at.exception))
+"""
+MEMBERS = [{"name": "Dad", "role": "parent"}, {"name": "Kid", "role": "child"}]
+
+
+def _run(snippet, cwd=HERE):
+    out = subprocess.run([sys.executable, "-c", snippet], cwd=cwd, capture_output=True, text=True, timeout=300)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed")
+    return out.stdout.strip().splitlines()
+
+
+def import_time(modules, runs=3):
+    times, loaded = [], ""
+    for _ in range(runs):
+        lines = _run(IMPORT_SNIPPET.format(here=HERE, modules=modules))
+        times.append(float(lines[0]))
+        loaded = lines[1] if len(lines) > 1 else ""
+    return min(times) * 1000, loaded
+
+
+def first_render(with_snapshot, runs=3):
+    # -> (best ms, picker drawn on every run, exceptions drawn)
+    times, drew_picker, errors = [], True, 0
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cwd:
+            if with_snapshot:
+                with open(os.path.join(cwd, "members_snapshot.json"), "w", encoding="utf-8") as f:
+                    json.dump(MEMBERS, f)
+            lines = _run(RENDER_SNIPPET.format(here=HERE, app=os.path.join(HERE, "app.py"), members=MEMBERS), cwd=cwd)
+        times.append(float(lines[-3]))
+        drew_picker = drew_picker and lines[-2] == "True"
+        errors += int(lines[-1])
+    return min(times) * 1000, drew_picker, errors
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    ms, loaded = import_time(APP_MODULES, args.runs)
+    print(f"import app modules      {ms:8.1f} ms  (SDKs loaded: {loaded or 'none'})")
+    for sdk in SDKS:
+        try:
+            ms, _ = import_time([sdk], args.runs)
+            print(f"import {sdk:24} {ms:8.1f} ms")
+        except RuntimeError as e:
+            print(f"import {sdk:24}  skipped ({e})")
+
+    failed = False
+    for label, snap in (("with snapshot", True), ("first ever run", False)):
+        try:
+            ms, drew, errors = first_render(snap, args.runs)
+        except RuntimeError as e:
+            print(f"first render, {label:14}  FAILED ({e})")
+            failed = True
+            continue
+        print(f"first render, {label:14} {ms:8.1f} ms  ({'picker drawn' if drew else 'NO PICKER'}"
+              + (f", {errors} exception(s)" if errors else "") + ")")
+        failed = failed or not drew or errors > 0
+    if failed:
+        raise SystemExit(1)
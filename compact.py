@@ -0,0 +1,136 @@
+from plan_ops import DAYS, MEAL_TYPES
+from styles import STYLE_CODES, CODE_FOR_STYLE, match_style
+
+# Compact prompt/response mode. Prompts name styles by code and leave the
+# output shape to a strict JSON schema (response_format) instead of a
+# written example; responses use one-letter keys and come back as:
+#   meal: {"n": name, "i": [ingredients], "m": method, "s": style code}
+#   day:  {"b": meal, "l": meal, "d": meal}   (only the meals asked for)
+#   week: {"w": [day x 7]}                   (Monday first)
+#   alternates: {"a": [[meal, ...] per slot]} (slots in the prompt's order)
+# expand_*() turn them back into the current_week_plan shape.
+
+MEAL_KEYS = {"breakfast": "b", "lunch": "l", "dinner": "d"}
+# Non-dinner codes, and the style_tag they expand to
+EXTRA_CODES = {"UK": "Western", "LT": "Packed"}
+DEFAULT_CODE = {"breakfast": "UK", "lunch": "LT"}
+
+RULES = 'Quantities scaled to the family ("500g Beef Mince", "4 Burger Buns"). Breakfast UK-style (s=UK), lunch light/packed (s=LT). m: method, max 25 words.'
+
+def style_legend():
+    # Head names only: the model knows the cuisines
+    return "Style codes: " + ", ".join(f"{code}={style.split(' (')[0]}" for code, style in STYLE_CODES.items())
+
+def codes(styles):
+    return ", ".join(CODE_FOR_STYLE.get(s, s) for s in styles) or "-"
+
+
+# --- SCHEMAS ---
+MEAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "n": {"type": "string"},
+        "i": {"type": "array", "items": {"type": "string"}},
+        "m": {"type": "string"},
+        "s": {"type": "string", "enum": list(STYLE_CODES) + list(EXTRA_CODES)},
+    },
+    "required": ["n", "i", "m", "s"],
+    "additionalProperties": False,
+}
+
+def _day_schema(meal_types):
+    keys = [MEAL_KEYS[m] for m in meal_types]
+    return {"type": "object", "properties": {k: MEAL_SCHEMA for k in keys}, "required": keys, "additionalProperties": False}
+
+def response_format(name, schema):
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+def meal_format():
+    return response_format("meal", MEAL_SCHEMA)
+
+def day_format(meal_types=MEAL_TYPES):
+    return response_format("day_" + "".join(MEAL_KEYS[m] for m in meal_types), _day_schema(meal_types))
+
+def alternates_format():
+    schema = {"type": "object", "properties": {"a": {"type": "array", "items": {"type": "array", "items": MEAL_SCHEMA}}},
+              "required": ["a"], "additionalProperties": False}
+    return response_format("alternates", schema)
+
+def week_format():
+    schema = {"type": "object", "properties": {"w": {"type": "array", "items": _day_schema(MEAL_TYPES)}},
+              "required": ["w"], "additionalProperties": False}
+    return response_format("week", schema)
+
+
+# --- PROMPTS ---
+def day_prompt(day_name, meal_types, family_count, favorites, disliked, dinner_style=None):
+    lines = [f"Plan {day_name} for {family_count} people: {', '.join(meal_types)}.", RULES]
+    if dinner_style:
+        lines.append(f"Dinner s={CODE_FOR_STYLE.get(dinner_style, dinner_style)}.")
+    elif "dinner" in meal_types:
+        lines += [f"Likes {codes(favorites)}; avoid {codes(disliked)}.", style_legend()]
+    return "\n".join(lines)
+
+def week_prompt(family_count, favorites, disliked):
+    return "\n".join([
+        f"Plan 7 days (Monday first) of breakfast, lunch, dinner for {family_count} people.",
+        RULES, "No repeated dinner style.",
+        f"Likes {codes(favorites)}; avoid {codes(disliked)}.", style_legend(),
+    ])
+
+def alternates_prompt(slots, family_count, favorites, disliked):
+    # slots: [(day, meal_type, count, current meal name)]
+    lines = [f"Alternative meals for {family_count} people, a list per line, each different from the meal it replaces:"]
+    lines += [f"{i}. {d} {m} x{n}, not {current or '-'}" for i, (d, m, n, current) in enumerate(slots, 1)]
+    lines.append(RULES)
+    if any(m == "dinner" for _, m, _, _ in slots):
+        lines += [f"Likes {codes(favorites)}; avoid {codes(disliked)}.", style_legend()]
+    return "\n".join(lines)
+
+def meal_prompt(day_name, meal_type, family_count):
+    lines = [f"One {meal_type} for {day_name}, {family_count} people.", RULES]
+    if meal_type == "dinner":
+        lines.append("Pick a fun dinner style. " + style_legend())
+    return "\n".join(lines)
+
+
+# --- DECODING ---
+def expand_meal(c, meal_type="dinner"):
+    code = c.get("s") or DEFAULT_CODE.get(meal_type)
+    return {
+        "name": c.get("n", ""),
+        "ingredients": list(c.get("i", [])),
+        "method": c.get("m", ""),
+        "style_tag": STYLE_CODES.get(code) or EXTRA_CODES.get(code) or code or "General",
+    }
+
+def expand_day(c, meal_types=MEAL_TYPES):
+    return {m: expand_meal(c[MEAL_KEYS[m]], m) for m in meal_types if MEAL_KEYS[m] in c}
+
+def expand_alternates(c, slots):
+    # -> one list of meals per (day, meal_type, ...) slot, in order
+    lists = c.get("a", [])
+    return [[expand_meal(meal, s[1]) for meal in (lists[i] if i < len(lists) else [])] for i, s in enumerate(slots)]
+
+def expand_week(c):
+    return {"days": [{"day": d, "meals": expand_day(day)} for d, day in zip(DAYS, c.get("w", []))]}
+
+def compact_meal(meal):
+    # Inverse of expand_meal (fakes and size comparisons)
+    tag = meal.get("style_tag")
+    code = (CODE_FOR_STYLE.get(match_style(tag))
+            or next((k for k, v in EXTRA_CODES.items() if v == tag), None) or "UK")
+    return {"n": meal.get("name", ""), "i": meal.get("ingredients", []), "m": meal.get("method", ""), "s": code}
+
+
+# --- STREAMING ---
+# Paths of complete meals inside a streamed response -> meal type
+TYPE_FOR_KEY = {k: m for m, k in MEAL_KEYS.items()}
+
+def day_slot(path):
+    return TYPE_FOR_KEY.get(path[0]) if len(path) == 1 else None
+
+def week_slot(path):
+    if len(path) == 3 and path[0] == "w" and path[1] < len(DAYS) and path[2] in TYPE_FOR_KEY:
+        return DAYS[path[1]], TYPE_FOR_KEY[path[2]]
+    return None
@@ -0,0 +1,324 @@
+import copy
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import compact
+from local_store import Batch, CollectionRef, DocumentRef, Snapshot, Transaction, apply_update, check_reads, encode, mask
+from plan_ops import DAYS
+
+# Offline stand-ins for the two backends, for benchmarks and load tests.
+#
+# FakeFirestore covers the slice of the Firestore client the app uses:
+# collection/document refs, ordered and paged queries, get/set/update/add,
+# batches, transactions and on_snapshot (the refs are local_store's). Writes are applied atomically
+# under one lock, with dotted field paths, Increment and DELETE_FIELD
+# handled like the server does, and every read/commit is counted as one
+# round trip with its payload bytes. A transaction whose reads have gone
+# stale by commit time is aborted (and retried), as on the server. Setting
+# `down` makes every call fail with ConnectionError, and error_rate fails
+# that share of commits.
+#
+# FakeOpenAI answers the app's prompts with deterministic, valid JSON after
+# a configurable delay, either whole or streamed in small chunks. It can
+# also inject faults: a share of calls fail with an HTTP status (429 with a
+# Retry-After, 5xx) and a share are slow, to exercise the LLM gateway.
+#
+# FakeOpenAIServer is the same for the real openai client: a local HTTP
+# server on /v1/chat/completions that plays a script of faults (stall,
+# dropped connection, status codes) before answering through a FakeOpenAI,
+# so the client's own timeouts and connection errors reach the gateway.
+
+def _size(obj):
+    return len(json.dumps(encode(obj), default=str).encode("utf-8")) if obj is not None else 0
+
+
+class FakeFirestore:
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency # Per round trip
+        self.error_rate = error_rate
+        self.down = False
+        self._faults = random.Random(seed)
+        self.docs = {}
+        self.watchers = []
+        self._lock = threading.Lock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.reads = 0
+        self.writes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @property
+    def round_trips(self):
+        return self.reads + self.writes
+
+    def counters(self):
+        return {"reads": self.reads, "writes": self.writes, "round_trips": self.round_trips,
+                "bytes_read": self.bytes_read, "bytes_written": self.bytes_written}
+
+    def collection(self, name):
+        return CollectionRef(self, name)
+
+    def batch(self):
+        return Batch(self)
+
+    def transaction(self, **kwargs):
+        return Transaction(self)
+
+    def paths(self, prefix=""):
+        with self._lock:
+            return sorted(p for p in self.docs if p.startswith(prefix))
+
+    def read(self, path, count=True, field_paths=None):
+        if self.down:
+            raise ConnectionError("Firestore unreachable")
+        if count and self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            data = mask(copy.deepcopy(self.docs.get(path)), field_paths)
+            if count:
+                self.reads += 1
+                self.bytes_read += _size(data)
+            return data
+
+    def commit(self, writes, reads=None):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.down or self._faults.random() < self.error_rate:
+                raise ConnectionError("Firestore unreachable")
+            check_reads(reads, self.docs.get)
+            self.writes += 1
+            self.bytes_written += sum(_size(data) for _, _, data in writes)
+            touched = set()
+            for kind, path, data in writes:
+                if kind == "set":
+                    self.docs[path] = copy.deepcopy(data)
+                elif kind == "update":
+                    if path not in self.docs:
+                        raise KeyError(f"No document to update: {path}")
+                    apply_update(self.docs[path], data)
+                else:
+                    self.docs.pop(path, None)
+                touched.add(path)
+            watchers = [w for w in self.watchers if w.path in touched]
+        for w in watchers:
+            # Listener pushes aren't round trips the app pays for
+            ref = DocumentRef(self, w.path)
+            w.callback([Snapshot(ref, self.read(w.path, count=False))], [], None)
+
+
+# --- FAKE OPENAI ---
+MEAL_BANK = {
+    "breakfast": [
+        ("Scrambled Eggs on Toast", ["6 Eggs", "4 slices Toast", "1 tbsp Butter"], "Western"),
+        ("Porridge with Berries", ["160g Rolled Oats", "600ml Whole Milk", "150g Mixed Berries"], "Western"),
+        ("Bacon Bagels", ["4 Bagels", "8 rashers Bacon", "2 Tomatoes"], "Western"),
+        ("Yogurt Granola Bowls", ["500g Greek Yogurt", "100g Granola", "2 Bananas"], "Western"),
+    ],
+    "lunch": [
+        ("Chicken Caesar Wraps", ["4 Wholemeal Wraps", "300g Chicken Breast", "1 head Lettuce"], "Packed"),
+        ("Tomato Soup and Rolls", ["2 x 400g tins Chopped Tomatoes", "4 Bread Rolls", "1 Onion"], "Light"),
+        ("Hummus Veggie Pittas", ["4 Pitta Breads", "200g Hummus", "1 Cucumber", "2 Carrots"], "Packed"),
+        ("Tuna Pasta Salad", ["300g Pasta", "2 tins Tuna", "200g Sweetcorn"], "Packed"),
+    ],
+    "dinner": [
+        ("Spaghetti Bolognese", ["500g Beef Mince", "500g Spaghetti", "400g Chopped Tomatoes", "1 Onion"], "Italian"),
+        ("Chicken Katsu Curry", ["600g Chicken Thighs", "300g Basmati Rice", "1 tbsp Curry Paste"], "Japanese"),
+        ("Beef Tacos", ["500g Beef Mince", "8 Corn Tortillas", "2 Avocados", "1 Lime"], "Mexican"),
+        ("Thai Green Curry", ["600g Chicken Breast", "400ml Coconut Milk", "2 tbsp Curry Paste", "300g Rice"], "Thai"),
+        ("Fish Pie", ["4 Salmon Fillets", "1kg Potatoes", "200ml Double Cream"], "Modern British"),
+        ("Chicken Souvlaki", ["600g Chicken Thighs", "4 Pitta Breads", "100g Feta", "1 Cucumber"], "Greek"),
+        ("Cheeseburgers", ["500g Beef Mince", "4 Burger Buns", "4 slices Cheddar"], "American"),
+    ],
+}
+
+
+class FakeAPIError(Exception):
+    # Shaped like openai.APIStatusError where the gateway looks
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FakeOpenAI:
+    def __init__(self, latency=0.05, per_token=0.0, method_tokens=40, seed=0,
+                 error_rate=0.0, error_status=429, retry_after=None, slow_rate=0.0, slow_latency=1.0):
+        self.latency = latency # Fixed delay per call (seconds)
+        self.per_token = per_token # Extra delay per completion token
+        self.method_tokens = method_tokens # Pads each meal's "method" to roughly this size
+        self.seed = seed
+        self.error_rate = error_rate # Share of calls that fail with error_status
+        self.error_status = error_status
+        self.retry_after = retry_after # Sent with errors, in seconds
+        self.slow_rate = slow_rate # Share of calls that take slow_latency extra
+        self.slow_latency = slow_latency
+        self.errors = 0
+        self._faults = random.Random(seed)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._seen = {} # prompt -> times asked, so rerolls differ but thread order doesn't matter
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _pick(self, meal_type, salt):
+        bank = MEAL_BANK[meal_type if meal_type in MEAL_BANK else "dinner"]
+        h = int(hashlib.sha1(f"{self.seed}:{salt}".encode()).hexdigest(), 16)
+        name, ingredients, style = bank[h % len(bank)]
+        method = ("Cook it simply and serve hot. " * max(1, self.method_tokens // 7)).strip()
+        return {"name": f"{name} #{h % 97}", "ingredients": list(ingredients), "method": method, "style_tag": style}
+
+    def respond(self, prompt, salt):
+        if "Plan a 7-day menu" in prompt:
+            days = DAYS
+            return {"days": [{"day": d, "meals": {m: self._pick(m, f"{salt}{d}{m}") for m in MEAL_BANK}} for d in days]}
+        only = re.search(r"Only these meals: ([a-z, ]+)\.", prompt)
+        if only:
+            meals = {m: self._pick(m, f"{salt}{m}") for m in only.group(1).split(", ")}
+            style = re.search(r'Set its "style_tag" to exactly "([^"]+)"', prompt)
+            if style and "dinner" in meals:
+                meals["dinner"]["style_tag"] = style.group(1)
+            return meals
+        if "Generate ONE single meal idea" in prompt:
+            m_type = re.search(r"Type: (\w+)", prompt).group(1).lower()
+            return self._pick(m_type, salt)
+        if "Generate 3 meals" in prompt:
+            return {m: self._pick(m, f"{salt}{m}") for m in MEAL_BANK}
+        if "Suggest alternative meals" in prompt:
+            slots = re.findall(r"^\s*\d+\. (\w+) (\w+): (\d+) option", prompt, re.M)
+            return {"alternates": [[self._pick(m, f"{salt}{d}{m}{i}") for i in range(int(n))] for d, m, n in slots]}
+        if "Write a cooking guide" in prompt:
+            return {"steps": [f"Step {i}: keep going." for i in range(1, 7)], "tips": "Season as you go."}
+        if "Normalise these ingredient strings" in prompt:
+            strings = json.loads(re.search(r"(\[.*?\])\s*\n", prompt, re.S).group(1))
+            return {"items": [{"item": s, "amount": 1, "unit": "count", "est_price": 1.0} for s in strings]}
+        return {}
+
+    def respond_compact(self, schema_name, prompt, salt):
+        # Answers for compact.py's JSON-schema prompts
+        if schema_name == "week":
+            return {"w": [{k: compact.compact_meal(self._pick(m, f"{salt}{d}{m}")) for m, k in compact.MEAL_KEYS.items()}
+                          for d in DAYS]}
+        if schema_name == "alternates":
+            slots = re.findall(r"^\d+\. (\w+) (\w+) x(\d+)", prompt, re.M)
+            return {"a": [[compact.compact_meal(self._pick(m, f"{salt}{d}{m}{i}")) for i in range(int(n))]
+                          for d, m, n in slots]}
+        if schema_name == "meal":
+            m_type = re.match(r"One (\w+)", prompt).group(1)
+            return compact.compact_meal(self._pick(m_type, salt))
+        keys = schema_name.split("_", 1)[1]
+        day = {k: compact.compact_meal(self._pick(compact.TYPE_FOR_KEY[k], f"{salt}{k}")) for k in keys}
+        style = re.search(r"Dinner s=(\w+)\.", prompt)
+        if style and "d" in day:
+            day["d"]["s"] = style.group(1)
+        return day
+
+    def create(self, model, messages, response_format=None, **kwargs):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.calls += 1
+            failed = self._faults.random() < self.error_rate
+            slow = self.slow_latency if self._faults.random() < self.slow_rate else 0.0
+            if failed:
+                self.errors += 1
+        if failed:
+            time.sleep(self.latency / 5)
+            raise FakeAPIError(self.error_status, self.retry_after)
+        time.sleep(slow)
+        with self._lock:
+            n = self._seen[prompt] = self._seen.get(prompt, 0) + 1
+        salt = f"{hashlib.sha1(prompt.encode()).hexdigest()[:8]}:{n}"
+        schema = (response_format or {}).get("json_schema", {}).get("name")
+        content = json.dumps(self.respond_compact(schema, prompt, salt) if schema else self.respond(prompt, salt))
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4)
+        with self._lock:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+        if kwargs.get("stream"):
+            return self._stream(content, usage, model)
+        time.sleep(self.latency + usage.completion_tokens * self.per_token)
+        message = SimpleNamespace(content=content, role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage, model=model)
+
+    def _stream(self, content, usage, model, chunk_chars=16):
+        # First chunk after `latency`, then per_token pacing; usage rides on a final empty chunk
+        time.sleep(self.latency)
+        for i in range(0, len(content), chunk_chars):
+            piece = content[i:i + chunk_chars]
+            time.sleep(len(piece) / 4 * self.per_token)
+            delta = SimpleNamespace(content=piece, role="assistant" if i == 0 else None)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None, model=model)
+        yield SimpleNamespace(choices=[], usage=usage, model=model)
+
+
+class FakeOpenAIServer:
+    # faults: one per request in order, then every request is answered.
+    # "stall:<s>" waits s seconds first, "drop" closes the connection
+    # unanswered, a number is that HTTP status (429 carries retry_after)
+    def __init__(self, faults=(), retry_after=None, answer=None):
+        self.faults = list(faults)
+        self.retry_after = retry_after
+        self.answer = answer or FakeOpenAI(latency=0)
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    fault = server.faults.pop(0) if server.faults else None
+                if fault == "drop":
+                    self.close_connection = True
+                    return
+                if isinstance(fault, str) and fault.startswith("stall:"):
+                    time.sleep(float(fault.split(":", 1)[1]))
+                    fault = None
+                if fault is not None:
+                    self._send(int(fault), {"error": {"message": "injected", "type": "server_error"}},
+                               {"retry-after": str(server.retry_after)} if server.retry_after is not None else {})
+                    return
+                res = server.answer.create(body["model"], body["messages"], body.get("response_format"))
+                self._send(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": res.model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": res.choices[0].message.content},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": res.usage.prompt_tokens, "completion_tokens": res.usage.completion_tokens,
+                              "total_tokens": res.usage.prompt_tokens + res.usage.completion_tokens},
+                })
+
+            def _send(self, status, payload, headers=None):
+                raw = json.dumps(payload).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(raw)))
+                    for name, value in (headers or {}).items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(raw)
+                except OSError:
+                    pass # The client gave up waiting
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+        threading.Thread(target=self._server.serve_forever, name="fake-openai-http", daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
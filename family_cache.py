@@ -0,0 +1,95 @@
+import copy
+import json
+import os
+import threading
+import time
+
+from plan_ops import materialise
+
+# Process-wide copy of one family document, kept current by a snapshot
+# listener (in the app, on local_store.LocalStore). Reads are served from
+# memory; if the listener is down the cache says so (is_stale) and get()
+# falls back to a direct read.
+
+class FamilyDocCache:
+    def __init__(self, doc_ref):
+        self.doc_ref = doc_ref
+        self.version = 0 # Bumped on every snapshot
+        self.updated_at = None
+        self.exists = None
+        self._data = None
+        self._watch = None
+        self._cond = threading.Condition()
+
+    def start(self):
+        self._watch = self.doc_ref.on_snapshot(self._on_snapshot)
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _store(self, doc):
+        data = doc.to_dict() if doc is not None and doc.exists else None
+        if data and 'current_week_plan' in data:
+            data['current_week_plan'] = materialise(data['current_week_plan'])
+        with self._cond:
+            self._data = data
+            self.exists = data is not None
+            self.version += 1
+            self.updated_at = time.time()
+            self._cond.notify_all()
+
+    def _on_snapshot(self, docs, changes, read_time):
+        self._store(docs[0] if docs else None)
+
+    @property
+    def is_stale(self):
+        # No snapshot yet, or the listener has shut down after an error
+        if self.version == 0 or self._watch is None:
+            return True
+        return not getattr(self._watch, "is_active", True)
+
+    def get(self, timeout=5):
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > 0, timeout=timeout)
+        if self.is_stale:
+            # Listener is down: one direct read, then try to resubscribe
+            self._store(self.doc_ref.get())
+            try:
+                self.stop()
+                self.start()
+            except Exception:
+                pass
+        with self._cond:
+            return copy.deepcopy(self._data)
+
+    def wait_for_update(self, since, timeout=2):
+        # Block until a snapshot newer than `since` lands (e.g. our own write)
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version > since, timeout=timeout)
+
+
+# --- MEMBERS SNAPSHOT ---
+# Names and roles from the last good load, kept on disk so the member
+# picker can be drawn before Firestore has connected. PINs stay out of it.
+SNAPSHOT_PATH = "members_snapshot.json"
+SNAPSHOT_FIELDS = ("name", "role", "avatar")
+
+def load_members_snapshot(path=SNAPSHOT_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            members = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return members if isinstance(members, list) else None
+
+def save_members_snapshot(members, path=SNAPSHOT_PATH):
+    slim = [{k: m[k] for k in SNAPSHOT_FIELDS if k in m} for m in members or []]
+    if not slim or slim == load_members_snapshot(path):
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(slim, f)
+    os.replace(tmp, path)
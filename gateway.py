@@ -0,0 +1,257 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from metrics import percentile
+
+# One gateway per process in front of the model client. Every call gets:
+# - a slot from a shared semaphore (max_concurrency calls in flight),
+# - a deadline (per call site), enforced while waiting and passed down as
+#   the request timeout,
+# - retries with jittered exponential backoff on 429/5xx/timeouts, honouring
+#   Retry-After, for as long as the deadline allows,
+# - a circuit breaker: after `breaker_failures` straight failures calls fail
+#   fast for `breaker_cooldown` seconds, then one trial call is let through,
+# - optional hedging for short calls: if the first attempt hasn't answered
+#   after the site's recent p95, a duplicate is sent and the first answer wins.
+
+DEADLINES = {"meal": 20, "day": 45, "week": 90, "alternates": 60, "recipe": 30, "normalise": 20}
+HEDGE_SITES = {"meal"}
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+class LLMTimeout(LLMError):
+    pass
+
+class LLMUnavailable(LLMError):
+    # Circuit open, or retries ran out
+    pass
+
+
+def retry_after(e):
+    headers = getattr(getattr(e, "response", None), "headers", None) or getattr(e, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(e):
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUS
+    # Connection/timeout errors from the client carry no status
+    return isinstance(e, (TimeoutError, ConnectionError)) or type(e).__name__ in ("APITimeoutError", "APIConnectionError")
+
+
+class LLMGateway:
+    def __init__(self, client, max_concurrency=4, deadlines=None, max_retries=4, backoff=0.5, max_backoff=8.0,
+                 breaker_failures=5, breaker_cooldown=30.0, hedge_sites=None, hedge_default=3.0, hedge_min_samples=20):
+        self.client = client
+        self.deadlines = DEADLINES if deadlines is None else deadlines
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.hedge_sites = HEDGE_SITES if hedge_sites is None else hedge_sites
+        self.hedge_default = hedge_default # Hedge delay until a site has enough samples
+        self.hedge_min_samples = hedge_min_samples
+        self.stats = {"calls": 0, "retries": 0, "timeouts": 0, "failures": 0, "rejected": 0, "hedges": 0, "hedge_wins": 0}
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Attempts run here so a deadline can be enforced on a hung request;
+        # room for one hedge per slot
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="llm")
+        self._latency = {} # site -> recent successful attempt latencies (s)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial = False
+
+    # --- CIRCUIT BREAKER ---
+    @property
+    def circuit_open(self):
+        return time.monotonic() < self._open_until
+
+    def _admit(self):
+        with self._lock:
+            if time.monotonic() < self._open_until:
+                self.stats["rejected"] += 1
+                raise LLMUnavailable("AI is unavailable right now, try again shortly")
+            if self._failures >= self.breaker_failures:
+                # Cooldown over: half-open, one trial call at a time
+                if self._trial:
+                    self.stats["rejected"] += 1
+                    raise LLMUnavailable("AI is unavailable right now, try again shortly")
+                self._trial = True
+
+    def _succeeded(self):
+        with self._lock:
+            self._failures = 0
+            self._trial = False
+
+    def _failed(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._failures >= self.breaker_failures:
+                self._open_until = time.monotonic() + self.breaker_cooldown
+
+    # --- HEDGING ---
+    def _observe(self, site, seconds):
+        with self._lock:
+            self._latency.setdefault(site, deque(maxlen=200)).append(seconds)
+
+    def hedge_delay(self, site):
+        with self._lock:
+            recent = list(self._latency.get(site, ()))
+        if len(recent) < self.hedge_min_samples:
+            return self.hedge_default
+        return percentile(recent, 95)
+
+    # --- CALLS ---
+    def _attempt(self, deadline, kwargs):
+        # Runs on the pool; holds a concurrency slot for the whole request
+        # (for streams, until the stream is drained or dropped)
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMTimeout("Timed out waiting for a free AI slot")
+        held = True
+        try:
+            start = time.monotonic()
+            res = self.client.chat.completions.create(timeout=max(0.1, deadline - start), **kwargs)
+            if kwargs.get("stream"):
+                # First chunk here, so connection errors are retried like any other
+                res = SlotStream(res, self._slots, deadline)
+                held = False
+                res.peek()
+            return res, time.monotonic() - start
+        finally:
+            if held:
+                self._slots.release()
+
+    def _run_once(self, site, deadline, kwargs, hedge, info):
+        first = self._pool.submit(self._attempt, deadline, kwargs)
+        pending = {first}
+        if hedge:
+            done, _ = wait(pending, timeout=min(self.hedge_delay(site), max(0.0, deadline - time.monotonic())))
+            if not done:
+                with self._lock:
+                    self.stats["hedges"] += 1
+                info["hedged"] = True
+                pending.add(self._pool.submit(self._attempt, deadline, kwargs))
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                try:
+                    res, took = fut.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if fut is not first:
+                    with self._lock:
+                        self.stats["hedge_wins"] += 1
+                self._observe(site, took)
+                return res
+        if error is not None and not pending:
+            raise error
+        raise LLMTimeout(f"AI took longer than {self.deadlines.get(site, 60)}s")
+
+    def create(self, site, info=None, deadline=None, **kwargs):
+        # Same arguments as client.chat.completions.create, plus the call site.
+        # Streams are returned once the first chunk is in; the rest is read
+        # by the caller against the same deadline.
+        info = {} if info is None else info
+        deadline = time.monotonic() + (deadline or self.deadlines.get(site, 60))
+        hedge = site in self.hedge_sites and not kwargs.get("stream")
+        with self._lock:
+            self.stats["calls"] += 1
+        attempt = 0
+        while True:
+            self._admit()
+            try:
+                res = self._run_once(site, deadline, kwargs, hedge, info)
+                self._succeeded()
+                return res
+            except Exception as e:
+                retryable = isinstance(e, LLMTimeout) or is_retryable(e)
+                # Only outages count against the breaker; a bad request means it's up
+                self._failed() if retryable else self._succeeded()
+                if isinstance(e, LLMTimeout):
+                    with self._lock:
+                        self.stats["timeouts"] += 1
+                if not retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        self.stats["failures"] += 1
+                    if isinstance(e, LLMError):
+                        raise
+                    raise LLMUnavailable(f"AI request failed: {e}") from e
+                wait_s = retry_after(e)
+                if wait_s is None:
+                    wait_s = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if time.monotonic() + wait_s >= deadline:
+                    with self._lock:
+                        self.stats["failures"] += 1
+                    raise LLMTimeout(f"AI took longer than {self.deadlines.get(site, 60)}s") from e
+                attempt += 1
+                info["retries"] = attempt
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(wait_s)
+
+
+class SlotStream:
+    # Streamed response that gives its concurrency slot back once drained,
+    # failed, closed or garbage-collected, and enforces the deadline per chunk
+    def __init__(self, stream, slots, deadline):
+        self._it = iter(stream)
+        self._slots = slots
+        self._deadline = deadline
+        self._head = []
+        self._held = True
+
+    def _release(self):
+        if self._held:
+            self._held = False
+            self._slots.release()
+
+    def peek(self):
+        try:
+            self._head.append(next(self._it))
+        except StopIteration:
+            self._release()
+        except Exception:
+            self._release()
+            raise
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._head:
+            return self._head.pop()
+        if not self._held:
+            raise StopIteration
+        if time.monotonic() > self._deadline:
+            self.close()
+            raise LLMTimeout("AI stream ran past its deadline")
+        try:
+            return next(self._it)
+        except BaseException:
+            self._release()
+            raise
+
+    def close(self):
+        close = getattr(self._it, "close", None)
+        if close:
+            close()
+        self._release()
+
+    def __del__(self):
+        self._release()
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+
+from lazy import lazy_module
+from styles import match_style
+
+firestore = lazy_module("firebase_admin.firestore")
+field_path = lazy_module("google.cloud.firestore_v1.field_path")
+
+# Summaries of families/<id>/meal_history, the log rate_meal adds a doc to
+# on every tap.
+#
+# read_history pages through the log in date order with query cursors, so
+# only one page is ever in memory. aggregate() folds entries into three
+# summary docs under meal_stats (weeks, styles, meals: like / dislike /
+# count per key) and moves a high-water mark in meal_stats/cursor in the
+# same transaction, so each page is counted exactly once and a later run
+# starts where the last one stopped. compact() then moves entries past the
+# retention window, and already counted, into meal_history_archive docs
+# of ARCHIVE_CHUNK entries each, deleting the originals in the same batch.
+#
+# Entries are dated by the device when tapped, and an offline device's
+# taps land later. Only entries older than SETTLE are folded in, so those
+# have time to arrive before the mark passes them.
+#
+#   python history.py [family_id ...]   # aggregate + compact (serviceAccountKey.json)
+
+HISTORY = "meal_history"
+STATS = "meal_stats"
+ARCHIVE = "meal_history_archive"
+SUMMARIES = ("weeks", "styles", "meals")
+PAGE_SIZE = 200
+RETENTION = timedelta(weeks=8)
+SETTLE = timedelta(days=1)
+ARCHIVE_CHUNK = 400 # Plus one delete per entry, under a batch's 500 writes
+ARCHIVE_FIELDS = ["id", "date", "meal", "rating", "user", "style"]
+
+class HistoryBusy(Exception):
+    # Another run moved the mark while this one was reading
+    pass
+
+def read_history(coll, after=None, seen=(), page_size=PAGE_SIZE):
+    # Entries in date order, a page at a time. after: resume from this date,
+    # skipping the ids in seen (already taken at exactly that date)
+    query = coll.order_by("date")
+    if after is not None:
+        query = query.start_at({"date": after})
+    while True:
+        page = list(query.limit(page_size).stream())
+        for snap in page:
+            if snap.id not in seen:
+                yield snap
+        if len(page) < page_size:
+            return
+        query = coll.order_by("date").start_after(page[-1])
+
+def week_key(date):
+    year, week, _ = datetime.fromisoformat(date).isocalendar()
+    return f"{year}-W{week:02d}"
+
+def summarise(entries):
+    # [entry dict] -> {summary: {key: {"like": n, "dislike": n, "count": n}}}
+    out = {name: {} for name in SUMMARIES}
+    for e in entries:
+        keys = {"weeks": week_key(e["date"]), "styles": match_style(e.get("style")), "meals": e.get("meal")}
+        for name, key in keys.items():
+            if not key:
+                continue
+            tally = out[name].setdefault(key, {"like": 0, "dislike": 0, "count": 0})
+            tally["count"] += 1
+            if e.get("rating") in ("like", "dislike"):
+                tally[e["rating"]] += 1
+            if name == "meals":
+                tally["last"] = max(tally.get("last", ""), e["date"])
+    return out
+
+def _increments(summary):
+    # Summary -> field-path updates that add it to a stored one
+    updates = {}
+    for key, tally in summary.items():
+        for field, value in tally.items():
+            path = field_path.FieldPath(key, field).to_api_repr()
+            if field == "last":
+                updates[path] = value
+            elif value:
+                updates[path] = firestore.Increment(value)
+    return updates
+
+def _fold(db, stats, mark, page):
+    # One page into the summaries, and the mark past it, or HistoryBusy
+    entries = [dict(s.to_dict(), id=s.id) for s in page]
+    summary = summarise(entries)
+    through = entries[-1]["date"]
+    ids = [e["id"] for e in entries if e["date"] == through]
+    if through == mark.get("through"):
+        ids = mark.get("ids", []) + ids
+    new_mark = {**mark, "through": through, "ids": ids, "entries": mark.get("entries", 0) + len(entries),
+                "updated": datetime.now().isoformat()}
+
+    @firestore.transactional
+    def fold(transaction):
+        stored = stats.document("cursor").get(field_paths=["through", "entries"], transaction=transaction).to_dict()
+        if (stored or {}).get("through") != mark.get("through") or (stored or {}).get("entries", 0) != mark.get("entries", 0):
+            raise HistoryBusy("History summaries moved on while reading")
+        for name in SUMMARIES:
+            if stored is None:
+                transaction.set(stats.document(name), summary[name])
+            elif summary[name]:
+                transaction.update(stats.document(name), _increments(summary[name]))
+        transaction.set(stats.document("cursor"), new_mark)
+
+    fold(db.transaction())
+    return new_mark
+
+def aggregate(db, fam_ref, page_size=PAGE_SIZE, now=None):
+    # Folds entries newer than the mark (and older than SETTLE) into the
+    # summaries, a page per transaction -> entries added
+    stats = fam_ref.collection(STATS)
+    mark = stats.document("cursor").get().to_dict() or {}
+    settled = ((now or datetime.now()) - SETTLE).isoformat()
+    added, page = 0, []
+    for snap in read_history(fam_ref.collection(HISTORY), mark.get("through"), set(mark.get("ids", [])), page_size):
+        if snap.to_dict()["date"] >= settled:
+            break
+        page.append(snap)
+        if len(page) == page_size:
+            mark = _fold(db, stats, mark, page)
+            added, page = added + len(page), []
+    if page:
+        _fold(db, stats, mark, page)
+        added += len(page)
+    return added
+
+def _archive(db, fam_ref, chunk):
+    batch = db.batch()
+    rows = [[s.id] + [s.to_dict().get(f) for f in ARCHIVE_FIELDS[1:]] for s in chunk]
+    batch.set(fam_ref.collection(ARCHIVE).document(), {"fields": ARCHIVE_FIELDS, "entries": rows,
+                                                       "from": rows[0][1], "to": rows[-1][1]})
+    for snap in chunk:
+        batch.delete(snap.reference)
+    batch.update(fam_ref.collection(STATS).document("cursor"), {"archived": firestore.Increment(len(chunk))})
+    batch.commit()
+
+def compact(db, fam_ref, retention=RETENTION, page_size=PAGE_SIZE, now=None):
+    # Archives entries older than retention that aggregate() has counted
+    # -> entries archived
+    mark = fam_ref.collection(STATS).document("cursor").get(field_paths=["through"]).to_dict() or {}
+    if "through" not in mark:
+        return 0
+    cutoff = min(mark["through"], ((now or datetime.now()) - retention).isoformat())
+    archived, chunk = 0, []
+    for snap in read_history(fam_ref.collection(HISTORY), page_size=page_size):
+        if snap.to_dict()["date"] >= cutoff:
+            break
+        chunk.append(snap)
+        if len(chunk) == ARCHIVE_CHUNK:
+            _archive(db, fam_ref, chunk)
+            archived, chunk = archived + len(chunk), []
+    if chunk:
+        _archive(db, fam_ref, chunk)
+        archived += len(chunk)
+    return archived
+
+def maintain(db, fam_ref, retention=RETENTION, page_size=PAGE_SIZE, now=None):
+    added = aggregate(db, fam_ref, page_size, now)
+    return {"added": added, "archived": compact(db, fam_ref, retention, page_size, now)}
+
+def load_summaries(fam_ref):
+    # {"weeks": ..., "styles": ..., "meals": ...}; empty before the first run
+    stats = fam_ref.collection(STATS)
+    return {name: stats.document(name).get().to_dict() or {} for name in SUMMARIES}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import firebase_admin
+    from firebase_admin import credentials
+
+    from planner import DEFAULT_FAMILY_ID
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("families", nargs="*", default=[DEFAULT_FAMILY_ID])
+    ap.add_argument("--retention-weeks", type=float, default=RETENTION / timedelta(weeks=1))
+    ap.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = ap.parse_args()
+
+    firebase_admin.initialize_app(credentials.Certificate("serviceAccountKey.json"))
+    db = firestore.client()
+    for family_id in args.families:
+        result = maintain(db, db.collection("families").document(family_id),
+                          timedelta(weeks=args.retention_weeks), args.page_size)
+        print(f"{family_id}: {result['added']} entries summarised, {result['archived']} archived")
@@ -0,0 +1,80 @@
+import json
+
+# Incremental JSON scanner for streamed model output. Chunks are fed in as
+# they arrive; every value whose path is wanted (e.g. ("days", 0, "meals",
+# "dinner") or ("steps", 2)) is decoded and returned the moment its closing
+# brace/bracket/quote arrives, without waiting for the rest of the document.
+# Paths use keys for objects and indexes for arrays; () is the root.
+
+WS = " \t\r\n"
+
+
+class JSONStream:
+    def __init__(self, want):
+        self.want = want # path tuple -> bool
+        self.text = ""
+        self.pos = 0
+        self.stack = [] # open containers: {"obj", "key", "start", "want_key"}
+        self.in_str = False
+        self.esc = False
+        self.str_start = None
+
+    def _path(self):
+        return tuple(f["key"] for f in self.stack)
+
+    def _value_done(self, start, end, out):
+        path = self._path()
+        if self.want(path):
+            out.append((path, json.loads(self.text[start:end])))
+
+    def feed(self, chunk):
+        self.text += chunk
+        out = []
+        text = self.text
+        i = self.pos
+        while i < len(text):
+            c = text[i]
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif c == "\\":
+                    self.esc = True
+                elif c == '"':
+                    self.in_str = False
+                    top = self.stack[-1] if self.stack else None
+                    if top and top["obj"] and top["want_key"]:
+                        top["key"] = json.loads(text[self.str_start:i + 1])
+                        top["want_key"] = False
+                    else:
+                        self._value_done(self.str_start, i + 1, out)
+            elif c == '"':
+                self.in_str = True
+                self.str_start = i
+            elif c in "{[":
+                self.stack.append({"obj": c == "{", "key": None if c == "{" else 0, "start": i, "want_key": c == "{"})
+            elif c in "}]":
+                frame = self.stack.pop()
+                self._value_done(frame["start"], i + 1, out)
+            elif c == "," and self.stack:
+                top = self.stack[-1]
+                if top["obj"]:
+                    top["want_key"] = True
+                else:
+                    top["key"] += 1
+            i += 1
+        self.pos = i
+        return out
+
+
+def walk(obj, want, path=()):
+    # Same items JSONStream would emit, from an already-parsed document
+    # (cache hits), in document order. Like the scanner, bare numbers and
+    # literals are never emitted.
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            yield from walk(v, want, path + (k,))
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            yield from walk(v, want, path + (i,))
+    if isinstance(obj, (dict, list, str)) and want(path):
+        yield path, obj
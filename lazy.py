@@ -0,0 +1,71 @@
+import importlib
+import threading
+
+# Startup helpers: heavy SDKs are imported, and clients built, only when
+# something first needs them, or on a background thread while the first
+# screen is drawn.
+
+class LazyModule:
+    # Stands in for a module; the real import happens on first attribute access
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_module(name):
+    return LazyModule(name)
+
+
+class Background:
+    # Runs factory() on a daemon thread right away; result() waits for it
+    # and re-raises its error
+    def __init__(self, factory, name="warmup"):
+        self._value = None
+        self._error = None
+        self._done = threading.Event()
+        threading.Thread(target=self._run, args=(factory,), name=name, daemon=True).start()
+
+    def _run(self, factory):
+        try:
+            self._value = factory()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Still connecting")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class Deferred:
+    # Proxy that builds its target on first attribute access (thread-safe)
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, attr):
+        return getattr(self._get(), attr)
@@ -0,0 +1,113 @@
+import json
+import time
+from contextlib import nullcontext
+
+from gateway import LLMGateway
+from json_stream import JSONStream, walk
+from llm_cache import make_key
+
+# Single entry point for model calls: cache lookup, the call itself and its
+# metrics. `client` is anything shaped like openai.OpenAI (fakes.FakeOpenAI
+# in benchmarks); calls go through an LLMGateway for concurrency limits,
+# deadlines, retries and hedging (pass a shared one to cap the whole process).
+#
+# With on_item, the call streams: on_item(path, value) fires for every
+# wanted value as soon as it is complete (see json_stream), and the time to
+# the first one is recorded as first_item_ms next to the total latency.
+
+# Max age (seconds) of a cached answer per call site; 0 = always ask.
+# Rerolls and plan generation must come back different, so they skip it.
+CACHE_TTL = {
+    "week": 0,
+    "day": 0,
+    "meal": 0,
+    "alternates": 0,
+    "recipe": 30 * 24 * 3600,
+    "normalise": 30 * 24 * 3600,
+}
+
+
+class LLM:
+    def __init__(self, client, cache=None, metrics=None, ttl=None, model="gpt-4o", gateway=None):
+        self.client = client
+        self.gateway = gateway or LLMGateway(client)
+        self.cache = cache
+        self.metrics = metrics
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self.model = model
+
+    def track(self, kind, site, **fields):
+        return self.metrics.track(kind, site, **fields) if self.metrics else nullcontext({})
+
+    def chat_json(self, prompt, site, model=None, want=None, on_item=None, response_format=None, variant=None):
+        # variant (e.g. "compact") only labels the metrics, so prompt styles can be compared per site
+        model = model or self.model
+        messages = [{"role": "user", "content": prompt}]
+        response_format = response_format or { "type": "json_object" }
+        label = f"{site}/{variant}" if variant else site
+        ttl = self.ttl.get(site, 0) if self.cache else 0
+        key = make_key(model, messages, response_format) if ttl else None
+        if key:
+            with self.track("cache", label) as info:
+                hit = self.cache.get(key, max_age=ttl, site=site)
+                info["hit"] = hit is not None
+            if hit is not None:
+                parsed = json.loads(hit)
+                if on_item:
+                    for path, value in walk(parsed, want):
+                        on_item(path, value)
+                return parsed
+
+        if on_item:
+            content = self._stream(model, messages, response_format, site, label, want, on_item)
+        else:
+            content = self._complete(model, messages, response_format, site, label)
+        parsed = json.loads(content) # Only valid JSON gets cached
+        if key:
+            self.cache.put(key, content, site=site)
+        return parsed
+
+    def _complete(self, model, messages, response_format, site, label):
+        with self.track("llm", label, model=model) as info:
+            res = self.gateway.create(
+                site,
+                info=info,
+                model=model,
+                messages=messages,
+                response_format=response_format
+            )
+            if res.usage:
+                info["prompt_tokens"] = res.usage.prompt_tokens
+                info["completion_tokens"] = res.usage.completion_tokens
+            content = res.choices[0].message.content
+            info["bytes"] = len(content.encode("utf-8"))
+        return content
+
+    def _stream(self, model, messages, response_format, site, label, want, on_item):
+        parser = JSONStream(want)
+        parts = []
+        with self.track("llm", label, model=model, stream=True) as info:
+            start = time.perf_counter()
+            stream = self.gateway.create(
+                site,
+                info=info,
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    info["prompt_tokens"] = chunk.usage.prompt_tokens
+                    info["completion_tokens"] = chunk.usage.completion_tokens
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                parts.append(chunk.choices[0].delta.content)
+                for path, value in parser.feed(parts[-1]):
+                    if "first_item_ms" not in info:
+                        info["first_item_ms"] = (time.perf_counter() - start) * 1000
+                    on_item(path, value)
+            content = "".join(parts)
+            info["bytes"] = len(content.encode("utf-8"))
+        return content
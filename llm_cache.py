@@ -0,0 +1,95 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+# Persistent cache for LLM responses, keyed by what was actually asked for.
+# Entries expire by age (per call) and the least recently used ones are
+# evicted once the store grows past max_entries / max_bytes.
+
+def normalise_prompt(text):
+    # Prompts are indented f-strings; whitespace differences shouldn't miss
+    return re.sub(r"\s+", " ", text).strip()
+
+def make_key(model, messages, response_format=None):
+    payload = {
+        "model": model,
+        "messages": [{**m, "content": normalise_prompt(m.get("content", ""))} for m in messages],
+        "response_format": response_format,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path="llm_cache.sqlite3", max_entries=2000, max_bytes=20_000_000, max_age=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, site TEXT, value TEXT,"
+            " created REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self._conn.commit()
+
+    def get(self, key, max_age=None, site=""):
+        max_age = self.max_age if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > max_age:
+                self.misses[site] = self.misses.get(site, 0) + 1
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits[site] = self.hits.get(site, 0) + 1
+            return row[0]
+
+    def put(self, key, value, site=""):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, site, value, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, site, value, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.max_age,))
+        # Walk newest-first and drop everything past the size limits
+        kept, size, drop = 0, 0, []
+        for key, length in self._conn.execute("SELECT key, LENGTH(value) FROM entries ORDER BY last_used DESC"):
+            kept += 1
+            size += length or 0
+            if kept > self.max_entries or size > self.max_bytes:
+                drop.append((key,))
+        if drop:
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", drop)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": count,
+            "bytes": size,
+            "by_site": {s: {"hits": self.hits.get(s, 0), "misses": self.misses.get(s, 0)} for s in set(self.hits) | set(self.misses)},
+        }
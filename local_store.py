@@ -0,0 +1,701 @@
+import copy
+import itertools
+import json
+import random
+import re
+import sqlite3
+import string
+import threading
+import time
+from datetime import datetime
+
+from lazy import lazy_module
+
+firestore = lazy_module("firebase_admin.firestore")
+exceptions = lazy_module("google.api_core.exceptions")
+
+# Offline-first copy of the family documents.
+#
+# LocalStore keeps every document the app touches (families/<id>) in
+# SQLite and speaks the slice of the Firestore client the app uses, so
+# Planner, PlanWriter and FamilyDocCache run on it unchanged. Reads never
+# leave the machine. A commit lands locally at once and is queued in an
+# outbox; SyncWorker pushes the outbox to Firestore in order, retrying with
+# backoff while the connection is down.
+#
+# meal_history is only ever appended to here (rate_meal); nothing in the
+# app reads it back, and its meal_stats summaries are built offline by
+# history.py. So it isn't mirrored: a tap's entry waits in the store until
+# it has been pushed and is then dropped.
+#
+# Each remote document carries a _version field, bumped on every push. The
+# store remembers the version its copy is based on; if the server's differs
+# when a push runs, someone else wrote in between. Updates are field paths
+# (and Increments), so they are still applied on top of the server's copy
+# and the local copy is rebuilt from that result plus whatever is still
+# queued. A conflicting whole-document set loses to the server.
+#
+# Some edits can't be field paths: plan_ops rewrites the whole days array
+# to replace a meal. Those are queued as replay writes, the edit's own ops
+# under a name registered in REPLAYS, and every push recomputes their
+# updates from the server's copy, so a lock or reroll made meanwhile on
+# another device is kept rather than overwritten.
+#
+# Documents are stored as JSON; Firestore timestamps (datetimes) go in as
+# {"__op__": "timestamp"} markers and come back out as datetimes.
+#
+# The in-process refs below (DocumentRef, Query, Batch, Transaction, ...)
+# work on any store with read/commit/paths/watchers; fakes.FakeFirestore
+# uses them too.
+
+VERSION_FIELD = "_version"
+OP_KEY = "__op__"
+WRITE_ONLY = ("meal_history",) # Collections kept only until their entries are pushed
+
+REPLAYS = {} # name -> (doc, ops) -> field-path updates; see replay()
+_ids = itertools.count(1) # Transaction ids; document ids come from auto_id()
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_system_random = random.SystemRandom()
+KEEP = object() # ack(): the local copy already matches the server
+
+def auto_id():
+    # 20 random characters, like the SDK's: ids made offline on different
+    # devices (or before a restart) must not collide on the server
+    return "".join(_system_random.choice(_AUTO_ID_CHARS) for _ in range(20))
+
+def split_field_path(path):
+    # a.b.`c d (e)` -> ["a", "b", "c d (e)"]
+    return [p[1:-1].replace("\\`", "`") if p.startswith("`") else p
+            for p in re.findall(r"`(?:[^`\\]|\\.)*`|[^.]+", path)]
+
+def dumps(data):
+    # Firestore timestamps come back as datetimes, which json can't hold
+    return json.dumps(data, default=_timestamp)
+
+def loads(raw):
+    return json.loads(raw, object_hook=_from_timestamp)
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return {OP_KEY: "timestamp", "value": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _from_timestamp(obj):
+    return datetime.fromisoformat(obj["value"]) if obj.get(OP_KEY) == "timestamp" else obj
+
+def encode(data):
+    # DELETE_FIELD / Increment -> JSON markers, so writes can wait in the outbox
+    if not isinstance(data, dict):
+        return data
+    out = {}
+    for key, value in data.items():
+        if value is firestore.DELETE_FIELD:
+            value = {OP_KEY: "delete"}
+        elif isinstance(value, firestore.Increment):
+            value = {OP_KEY: "increment", "value": value.value}
+        out[key] = value
+    return out
+
+def decode(data):
+    if not isinstance(data, dict):
+        return data
+    out = {}
+    for key, value in data.items():
+        op = value.get(OP_KEY) if isinstance(value, dict) else None
+        if op == "delete":
+            value = firestore.DELETE_FIELD
+        elif op == "increment":
+            value = firestore.Increment(value["value"])
+        out[key] = value
+    return out
+
+def apply_update(doc, updates):
+    # Dotted field paths, Increment and DELETE_FIELD, applied like the server does
+    for path, value in encode(updates).items():
+        parts = split_field_path(path)
+        node = doc
+        for key in parts[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        leaf = parts[-1]
+        op = value.get(OP_KEY) if isinstance(value, dict) else None
+        if op == "delete":
+            node.pop(leaf, None)
+        elif op == "increment":
+            node[leaf] = node.get(leaf, 0) + value["value"]
+        else:
+            node[leaf] = copy.deepcopy(value)
+
+def mask(data, field_paths):
+    # Only the given (dotted) fields, as a masked get() returns them
+    if data is None or not field_paths:
+        return data
+    out = {}
+    for path in field_paths:
+        parts = split_field_path(path)
+        node, dst = data, out
+        for key in parts[:-1]:
+            node = node.get(key) if isinstance(node, dict) else None
+            dst = dst.setdefault(key, {})
+        if isinstance(node, dict) and parts[-1] in node:
+            dst[parts[-1]] = copy.deepcopy(node[parts[-1]])
+    return out
+
+def replay(doc, data):
+    # A replay write's updates against this copy of the document, plus the
+    # plain field paths queued with it
+    return {**REPLAYS[data["replay"]](doc, data["ops"]), **data.get("also", {})}
+
+def check_reads(reads, current):
+    # current: path -> the document now; raises Aborted if a read went stale
+    for path, (field_paths, data) in (reads or {}).items():
+        if mask(current(path), field_paths) != data:
+            raise exceptions.Aborted(f"Transaction read a stale copy of {path}")
+
+def apply_writes(docs, writes):
+    # docs: path -> data (None = absent); writes: [(kind, path, data)]
+    for kind, path, data in writes:
+        if kind == "set":
+            docs[path] = copy.deepcopy(data)
+        elif kind in ("update", "replay"):
+            if docs.get(path) is None:
+                raise KeyError(f"No document to update: {path}")
+            apply_update(docs[path], replay(docs[path], data) if kind == "replay" else data)
+        else:
+            docs[path] = None
+
+
+# --- IN-PROCESS REFS ---
+class Snapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class Watch:
+    def __init__(self, store, path, callback):
+        self.store, self.path, self.callback = store, path, callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        self.store.watchers.remove(self)
+
+
+class DocumentRef:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return CollectionRef(self.store, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        data = self.store.read(self.path, field_paths=field_paths)
+        if transaction is not None:
+            transaction.reads[self.path] = (field_paths, copy.deepcopy(data))
+        return Snapshot(self, data)
+
+    def set(self, data, merge=False):
+        self.store.commit([("set", self.path, data)])
+
+    def update(self, updates):
+        self.store.commit([("update", self.path, updates)])
+
+    def delete(self):
+        self.store.commit([("delete", self.path, None)])
+
+    def on_snapshot(self, callback):
+        watch = Watch(self.store, self.path, callback)
+        self.store.watchers.append(watch)
+        callback([Snapshot(self, self.store.read(self.path, count=False))], [], None)
+        return watch
+
+
+class CollectionRef:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    def document(self, doc_id=None):
+        return DocumentRef(self.store, f"{self.path}/{doc_id or auto_id()}")
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def stream(self):
+        prefix = self.path + "/"
+        for path in self.store.paths(prefix):
+            if "/" not in path[len(prefix):]:
+                ref = DocumentRef(self.store, path)
+                yield Snapshot(ref, self.store.read(path, count=False))
+
+    def list_documents(self):
+        # Refs only, like the client's (no document reads)
+        prefix = self.path + "/"
+        ids = {path[len(prefix):].split("/")[0] for path in self.store.paths(prefix)}
+        return [DocumentRef(self.store, prefix + i) for i in sorted(ids)]
+
+    def order_by(self, field):
+        return Query(self).order_by(field)
+
+    def limit(self, count):
+        return Query(self).limit(count)
+
+
+class Query:
+    # order_by / start_at / start_after / limit, as the Firestore client
+    # runs them: ordered by the fields then document id, a snapshot cursor
+    # carries its id, a dict cursor only the field values
+    def __init__(self, coll, orders=(), cursor=None, count=None):
+        self.coll, self.orders, self.cursor, self.count = coll, tuple(orders), cursor, count
+
+    def order_by(self, field):
+        return Query(self.coll, self.orders + (field,), self.cursor, self.count)
+
+    def limit(self, count):
+        return Query(self.coll, self.orders, self.cursor, count)
+
+    def start_at(self, values):
+        return Query(self.coll, self.orders, (values, False), self.count)
+
+    def start_after(self, values):
+        return Query(self.coll, self.orders, (values, True), self.count)
+
+    def _key(self, data):
+        return tuple(data.get(f) for f in self.orders)
+
+    def stream(self):
+        snaps = [s for s in self.coll.stream() if all(f in s._data for f in self.orders)]
+        snaps.sort(key=lambda s: (self._key(s._data), s.id))
+        if self.cursor is not None:
+            values, after = self.cursor
+            if isinstance(values, Snapshot):
+                mark, key = (self._key(values._data), values.id), lambda s: (self._key(s._data), s.id)
+            else:
+                mark, key = self._key(values), lambda s: self._key(s._data)
+            snaps = [s for s in snaps if (key(s) > mark if after else key(s) >= mark)]
+        yield from snaps[:self.count] if self.count is not None else snaps
+
+
+class Batch:
+    def __init__(self, store):
+        self.store = store
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append(("set", ref.path, data))
+
+    def update(self, ref, updates):
+        self.writes.append(("update", ref.path, updates))
+
+    def delete(self, ref):
+        self.writes.append(("delete", ref.path, None))
+
+    def commit(self):
+        writes, self.writes = self.writes, []
+        self.store.commit(writes)
+
+
+class Transaction(Batch):
+    # Speaks the private protocol firestore.transactional drives
+    # (_begin / _commit / _rollback); writes land together on commit.
+    _max_attempts = 5
+    _read_only = False
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._id = None
+        self.reads = {} # path -> (field_paths, data) as read; checked on commit
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _clean_up(self):
+        self.writes = []
+        self.reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = f"txn{next(_ids)}".encode()
+
+    def _commit(self):
+        # Aborted (and retried by firestore.transactional) if a document
+        # read here has changed since, as the server does
+        writes, self.writes = self.writes, []
+        self.store.commit(writes, reads=self.reads)
+        self._clean_up()
+        return []
+
+    def _rollback(self):
+        self._clean_up()
+
+
+class LocalTransaction(Transaction):
+    def replay(self, ref, name, ops, also=None):
+        # Queues ops for REPLAYS[name] instead of the updates they produce
+        self.writes.append(("replay", ref.path, {"replay": name, "ops": ops, "also": encode(also or {})}))
+
+
+# --- LOCAL STORE ---
+class LocalStore:
+    def __init__(self, path="family_store.sqlite3"):
+        self.path = path
+        self.watchers = []
+        self.on_miss = None # path -> None: fills a document we've never seen (SyncWorker.hydrate)
+        self.on_commit = None # () -> None: wakes the sync worker
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # remote_version: the server _version this copy is based on (NULL: not on the server)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " path TEXT PRIMARY KEY, data TEXT, remote_version INTEGER, updated REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, writes TEXT, created REAL,"
+            " attempts INTEGER DEFAULT 0, next_try REAL DEFAULT 0, error TEXT, failed INTEGER DEFAULT 0)"
+        )
+        with self._lock:
+            self._drop_pushed(self.paths()) # Older stores mirrored all of meal_history
+            self._conn.commit()
+
+    # Firestore-shaped entry points
+    def collection(self, name):
+        return CollectionRef(self, name)
+
+    def batch(self):
+        return Batch(self)
+
+    def transaction(self, **kwargs):
+        return LocalTransaction(self)
+
+    def _row(self, path):
+        return self._conn.execute("SELECT data, remote_version FROM docs WHERE path = ?", (path,)).fetchone()
+
+    def known(self, path):
+        with self._lock:
+            return self._row(path) is not None
+
+    def read(self, path, count=True, field_paths=None):
+        if self.on_miss and not self.known(path):
+            self.on_miss(path)
+        with self._lock:
+            row = self._row(path)
+        return mask(loads(row[0]), field_paths) if row and row[0] is not None else None
+
+    def paths(self, prefix=""):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM docs WHERE data IS NOT NULL AND substr(path, 1, ?) = ? ORDER BY path",
+                (len(prefix), prefix),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def _put(self, path, data, remote_version=None, keep_version=True):
+        raw = dumps(data) if data is not None else None
+        if keep_version:
+            self._conn.execute(
+                "INSERT INTO docs (path, data, remote_version, updated) VALUES (?, ?, NULL, ?)"
+                " ON CONFLICT(path) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                (path, raw, time.time()),
+            )
+        else:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO docs (path, data, remote_version, updated) VALUES (?, ?, ?, ?)",
+                (path, raw, remote_version, time.time()),
+            )
+
+    def _notify(self, paths):
+        for w in [w for w in self.watchers if w.path in paths]:
+            w.callback([Snapshot(DocumentRef(self, w.path), self.read(w.path, count=False))], [], None)
+
+    def commit(self, writes, reads=None):
+        writes = [(kind, path, encode(data)) for kind, path, data in writes]
+        for kind, path, _ in writes:
+            if kind in ("update", "replay") and self.on_miss and not self.known(path):
+                self.on_miss(path)
+        with self._lock:
+            check_reads(reads, lambda path: self.read(path, count=False))
+            docs = {}
+            for _, path, _ in writes:
+                if path not in docs:
+                    row = self._row(path)
+                    docs[path] = loads(row[0]) if row and row[0] is not None else None
+            apply_writes(docs, writes) # Raises before anything is stored
+            for path, data in docs.items():
+                self._put(path, data)
+            self._conn.execute("INSERT INTO outbox (writes, created) VALUES (?, ?)", (dumps(writes), time.time()))
+            self._conn.commit()
+        self._notify(set(docs))
+        if self.on_commit:
+            self.on_commit()
+
+    # --- SYNC SIDE ---
+    def remote_version(self, path):
+        with self._lock:
+            row = self._row(path)
+        return row[1] if row else None
+
+    def _pending(self, after=0):
+        rows = self._conn.execute(
+            "SELECT seq, writes FROM outbox WHERE failed = 0 AND seq > ? ORDER BY seq", (after,)).fetchall()
+        return [(seq, [tuple(w) for w in loads(raw)]) for seq, raw in rows]
+
+    def has_pending(self, path):
+        with self._lock:
+            return any(p == path for _, writes in self._pending() for _, p, _ in writes)
+
+    def next_push(self):
+        # Oldest queued commit: (seq, writes, attempts, next_try), or None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq, writes, attempts, next_try FROM outbox WHERE failed = 0 ORDER BY seq LIMIT 1").fetchone()
+        if row is None:
+            return None
+        return row[0], [tuple(w) for w in loads(row[1])], row[2], row[3]
+
+    def _drop_pushed(self, paths):
+        # Forget write-only entries with nothing left to push
+        pending = {p for _, writes in self._pending() for _, p, _ in writes}
+        for path in paths:
+            parts = path.split("/")
+            if len(parts) > 2 and parts[-2] in WRITE_ONLY and path not in pending:
+                self._conn.execute("DELETE FROM docs WHERE path = ?", (path,))
+
+    def ack(self, seq, results):
+        # results: path -> (server version, rebased copy or KEEP). A copy
+        # means the server had moved on: ours is rebuilt from it plus
+        # whatever is still queued
+        rebased = set()
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+            later = [w for _, writes in self._pending(after=seq) for w in writes]
+            for path, (version, server_copy) in results.items():
+                if server_copy is KEEP:
+                    self._conn.execute("UPDATE docs SET remote_version = ? WHERE path = ?", (version, path))
+                    continue
+                docs = {path: server_copy}
+                try:
+                    apply_writes(docs, [w for w in later if w[1] == path])
+                except KeyError:
+                    pass # A queued update for a document the server deleted
+                self._put(path, docs[path], version, keep_version=False)
+                rebased.add(path)
+            self._drop_pushed(results)
+            self._conn.commit()
+        self._notify(rebased)
+
+    def retry_later(self, seq, error, next_try, give_up=False):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, next_try = ?, error = ?, failed = ? WHERE seq = ?",
+                (next_try, error, int(give_up), seq),
+            )
+            self._conn.commit()
+
+    def pull(self, path, data, version):
+        # Take the server's copy unless we have edits queued for it (the
+        # push will reconcile) or it's the copy we already hold. Contents
+        # are compared too: batch_plan, seed_db or a console edit can
+        # change a doc without bumping its version
+        with self._lock:
+            row = self._row(path)
+            if row is not None and self.has_pending(path):
+                return False
+            if row is not None and row[1] == version and (loads(row[0]) if row[0] is not None else None) == data:
+                return False
+            self._put(path, data, version, keep_version=False)
+            self._conn.commit()
+        self._notify({path})
+        return True
+
+    def stats(self):
+        with self._lock:
+            docs = self._conn.execute("SELECT COUNT(*) FROM docs WHERE data IS NOT NULL").fetchone()[0]
+            pending, failed = self._conn.execute(
+                "SELECT COALESCE(SUM(failed = 0), 0), COALESCE(SUM(failed), 0) FROM outbox").fetchone()
+        return {"docs": docs, "pending": pending, "failed": failed}
+
+
+# --- SYNC ---
+def remote_ref(db, path):
+    parts = path.split("/")
+    ref = db.collection(parts[0]).document(parts[1])
+    for i in range(2, len(parts) - 1, 2):
+        ref = ref.collection(parts[i]).document(parts[i + 1])
+    return ref
+
+def _server_copy(snap):
+    # (data without the version field, version); (None, None) if absent
+    data = snap.to_dict() if snap.exists else None
+    if data is None:
+        return None, None
+    return data, data.pop(VERSION_FIELD, 0)
+
+
+class SyncWorker:
+    def __init__(self, store, connect, backoff=0.5, max_backoff=30.0, max_attempts=20):
+        self.store = store
+        self.connect = connect # () -> Firestore client; may block, runs off the UI thread
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts # Then the commit is parked as failed
+        self.stats = {"pushed": 0, "pulled": 0, "conflicts": 0, "retries": 0, "failed": 0}
+        self.online = False
+        self.last_error = None
+        self._remote = None
+        self._follows = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        store.on_miss = self.hydrate
+        store.on_commit = self._wake.set
+        threading.Thread(target=self._run, name="store-sync", daemon=True).start()
+
+    def remote(self):
+        with self._lock:
+            if self._remote is None:
+                self._remote = self.connect()
+                fresh = True
+            else:
+                fresh = False
+        if fresh:
+            # Families already on disk: follow them
+            for path in self.store.paths():
+                if path.count("/") == 1:
+                    self.follow(path)
+        return self._remote
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        with self._lock:
+            follows, self._follows = self._follows, {}
+        for watch in follows.values():
+            if watch is not None:
+                watch.unsubscribe()
+
+    def hydrate(self, path):
+        # First read of a document: one blocking fetch, then follow it
+        snap = remote_ref(self.remote(), path).get()
+        self.store.pull(path, *_server_copy(snap))
+        if path.count("/") == 1:
+            self.follow(path)
+
+    def follow(self, path):
+        with self._lock:
+            if path in self._follows:
+                return
+            self._follows[path] = None # Claimed; a second caller backs off
+        try:
+            watch = remote_ref(self._remote, path).on_snapshot(
+                lambda docs, changes, read_time: self._on_remote(path, docs))
+        except Exception:
+            with self._lock:
+                self._follows.pop(path, None)
+            raise
+        with self._lock:
+            self._follows[path] = watch
+
+    def _on_remote(self, path, docs):
+        snap = docs[0] if docs else None
+        data, version = _server_copy(snap) if snap is not None else (None, None)
+        if self.store.pull(path, data, version):
+            self.stats["pulled"] += 1
+
+    def wait_idle(self, timeout=10):
+        # True once everything queued has been pushed (or parked as failed)
+        end = time.monotonic() + timeout
+        while self.store.stats()["pending"]:
+            if time.monotonic() > end:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.clear()
+            try:
+                remote = self.remote()
+            except Exception as e:
+                self.online = False
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._wake.wait(self.max_backoff)
+                continue
+            entry = self.store.next_push()
+            if entry is None:
+                self.online = True
+                self._wake.wait(1.0)
+                continue
+            seq, writes, attempts, next_try = entry
+            if next_try > time.time():
+                self._wake.wait(next_try - time.time())
+                continue
+            try:
+                self._push(remote, seq, writes)
+                self.online = True
+            except Exception as e:
+                self.online = False
+                self.last_error = f"{type(e).__name__}: {e}"
+                give_up = attempts + 1 >= self.max_attempts
+                self.stats["failed" if give_up else "retries"] += 1
+                delay = min(self.backoff * 2 ** attempts, self.max_backoff) * random.uniform(0.5, 1.0)
+                self.store.retry_later(seq, self.last_error, time.time() + delay, give_up)
+
+    def _push(self, remote, seq, writes):
+        refs = {path: remote_ref(remote, path) for _, path, _ in writes}
+        results = {}
+
+        @firestore.transactional
+        def push(transaction):
+            results.clear()
+            server = {path: _server_copy(ref.get(transaction=transaction)) for path, ref in refs.items()}
+            docs = {path: copy.deepcopy(data) for path, (data, _) in server.items()}
+            conflicts, sends = set(), []
+            for kind, path, data in writes:
+                if server[path][1] != self.store.remote_version(path):
+                    conflicts.add(path)
+                if kind == "set" and path in conflicts and docs[path] is not None:
+                    continue # Someone else's copy wins over a whole-document set
+                if kind in ("update", "replay") and docs[path] is None:
+                    conflicts.add(path) # Gone on the server
+                    continue
+                if kind == "replay":
+                    # Rebuilt on the server's copy, so edits made there meanwhile survive
+                    kind, data = "update", encode(replay(docs[path], data))
+                apply_writes(docs, [(kind, path, data)])
+                sends.append([kind, path, data])
+            # One version bump per document, carried by its last write
+            versions = {}
+            for send in reversed(sends):
+                kind, path, data = send
+                if kind != "delete" and path not in versions:
+                    versions[path] = (server[path][1] or 0) + 1
+                    send[2] = {**data, VERSION_FIELD: versions[path]}
+            for kind, path, data in sends:
+                if kind == "set":
+                    transaction.set(refs[path], decode(data))
+                elif kind == "update":
+                    transaction.update(refs[path], decode(data))
+                else:
+                    transaction.delete(refs[path])
+            for path in refs:
+                version = versions.get(path, server[path][1]) if docs[path] is not None else None
+                results[path] = (version, docs[path] if path in conflicts else KEEP)
+            return conflicts
+
+        conflicts = push(remote.transaction())
+        self.stats["pushed"] += 1
+        self.stats["conflicts"] += len(conflicts)
+        self.store.ack(seq, results)
@@ -0,0 +1,194 @@
+import json
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# In-process call metrics for the LLM and Firestore. Each call appends one
+# small record to a bounded per-(kind, site) window; percentiles are only
+# computed when someone asks for a summary, so the hot path is a clock read
+# and a deque append.
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+def payload_size(obj):
+    try:
+        return len(json.dumps(obj, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Metrics:
+    def __init__(self, window=500, history=5000):
+        self.window = window
+        self._series = {} # (kind, site) -> deque of records
+        self._log = deque(maxlen=history) # every record, for export
+        self._lock = threading.Lock()
+
+    def record(self, kind, site, latency, prompt_tokens=0, completion_tokens=0, bytes=0, error=None, retries=0, **extra):
+        rec = {
+            "ts": time.time(), "kind": kind, "site": site, "latency_ms": latency * 1000,
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "bytes": bytes, "error": error, "retries": retries, **extra,
+        }
+        with self._lock:
+            series = self._series.get((kind, site))
+            if series is None:
+                series = self._series[(kind, site)] = deque(maxlen=self.window)
+            series.append(rec)
+            self._log.append(rec)
+        return rec
+
+    @contextmanager
+    def track(self, kind, site, **fields):
+        # The caller can fill in tokens/bytes/retries on the yielded dict
+        info = dict(fields)
+        start = time.perf_counter()
+        try:
+            yield info
+        except Exception as e:
+            info["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(kind, site, time.perf_counter() - start, **info)
+
+    def summary(self):
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        rows = []
+        for (kind, site), recs in sorted(series.items()):
+            lat = [r["latency_ms"] for r in recs]
+            # Streamed calls: time until the first meal/step could be shown
+            first = [r["first_item_ms"] for r in recs if r.get("first_item_ms") is not None]
+            rows.append({
+                "kind": kind, "site": site, "calls": len(recs),
+                "errors": sum(1 for r in recs if r["error"]),
+                "retries": sum(r["retries"] for r in recs),
+                "p50_ms": round(percentile(lat, 50), 1), "p95_ms": round(percentile(lat, 95), 1),
+                "first_p50_ms": round(percentile(first, 50), 1) if first else None,
+                "prompt_tokens": sum(r["prompt_tokens"] for r in recs),
+                "completion_tokens": sum(r["completion_tokens"] for r in recs),
+                "bytes": sum(r["bytes"] for r in recs),
+            })
+        return rows
+
+    def latencies(self, kind, site):
+        with self._lock:
+            return [r["latency_ms"] for r in self._series.get((kind, site), ())]
+
+    def to_jsonl(self):
+        with self._lock:
+            recs = list(self._log)
+        return "".join(json.dumps(r, default=str) + "\n" for r in recs)
+
+    def export_jsonl(self, path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_jsonl())
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._log.clear()
+
+
+# --- FIRESTORE WRAPPER ---
+# Thin proxies around the client, collection and document refs that time
+# get/set/update/add/delete and batch commits. Everything else (on_snapshot,
+# transactions, private attributes the SDK reads) passes straight through.
+
+def _call_site():
+    # First frame outside this module; the app's own function name if it's on the stack
+    frame = sys._getframe(2)
+    fallback = None
+    for _ in range(12):
+        if frame is None:
+            break
+        if frame.f_code.co_filename != __file__:
+            if frame.f_globals.get("__name__") == "__main__":
+                name = frame.f_code.co_name
+                return fallback if name == "<module>" and fallback else name
+            fallback = fallback or frame.f_code.co_name
+        frame = frame.f_back
+    return fallback or "?"
+
+
+class _Proxy:
+    def __init__(self, target, metrics):
+        self._target = target
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def _timed(self, op, fn, *args, payload=None, **kwargs):
+        with self._metrics.track("firestore", f"{_call_site()}:{op}") as info:
+            result = fn(*args, **kwargs)
+            if payload is not None:
+                info["bytes"] = payload_size(payload)
+            elif op == "get" and getattr(result, "exists", False):
+                info["bytes"] = payload_size(result.to_dict())
+            return result
+
+
+class InstrumentedDocument(_Proxy):
+    def collection(self, name):
+        return InstrumentedCollection(self._target.collection(name), self._metrics)
+
+    def get(self, *args, **kwargs):
+        return self._timed("get", self._target.get, *args, **kwargs)
+
+    def set(self, data, *args, **kwargs):
+        return self._timed("set", self._target.set, data, *args, payload=data, **kwargs)
+
+    def update(self, updates, *args, **kwargs):
+        return self._timed("update", self._target.update, updates, *args, payload=updates, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._timed("delete", self._target.delete, *args, **kwargs)
+
+
+class InstrumentedCollection(_Proxy):
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._target.document(*args, **kwargs), self._metrics)
+
+    def add(self, data, *args, **kwargs):
+        return self._timed("add", self._target.add, data, *args, payload=data, **kwargs)
+
+
+class InstrumentedBatch(_Proxy):
+    def __init__(self, target, metrics):
+        super().__init__(target, metrics)
+        self._payload = []
+
+    def set(self, ref, data, *args, **kwargs):
+        self._payload.append(data)
+        return self._target.set(getattr(ref, "_target", ref), data, *args, **kwargs)
+
+    def update(self, ref, updates, *args, **kwargs):
+        self._payload.append(updates)
+        return self._target.update(getattr(ref, "_target", ref), updates, *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        return self._target.delete(getattr(ref, "_target", ref), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        payload, self._payload = self._payload, []
+        return self._timed("batch", self._target.commit, *args, payload=payload, **kwargs)
+
+
+class InstrumentedFirestore(_Proxy):
+    def collection(self, name):
+        return InstrumentedCollection(self._target.collection(name), self._metrics)
+
+    def batch(self):
+        return InstrumentedBatch(self._target.batch(), self._metrics)
+
+
+def instrument_firestore(db, metrics):
+    return InstrumentedFirestore(db, metrics) if db is not None else None
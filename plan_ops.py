@@ -0,0 +1,171 @@
+import copy
+import json
+
+from lazy import lazy_module
+from local_store import REPLAYS
+
+# Imported on first use, so importing this module stays cheap
+firestore = lazy_module("firebase_admin.firestore")
+
+# Small mutation API for families/<id>.current_week_plan.
+#
+# Firestore can't address array elements by field path, and the plan keeps
+# its days in an array. Per-slot scalars (the lock flag, recipe_details) are
+# therefore written to a side map, current_week_plan.slot_state.<Day>_<meal>,
+# with a dotted-path update and folded back into the days on read by
+# materialise(). Replacing a whole meal or day has to rewrite the array, so
+# those edits run in a transaction that also folds slot_state back in.
+#
+# Edits queue on a PlanWriter and flush() sends them as one write, along
+# with any other fields handed to also(). Against a LocalStore the array
+# rewrite is queued as its ops instead (a replay write), so the sync worker
+# can redo it on the server's copy of the plan; fields that are worked out
+# from the document, like the shopping ledger's totals, are handed to
+# also_replay() to be redone the same way.
+
+PLAN = "current_week_plan"
+SLOT_STATE = "slot_state"
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner']
+
+
+def slot_key(day_name, meal_type):
+    return f"{day_name}_{meal_type}"
+
+
+def payload_bytes(obj):
+    return len(json.dumps(obj, default=str).encode("utf-8"))
+
+
+def materialise(plan):
+    # Fold slot_state overrides into the meals; returns a plain days-only plan
+    if not plan or SLOT_STATE not in plan:
+        return plan
+    plan = dict(plan)
+    state = plan.pop(SLOT_STATE) or {}
+    for day in plan.get('days', []):
+        for m_type, meal in day.get('meals', {}).items():
+            meal.update(state.get(slot_key(day['day'], m_type), {}))
+    return plan
+
+
+def _find_day(plan, day_name):
+    return next((d for d in plan.get('days', []) if d.get('day') == day_name), None)
+
+
+def _apply(plan, op):
+    kind, day_name = op[0], op[1]
+    day = _find_day(plan, day_name)
+    if day is None:
+        return
+    meals = day.setdefault('meals', {})
+    if kind == "field":
+        _, _, m_type, field, value = op
+        if m_type in meals:
+            meals[m_type][field] = value
+    elif kind == "meal":
+        _, _, m_type, meal = op
+        if not meals.get(m_type, {}).get('locked', False):
+            meals[m_type] = meal
+    elif kind == "day":
+        _, _, new_meals = op
+        for m_type, meal in new_meals.items():
+            if not meals.get(m_type, {}).get('locked', False):
+                meals[m_type] = meal
+
+
+def plan_updates(doc, ops):
+    # The array rewrite for ops applied to this copy of the family doc;
+    # returns (updates, plan)
+    plan = materialise(copy.deepcopy((doc or {}).get(PLAN, {}))) or {}
+    for op in ops:
+        _apply(plan, op)
+    return {f"{PLAN}.days": plan.get('days', []), f"{PLAN}.{SLOT_STATE}": firestore.DELETE_FIELD}, plan
+
+REPLAYS["plan"] = lambda doc, ops: plan_updates(doc, ops)[0]
+
+
+class PlanWriter:
+    def __init__(self, db, doc_ref, plan=None):
+        self.db = db
+        self.doc_ref = doc_ref
+        # Local copy of the plan, kept in step with queued edits
+        self.plan = copy.deepcopy(materialise(plan) or {})
+        self.ops = []
+        self.extra = {} # Other field-path updates to send with the plan edits
+        self.replays = [] # (REPLAYS name, ops, updates against our copy)
+        self.last_stats = None
+
+    def set_field(self, day_name, meal_type, field, value):
+        # Scalar on one meal, e.g. locked / recipe_details
+        op = ("field", day_name, meal_type, field, value)
+        self.ops.append(op)
+        _apply(self.plan, op)
+
+    def replace_meal(self, day_name, meal_type, meal):
+        # Skipped at commit time if the slot has been locked meanwhile
+        op = ("meal", day_name, meal_type, meal)
+        self.ops.append(op)
+        _apply(self.plan, op)
+
+    def replace_day(self, day_name, meals):
+        op = ("day", day_name, meals)
+        self.ops.append(op)
+        _apply(self.plan, op)
+
+    def also(self, updates):
+        self.extra.update(updates)
+
+    def also_replay(self, name, ops, updates):
+        # Queued as REPLAYS[name] on top of the plan edits where the store
+        # replays writes; elsewhere `updates` is sent as it is
+        self.replays.append((name, ops, updates))
+
+    @property
+    def pending(self):
+        return len(self.ops)
+
+    def flush(self):
+        if not self.ops:
+            return None
+        ops, self.ops = self.ops, []
+        extra, self.extra = self.extra, {}
+        replays, self.replays = self.replays, []
+        full_bytes = payload_bytes({PLAN: self.plan})
+        if all(op[0] == "field" for op in ops) and not replays:
+            updates = dict(extra)
+            for _, day_name, m_type, field, value in ops:
+                updates[f"{PLAN}.{SLOT_STATE}.{slot_key(day_name, m_type)}.{field}"] = value
+            self.doc_ref.update(updates)
+        else:
+            updates = self._commit_in_transaction(ops, extra, replays)
+        self.last_stats = {
+            "edits": len(ops),
+            "bytes": payload_bytes(updates),
+            "full_plan_bytes": full_bytes,
+        }
+        return self.last_stats
+
+    def _commit_in_transaction(self, ops, extra=None, replays=()):
+        sent = {}
+        extra = extra or {}
+        worked_out = {k: v for _, _, updates in replays for k, v in updates.items()}
+
+        @firestore.transactional
+        def run(transaction):
+            snap = self.doc_ref.get(field_paths=[PLAN], transaction=transaction)
+            updates, plan = plan_updates(snap.to_dict(), ops)
+            replay = getattr(transaction, "replay", None)
+            if replay is not None:
+                replay(self.doc_ref, "plan", ops, extra)
+                for name, replay_ops, _ in replays:
+                    replay(self.doc_ref, name, replay_ops)
+            else:
+                transaction.update(self.doc_ref, {**updates, **extra, **worked_out})
+            sent.clear()
+            sent.update({f"{PLAN}.days": plan.get('days', []), **extra, **worked_out})
+            self.plan = plan
+
+        run(self.db.transaction())
+        return sent
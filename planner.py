@@ -0,0 +1,655 @@
+import copy
+import json
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import compact
+from lazy import lazy_module
+from local_store import REPLAYS
+from plan_ops import PlanWriter, DAYS, MEAL_TYPES, PLAN, materialise, slot_key
+from ratings import record_rating
+from recipe_library import ingredient_terms
+from shopping import STORE_INDEX, ShoppingLedger, parse_ingredient, parsed_from_llm, src_hash
+from styles import ALL_STYLES, match_style
+
+firestore = lazy_module("firebase_admin.firestore")
+field_path = lazy_module("google.cloud.firestore_v1.field_path")
+
+# Meal-planning logic behind the app, with no Streamlit in it: the UI, the
+# benchmarks and headless jobs all drive the same Planner. Failures raise;
+# the caller decides how to show them.
+#
+# Generators take an optional on_meal(day, meal_type, meal) (and
+# fetch_recipe an on_step(index, step)); when given, the model call streams
+# and each meal is handed over as soon as its JSON object closes. Callbacks
+# always run on the caller's thread, so they may draw to the page.
+
+DEFAULT_FAMILY_ID = "fam_8829_xyz"
+LEDGER = "shopping_ledger" # shopping.ShoppingLedger, kept in step with the plan
+SPLIT_STORES = 2 # Most shops a split-basket suggestion sends you to
+TRIP_COST = 3.0 # What an extra shop has to save to be worth it (GBP)
+
+class MealLocked(Exception):
+    pass
+
+def get_style_preferences(family_data):
+    prefs = family_data.get('style_preferences', {})
+    favorites = [s for s in ALL_STYLES if prefs.get(s, 0) > 2]
+    disliked = [s for s in ALL_STYLES if prefs.get(s, 0) < -1]
+    return favorites, disliked
+
+def get_locked_meals(plan):
+    locked_meals = {} # Store locked meal objects to restore later
+    for day in plan.get('days', []):
+        for m_type, m_data in day.get('meals', {}).items():
+            if m_data.get('locked', False):
+                # Save the whole meal object (including recipe details if they exist)
+                locked_meals[f"{day['day']}_{m_type}"] = m_data
+    return locked_meals
+
+def pick_dinner_styles(day_names, favorites, disliked, taken=()):
+    # Decide every dinner cuisine up front so parallel calls can't repeat one
+    favs = [s for s in favorites if s not in taken]
+    rest = [s for s in ALL_STYLES if s not in disliked and s not in taken and s not in favs]
+    random.shuffle(favs)
+    random.shuffle(rest)
+    pool = favs + rest or list(ALL_STYLES)
+    return {d: pool[i % len(pool)] for i, d in enumerate(day_names)}
+
+def calculate_comparison(items):
+    if not items: return []
+    return store_comparison(sum(i['est_price'] for i in items))
+
+def store_comparison(total):
+    if not total: return []
+    return sorted([{"store": s, "total": total * m} for s, m in STORE_INDEX.items()], key=lambda x: x['total'])
+
+def pantry(family_data):
+    # What the kitchen already has; left off the shopping list
+    kitchen = family_data.get('kitchen_profile', {})
+    return kitchen.get('pantry_staples', []) + kitchen.get('current_inventory', [])
+
+def shopping_view(family_data, prices=None):
+    # -> (items, store comparison, split, unlisted strings) as the Shop tab
+    # shows them. With a prices.PriceBook the stores are priced item by item
+    # and split is the cheapest way across SPLIT_STORES shops; without one
+    # it's the estimate times STORE_INDEX, and no split
+    if LEDGER not in family_data:
+        # Lists built before the ledger existed
+        return family_data.get('shopping_list', []), family_data.get('price_comparison', []), None, []
+    ledger = ShoppingLedger(family_data[LEDGER])
+    have = pantry(family_data)
+    if prices is None:
+        return ledger.items(have), store_comparison(ledger.total_for(have)), None, ledger.unlisted()
+    lines = ledger.lines(have)
+    split = prices.best_split(lines, SPLIT_STORES, TRIP_COST)
+    return ledger.items(have), prices.compare(lines), split, ledger.unlisted()
+
+def ledger_updates(ledger):
+    # Field-path updates for what changed in the ledger
+    return {field_path.FieldPath(LEDGER, *parts).to_api_repr(): firestore.DELETE_FIELD if value is None else value
+            for parts, value in ledger.changes().items()}
+
+def replay_ledger(doc, slots):
+    # REPLAYS["ledger"]: slots as another copy of the ledger stored them,
+    # put into this doc's ledger so its totals move by their difference. A
+    # slot whose meal here has other ingredients is left for sync_ledger
+    ledger = ShoppingLedger((doc or {}).get(LEDGER))
+    plan = materialise(copy.deepcopy((doc or {}).get(PLAN))) or {}
+    meals = {slot_key(d['day'], m): meal for d in plan.get('days', []) for m, meal in d.get('meals', {}).items()}
+    for slot, stored in slots.items():
+        src = list((meals.get(slot) or {}).get('ingredients', []))
+        if (stored or {}).get("src") == (src_hash(src) if src else None):
+            ledger.put_slot(slot, stored)
+    return ledger_updates(ledger)
+
+REPLAYS["ledger"] = replay_ledger
+
+
+class Planner:
+    def __init__(self, db, llm, family_id=DEFAULT_FAMILY_ID, load=None, prefetcher=None,
+                 parallel=True, workers=4, library=None, compact=False, prices=None, save=None, alternates=None):
+        self.db = db
+        self.llm = llm
+        self.family_id = family_id
+        self._load = load # () -> family data; defaults to a direct read
+        self.prefetcher = prefetcher
+        self.library = library # RecipeLibrary: rerolls try it before the model
+        self.parallel = parallel # Week generation fans out one call per day
+        self.workers = workers
+        self.compact = compact # Short prompts + JSON-schema output (see compact.py)
+        self.prices = prices # prices.PriceBook; the LLM's est_price only covers what it lacks
+        self._save = save # (fam_ref, updates) for whole-plan saves; batch_plan.py queues them
+        self.alternates = alternates # AlternatePool: rerolls pop a pre-generated meal first
+        self.last_write = None
+        self.unlisted = [] # Ingredients the last shopping list had to leave out
+
+    @property
+    def fam_ref(self):
+        return self.db.collection("families").document(self.family_id)
+
+    def data(self):
+        if self._load:
+            return self._load()
+        data = self.fam_ref.get().to_dict() or {}
+        if PLAN in data:
+            data[PLAN] = materialise(data[PLAN])
+        return data
+
+    def writer(self, plan=None):
+        if plan is None:
+            plan = self.data().get(PLAN, {})
+        return PlanWriter(self.db, self.fam_ref, plan)
+
+    def flush(self, writer, slots=(), data=None):
+        # slots: (day, meal_type) pairs whose meals the writer replaces; their
+        # shopping-list lines ride along in the same write, redone against
+        # the server's ledger where the store replays writes
+        if slots:
+            ledger = self.sync_ledger(writer.plan, slots, data)
+            changed = {parts[1]: value for parts, value in ledger.changes().items() if parts[0] == "slots"}
+            if changed:
+                writer.also_replay("ledger", changed, ledger_updates(ledger))
+        stats = writer.flush()
+        if stats:
+            self.last_write = stats
+        return writer.plan
+
+    def _plan_saved(self, plan):
+        if self.prefetcher:
+            self.prefetcher.schedule(plan)
+        if self.alternates:
+            self.alternates.schedule(plan)
+        if self.library:
+            self.library.add_plan(plan)
+
+    def _slot_replaced(self, day_name, meal_type):
+        if self.prefetcher:
+            self.prefetcher.cancel(day_name, meal_type)
+
+    def save_plan(self, plan, data=None):
+        slots = [(d, m) for d in DAYS for m in MEAL_TYPES]
+        updates = {PLAN: plan, **self.shopping_updates(plan, slots, data)}
+        if self._save:
+            self._save(self.fam_ref, updates)
+        else:
+            self.fam_ref.update(updates)
+        if self.alternates:
+            self.alternates.reset() # A new week: the old alternates were picked against the old one
+        self._plan_saved(plan)
+        return plan
+
+    def _meal_stream(self, on_meal, slot_of, expand=None):
+        # chat_json streaming kwargs; slot_of(path) -> (day, meal_type) or None,
+        # expand(raw, meal_type) -> meal for compact responses
+        if not on_meal:
+            return {}
+        def on_item(path, meal):
+            day_name, m_type = slot_of(path)
+            on_meal(day_name, m_type, expand(meal, m_type) if expand else meal)
+        return {"want": lambda path: slot_of(path) is not None, "on_item": on_item}
+
+    # --- CORE GENERATOR (Used for Week & Day) ---
+    def generate_day_meals(self, day_name, meal_types, family_count, favorites, disliked, dinner_style=None, on_meal=None):
+        if self.compact:
+            prompt = compact.day_prompt(day_name, meal_types, family_count, favorites, disliked, dinner_style)
+            slot = lambda p: (day_name, compact.day_slot(p)) if compact.day_slot(p) in meal_types else None
+            raw = self.llm.chat_json(prompt, "day", response_format=compact.day_format(meal_types), variant="compact",
+                                     **self._meal_stream(on_meal, slot, compact.expand_meal))
+            meals = compact.expand_day(raw, meal_types)
+        else:
+            meals = self._generate_day_meals_verbose(day_name, meal_types, family_count, favorites, disliked, dinner_style, on_meal)
+        missing = [m for m in meal_types if m not in meals]
+        if missing:
+            raise ValueError(f"{day_name} is missing {', '.join(missing)}")
+        return {m: meals[m] for m in meal_types}
+
+    def _generate_day_meals_verbose(self, day_name, meal_types, family_count, favorites, disliked, dinner_style, on_meal):
+        meal_list = ", ".join(meal_types)
+        dinner_rule = f'5. DINNER STYLE: {dinner_style}. Set its "style_tag" to exactly "{dinner_style}".' if dinner_style else ""
+        examples = ",\n".join(
+            f'"{m}": {{ "name": "...", "ingredients": ["Qty Item", "Qty Item"], "method": "...", "style_tag": "..." }}'
+            for m in meal_types
+        )
+
+        prompt = f"""
+        Plan {day_name} for {family_count} PEOPLE. Only these meals: {meal_list}.
+
+        CRITICAL RULES:
+        1. INGREDIENTS: You MUST include specific quantities scaled for {family_count} people.
+           (e.g., "500g Beef Mince", "4 Burger Buns", "1 tbsp Oil"). DO NOT just say "Beef".
+        2. BREAKFAST: Western/UK Standard.
+        3. LUNCH: Light/Packed.
+        4. PREFERENCES: LOVES {", ".join(favorites) if favorites else "Any"}; HATES {", ".join(disliked) if disliked else "None"}.
+        {dinner_rule}
+
+        OUTPUT JSON:
+        {{
+        {examples}
+        }}
+        """
+        return self.llm.chat_json(prompt, "day", **self._meal_stream(on_meal, lambda p: (day_name, p[0]) if len(p) == 1 and p[0] in meal_types else None))
+
+    def generate_week_plan(self, on_day=None, on_meal=None):
+        # on_day(day) / on_meal(day, meal_type, meal) are called from this thread as
+        # each day / meal lands; the whole run is recorded as ("plan", "week") with
+        # its time to first meal
+        with self.llm.track("plan", "week") as info:
+            start = time.perf_counter()
+            def first_meal(d, m, meal):
+                info.setdefault("first_item_ms", (time.perf_counter() - start) * 1000)
+                if on_meal: on_meal(d, m, meal)
+            if not self.parallel:
+                return self.generate_week_plan_single(on_meal=first_meal)
+            return self._generate_week_parallel(on_day, first_meal)
+
+    def _generate_week_parallel(self, on_day, on_meal):
+        data = self.data()
+        locked_meals = get_locked_meals(data.get(PLAN, {}))
+        favorites, disliked = get_style_preferences(data)
+        family_count = len(data.get('members', []))
+
+        # Locked dinners keep their cuisine, so no other day may reuse it
+        open_dinners = [d for d in DAYS if f"{d}_dinner" not in locked_meals]
+        # (style_tag is as the model wrote it, e.g. "Italian")
+        taken = {match_style(m.get('style_tag')) for k, m in locked_meals.items() if k.endswith('_dinner')} - {None}
+        styles = pick_dinner_styles(open_dinners, favorites, disliked, taken)
+
+        for key, meal in locked_meals.items():
+            d, m = key.split("_", 1)
+            on_meal(d, m, meal)
+
+        days = {}
+        # Workers post streamed meals and finished days here; this thread drains it
+        events = queue.Queue()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = 0
+            for d in DAYS:
+                open_types = [m for m in MEAL_TYPES if f"{d}_{m}" not in locked_meals]
+                if not open_types:
+                    # Fully locked day: nothing to ask for
+                    days[d] = {"day": d, "meals": {m: locked_meals[f"{d}_{m}"] for m in MEAL_TYPES}}
+                    if on_day: on_day(days[d])
+                    continue
+                fut = pool.submit(self.generate_day_meals, d, open_types, family_count, favorites, disliked, styles.get(d),
+                                  on_meal=lambda d, m, meal: events.put(("meal", (d, m, meal))))
+                fut.add_done_callback(lambda f, d=d: events.put(("day", (d, f))))
+                pending += 1
+
+            while pending:
+                kind, payload = events.get()
+                if kind == "meal":
+                    on_meal(*payload)
+                    continue
+                pending -= 1
+                d, fut = payload
+                try:
+                    meals = fut.result()
+                except Exception:
+                    continue
+                for m in MEAL_TYPES:
+                    if f"{d}_{m}" in locked_meals:
+                        meals[m] = locked_meals[f"{d}_{m}"]
+                days[d] = {"day": d, "meals": {m: meals[m] for m in MEAL_TYPES}}
+                if on_day: on_day(days[d])
+
+        if len(days) < len(DAYS):
+            # A day failed: fall back to one call for the whole week
+            return self.generate_week_plan_single(on_meal=on_meal)
+
+        return self.save_plan({"days": [days[d] for d in DAYS]}, data)
+
+    def generate_week_plan_single(self, on_meal=None):
+        data = self.data()
+        # 1. Capture Lock State
+        locked_meals = get_locked_meals(data.get(PLAN, {}))
+
+        # 2. Prepare Prompt
+        favorites, disliked = get_style_preferences(data)
+        family_count = len(data.get('members', []))
+
+        # Days arrive in order, so the array index names the day; locked slots are shown as they stand
+        def show(d, m, meal):
+            on_meal(d, m, locked_meals.get(f"{d}_{m}", meal))
+        if self.compact:
+            raw = self.llm.chat_json(compact.week_prompt(family_count, favorites, disliked), "week",
+                                     response_format=compact.week_format(), variant="compact",
+                                     **self._meal_stream(on_meal and show, compact.week_slot, compact.expand_meal))
+            return self._save_week(compact.expand_week(raw), locked_meals, data)
+
+        prompt = f"""
+        Plan a 7-day menu (Mon-Sun) for {family_count} PEOPLE.
+
+        CRITICAL RULES:
+        1. INGREDIENTS: You MUST include specific quantities scaled for {family_count} people.
+           (e.g., "500g Beef Mince", "4 Burger Buns", "1 tbsp Oil"). DO NOT just say "Beef".
+        2. VARIETY: Do not repeat dinner cuisines.
+        3. BREAKFAST: Western/UK Standard.
+        4. LUNCH: Light/Packed.
+
+        PREFERENCES:
+        - LOVES: {", ".join(favorites) if favorites else "Any"}
+        - HATES: {", ".join(disliked) if disliked else "None"}
+        - STYLES: {", ".join(ALL_STYLES)}
+
+        OUTPUT JSON:
+        {{
+          "days": [
+            {{
+              "day": "Monday",
+              "meals": {{
+                "breakfast": {{ "name": "...", "ingredients": ["2 slices Toast", "2 Eggs"], "method": "...", "style_tag": "Western" }},
+                "lunch": {{ "name": "...", "ingredients": ["..."], "method": "...", "style_tag": "Packed" }},
+                "dinner": {{ "name": "...", "ingredients": ["500g Pasta", "400g Sauce"], "method": "...", "style_tag": "Italian" }}
+              }}
+            }}
+          ]
+        }}
+        """
+
+        def week_slot(path):
+            if len(path) == 4 and path[0] == "days" and path[2] == "meals" and path[1] < len(DAYS):
+                return DAYS[path[1]], path[3]
+        new_plan = self.llm.chat_json(prompt, "week", **self._meal_stream(on_meal and show, week_slot))
+        return self._save_week(new_plan, locked_meals, data)
+
+    def _save_week(self, new_plan, locked_meals, data=None):
+        # 3. Restore Locked Meals (The Merge)
+        for day in new_plan.get('days', []):
+            for m_type in MEAL_TYPES:
+                key = f"{day['day']}_{m_type}"
+                if key in locked_meals:
+                    # Overwrite the AI's new suggestion with the old locked meal
+                    day['meals'][m_type] = locked_meals[key]
+
+        return self.save_plan(new_plan, data)
+
+    # --- SINGLE MEAL REGENERATOR ---
+    def regenerate_single_meal(self, day_name, meal_type, plan=None, fresh=False):
+        # Served from the pre-generated alternates, else the recipe library
+        # when something fits, unless fresh=True
+        data = self.data()
+        family_count = len(data.get('members', []))
+
+        # Check if locked
+        current_plan = plan if plan is not None else data.get(PLAN, {})
+        for day in current_plan.get('days', []):
+            if day['day'] == day_name:
+                if day['meals'][meal_type].get('locked', False):
+                    raise MealLocked(f"{day_name} {meal_type} is locked")
+
+        new_meal = None if fresh else self._alternate_pick(current_plan, day_name, meal_type)
+        if new_meal is None and not fresh:
+            new_meal = self._library_pick(data, current_plan, meal_type)
+        if new_meal is None:
+            new_meal = self._generate_single_meal(day_name, meal_type, family_count)
+
+        # Save to specific slot (skipped if someone locked it meanwhile)
+        self._slot_replaced(day_name, meal_type)
+        writer = self.writer(current_plan)
+        writer.replace_meal(day_name, meal_type, new_meal)
+        new_plan = self.flush(writer, [(day_name, meal_type)], data)
+        self._plan_saved(new_plan)
+        return new_plan
+
+    def _alternate_pick(self, plan, day_name, meal_type):
+        if not self.alternates:
+            return None
+        with self.llm.track("alternates", meal_type) as info:
+            meal = self.alternates.take(day_name, meal_type, [m.get('name') for d in plan.get('days', [])
+                                                              for m in d.get('meals', {}).values()])
+            info["hit"] = meal is not None
+        return meal
+
+    def generate_alternates(self, slots):
+        # slots: [(day, meal_type, count, current meal name)] -> [[meal]] per
+        # slot, all from one call (AlternatePool's generator)
+        data = self.data()
+        family_count = len(data.get('members', []))
+        favorites, disliked = get_style_preferences(data)
+        if self.compact:
+            raw = self.llm.chat_json(compact.alternates_prompt(slots, family_count, favorites, disliked), "alternates",
+                                     response_format=compact.alternates_format(), variant="compact")
+            return compact.expand_alternates(raw, slots)
+
+        wanted = "\n".join(f"{i}. {d} {m}: {n} option(s), not {current or '-'}" for i, (d, m, n, current) in enumerate(slots, 1))
+        prompt = f"""
+        Suggest alternative meals for {family_count} PEOPLE, for each numbered slot:
+        {wanted}
+
+        RULES:
+        1. Ingredients MUST have quantities (e.g. "500g Chicken").
+        2. Each option must differ from the meal it replaces.
+        3. Dinners: a fun style from: {", ".join(ALL_STYLES)}. Likes: {favorites}. Avoid: {disliked}.
+
+        OUTPUT JSON (one list per slot, in order):
+        {{ "alternates": [ [ {{ "name": "...", "ingredients": ["Qty Item"], "method": "...", "style_tag": "..." }} ] ] }}
+        """
+        lists = self.llm.chat_json(prompt, "alternates").get('alternates', [])
+        return [lists[i] if i < len(lists) else [] for i in range(len(slots))]
+
+    def _library_pick(self, data, plan, meal_type):
+        if not self.library:
+            return None
+        with self.llm.track("library", meal_type) as info:
+            favorites, disliked = get_style_preferences(data)
+            meals = [m for d in plan.get('days', []) for m in d.get('meals', {}).values()]
+            week_ingredients = set().union(*(ingredient_terms(m) for m in meals)) if meals else set()
+            meal = self.library.pick(meal_type, favorites, disliked if meal_type == 'dinner' else (),
+                                     exclude=[m.get('name') for m in meals], week_ingredients=week_ingredients)
+            info["hit"] = meal is not None
+        return meal
+
+    def _generate_single_meal(self, day_name, meal_type, family_count):
+        if self.compact:
+            raw = self.llm.chat_json(compact.meal_prompt(day_name, meal_type, family_count), "meal",
+                                     response_format=compact.meal_format(), variant="compact")
+            return compact.expand_meal(raw, meal_type)
+
+        prompt = f"""
+        Generate ONE single meal idea.
+        Type: {meal_type.upper()}
+        Day: {day_name}
+        Family Size: {family_count} people.
+
+        RULES:
+        1. Ingredients MUST have quantities (e.g. "500g Chicken").
+        2. If Dinner, pick a fun style from: {", ".join(ALL_STYLES)}.
+
+        OUTPUT JSON:
+        {{
+          "name": "...",
+          "ingredients": ["Qty Item", "Qty Item"],
+          "method": "...",
+          "style_tag": "..."
+        }}
+        """
+
+        return self.llm.chat_json(prompt, "meal")
+
+    # --- SINGLE DAY REGENERATOR ---
+    def regenerate_day(self, day_name, plan=None, on_meal=None):
+        data = self.data()
+        family_count = len(data.get('members', []))
+        current_plan = plan if plan is not None else data.get(PLAN, {})
+
+        # Find the specific day object
+        day_data = next((d for d in current_plan.get('days', []) if d['day'] == day_name), None)
+        if day_data is None: return None
+
+        # Preserve locks for this day
+        locked_meals = {}
+        for m_type, m_data in day_data.get('meals', {}).items():
+            if m_data.get('locked', False):
+                locked_meals[m_type] = m_data
+
+        def show(d, m, meal):
+            on_meal(d, m, locked_meals.get(m, meal))
+        if self.compact:
+            favorites, disliked = get_style_preferences(data)
+            raw = self.llm.chat_json(compact.day_prompt(day_name, MEAL_TYPES, family_count, favorites, disliked), "day",
+                                     response_format=compact.day_format(), variant="compact",
+                                     **self._meal_stream(on_meal and show, lambda p: (day_name, compact.day_slot(p)) if compact.day_slot(p) else None,
+                                                         compact.expand_meal))
+            return self._save_day(day_name, current_plan, compact.expand_day(raw), locked_meals, data)
+
+        prompt = f"""
+        Generate 3 meals (Breakfast, Lunch, Dinner) for {day_name}.
+        Family Size: {family_count}.
+        Ingredients MUST have specific quantities.
+
+        OUTPUT JSON:
+        {{
+           "breakfast": {{ "name": "...", "ingredients": ["..."], "method": "...", "style_tag": "..." }},
+           "lunch": {{ "name": "...", "ingredients": ["..."], "method": "...", "style_tag": "..." }},
+           "dinner": {{ "name": "...", "ingredients": ["..."], "method": "...", "style_tag": "..." }}
+        }}
+        """
+
+        new_meals = self.llm.chat_json(prompt, "day", **self._meal_stream(
+            on_meal and show, lambda p: (day_name, p[0]) if len(p) == 1 and p[0] in MEAL_TYPES else None))
+        return self._save_day(day_name, current_plan, new_meals, locked_meals, data)
+
+    def _save_day(self, day_name, current_plan, new_meals, locked_meals, data=None):
+        # Merge logic (restore locks)
+        for m_type, m_data in new_meals.items():
+            if m_type in locked_meals:
+                new_meals[m_type] = locked_meals[m_type]
+
+        # Save
+        for m_type in new_meals:
+            if m_type not in locked_meals:
+                self._slot_replaced(day_name, m_type)
+        writer = self.writer(current_plan)
+        writer.replace_day(day_name, new_meals)
+        new_plan = self.flush(writer, [(day_name, m) for m in new_meals], data)
+        self._plan_saved(new_plan)
+        return new_plan
+
+    # --- RECIPE GENERATOR ---
+    def fetch_recipe(self, meal_name, ingredients, style, on_step=None):
+        prompt = f"""
+        Write a cooking guide for "{meal_name}".
+        Style: {style}
+        Ingredients available: {", ".join(ingredients)}
+
+        OUTPUT JSON:
+        {{
+            "steps": ["Step 1...", "Step 2..."],
+            "tips": "Chef's secret tip..."
+        }}
+        Provide 5-8 concise steps.
+        """
+        if not on_step:
+            return self.llm.chat_json(prompt, "recipe")
+        return self.llm.chat_json(prompt, "recipe", want=lambda p: len(p) == 2 and p[0] == "steps",
+                                  on_item=lambda p, step: on_step(p[1], step))
+
+    def save_recipe(self, day_name, meal_type, recipe_data, plan=None):
+        writer = self.writer(plan)
+        writer.set_field(day_name, meal_type, 'recipe_details', recipe_data)
+        new_plan = self.flush(writer)
+        if self.library:
+            # Keep the recipe with the meal for future library picks
+            day = next((d for d in new_plan.get('days', []) if d.get('day') == day_name), {})
+            if meal_type in day.get('meals', {}):
+                self.library.add(day['meals'][meal_type], meal_type)
+        return new_plan
+
+    def toggle_lock(self, day_name, meal_type, plan=None):
+        writer = self.writer(plan)
+        for d in writer.plan.get('days', []):
+            if d['day'] == day_name:
+                # Write the flipped value, not a toggle, so replays are harmless
+                writer.set_field(day_name, meal_type, 'locked', not d['meals'][meal_type].get('locked', False))
+        new_plan = self.flush(writer)
+        if self.alternates:
+            self.alternates.schedule(new_plan) # Empties a locked slot, refills an unlocked one
+        return new_plan
+
+    def rate_meal(self, name, rating, user, style):
+        # One batched write: history entry + server-side increment of the style score
+        return record_rating(self.db, self.fam_ref, name, rating, user, style)
+
+    # --- SHOPPING ---
+    def normalise_ingredients(self, strings):
+        # Only for strings the local parser couldn't read
+        prompt = f"""
+        Normalise these ingredient strings for a shopping list: {json.dumps(strings)}
+        For each give the item name, a numeric amount, a unit ("g", "ml" or "count")
+        and a UK price estimate (GBP) for that amount.
+
+        JSON: {{ "items": [ {{ "item": "Lettuce", "amount": 1, "unit": "count", "est_price": 0.75 }} ] }}
+        """
+        return self.llm.chat_json(prompt, "normalise").get('items', [])
+
+    def shopping_updates(self, plan, slots, data=None):
+        return ledger_updates(self.sync_ledger(plan, slots, data))
+
+    def sync_ledger(self, plan, slots, data=None):
+        # Re-add just these slots' ingredients to the stored ledger; slots
+        # whose ingredients haven't changed cost nothing
+        data = self.data() if data is None else data
+        ledger = ShoppingLedger(data.get(LEDGER))
+        meals = {slot_key(d['day'], m): meal for d in plan.get('days', []) for m, meal in d.get('meals', {}).items()}
+        todo = {}
+        for d, m in slots:
+            src = list((meals.get(slot_key(d, m)) or {}).get('ingredients', []))
+            if ledger.needs(slot_key(d, m), src):
+                todo[slot_key(d, m)] = src
+        if todo:
+            self.fill_ledger(ledger, todo)
+        return ledger
+
+    def fill_ledger(self, ledger, todo):
+        # todo: slot -> ingredient strings. Parsed locally; what the parser
+        # can't read goes to the model in one call for all the slots
+        parsed, unparsed = {}, []
+        for slot, strings in todo.items():
+            parsed[slot] = []
+            for s in strings:
+                p = parse_ingredient(s)
+                if p is None:
+                    unparsed.append((slot, s))
+                else:
+                    parsed[slot].append((p, None))
+        self.unlisted = []
+        if unparsed:
+            try:
+                entries = self.normalise_ingredients([s for _, s in unparsed])
+                if len(entries) != len(unparsed):
+                    raise ValueError("Normalised list doesn't line up with the input")
+                for (slot, s), entry in zip(unparsed, entries):
+                    p = parsed_from_llm(entry)
+                    price = entry.get('est_price')
+                    if p:
+                        parsed[slot].append((p, float(price) if isinstance(price, (int, float)) else None))
+                    else:
+                        self.unlisted.append(s)
+            except Exception:
+                # Leftovers just miss the list rather than losing the rest
+                self.unlisted = [s for _, s in unparsed]
+        missed = set(self.unlisted)
+        for slot, strings in todo.items():
+            ledger.set_slot(slot, strings, parsed[slot], [s for s in strings if s in missed])
+
+    def generate_shopping_list(self, plan):
+        ledger = ShoppingLedger()
+        self.fill_ledger(ledger, {slot_key(d['day'], m): list(meal.get('ingredients', []))
+                                  for d in plan.get('days', []) for m, meal in d.get('meals', {}).items()})
+        return ledger.items()
+
+    def update_shopping_list(self, plan=None):
+        # Brings the ledger up to date with the plan; normally a no-op, since
+        # every plan edit already carries its slots' changes
+        data = self.data()
+        if plan is None:
+            plan = data.get(PLAN, {})
+        ledger = self.sync_ledger(plan, [(d, m) for d in DAYS for m in MEAL_TYPES], data)
+        updates = ledger_updates(ledger)
+        if updates:
+            self.fam_ref.update(updates)
+        items, comp, _, self.unlisted = shopping_view({**data, LEDGER: ledger.to_dict()}, self.prices)
+        return items, comp
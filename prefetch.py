@@ -0,0 +1,135 @@
+import hashlib
+import itertools
+import json
+import queue
+import threading
+from datetime import datetime
+
+from plan_ops import DAYS, slot_key
+
+# Background recipe prefetch. After a plan is saved, every meal without
+# recipe_details is queued; a few worker threads fetch them in priority
+# order (tonight's dinner first, then the following days) and a flusher
+# writes finished recipes in batches through one PlanWriter flush.
+# Rerolling a slot cancels its job, and a recipe that finishes for a meal
+# that is no longer in the slot is dropped.
+
+MEAL_RANK = {"dinner": 0, "lunch": 1, "breakfast": 2}
+
+def meal_fingerprint(meal):
+    raw = json.dumps([meal.get('name'), meal.get('ingredients', []), meal.get('style_tag')], sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def has_recipe(meal):
+    # Recipes record which meal they were written for; a stale one doesn't count
+    details = meal.get('recipe_details')
+    return bool(details) and details.get('for_meal', meal.get('name')) == meal.get('name')
+
+
+class RecipePrefetcher:
+    def __init__(self, fetch, make_writer, workers=3, batch_size=4, flush_after=2.0):
+        self.fetch = fetch # (meal_name, ingredients, style) -> details; raises on failure
+        self.make_writer = make_writer
+        self.batch_size = batch_size
+        self.flush_after = flush_after
+        self.stats = {"queued": 0, "fetched": 0, "failed": 0, "cancelled": 0, "writes": 0}
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs = {} # slot -> job still wanted
+        self._done = {} # slot -> (job, details) waiting to be written
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"recipe-prefetch-{i}", daemon=True).start()
+        threading.Thread(target=self._flush_loop, name="recipe-prefetch-flush", daemon=True).start()
+
+    def schedule(self, plan, today=None):
+        today = today or datetime.now().strftime("%A")
+        start = DAYS.index(today) if today in DAYS else 0
+        for day in plan.get('days', []):
+            if day.get('day') not in DAYS:
+                continue
+            offset = (DAYS.index(day['day']) - start) % len(DAYS)
+            for m_type, meal in day.get('meals', {}).items():
+                if has_recipe(meal):
+                    continue
+                # Today's breakfast and lunch are probably eaten already: go last
+                when = len(DAYS) if offset == 0 and m_type != 'dinner' else offset
+                self.submit(day['day'], m_type, meal, (when, MEAL_RANK.get(m_type, len(MEAL_RANK))))
+
+    def submit(self, day_name, meal_type, meal, priority=(0, 0)):
+        key = slot_key(day_name, meal_type)
+        fp = meal_fingerprint(meal)
+        with self._cond:
+            job = self._jobs.get(key)
+            if job and job['fp'] == fp:
+                return # Already queued for this exact meal
+            self._cancel(key)
+            job = {"key": key, "day": day_name, "m_type": meal_type, "meal": meal, "fp": fp, "cancelled": False}
+            self._jobs[key] = job
+            self.stats["queued"] += 1
+        self._queue.put((priority, next(self._seq), job))
+
+    def cancel(self, day_name, meal_type):
+        with self._cond:
+            self._cancel(slot_key(day_name, meal_type))
+
+    def _cancel(self, key):
+        job = self._jobs.pop(key, None)
+        if job:
+            job['cancelled'] = True
+        if self._done.pop(key, None):
+            self.stats["cancelled"] += 1
+
+    def take(self, day_name, meal_type, meal):
+        # Finished-but-unwritten recipe for this meal, else None (and the
+        # pending job is dropped, since the caller will fetch it itself)
+        key = slot_key(day_name, meal_type)
+        with self._cond:
+            done = self._done.get(key)
+            if done and done[0]['fp'] == meal_fingerprint(meal):
+                del self._done[key]
+                self._jobs.pop(key, None)
+                return done[1]
+            self._cancel(key)
+        return None
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job['cancelled']:
+                continue
+            meal = job['meal']
+            try:
+                details = self.fetch(meal['name'], meal.get('ingredients', []), meal.get('style_tag', 'General'))
+            except Exception:
+                with self._cond:
+                    self.stats["failed"] += 1
+                    if self._jobs.get(job['key']) is job:
+                        del self._jobs[job['key']]
+                continue
+            with self._cond:
+                if job['cancelled'] or self._jobs.get(job['key']) is not job:
+                    self.stats["cancelled"] += 1
+                    continue
+                self._done[job['key']] = (job, {**details, "for_meal": meal['name']})
+                self.stats["fetched"] += 1
+                self._cond.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._done)
+                # Give a few more recipes the chance to share the write
+                self._cond.wait_for(lambda: len(self._done) >= self.batch_size, timeout=self.flush_after)
+                batch, self._done = self._done, {}
+                for key, (job, _) in batch.items():
+                    if self._jobs.get(key) is job:
+                        del self._jobs[key]
+            writer = self.make_writer()
+            for job, details in batch.values():
+                writer.set_field(job['day'], job['m_type'], 'recipe_details', details)
+            try:
+                writer.flush()
+                self.stats["writes"] += 1
+            except Exception:
+                self.stats["failed"] += len(batch)
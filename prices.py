@@ -0,0 +1,174 @@
+import csv
+import itertools
+import sqlite3
+
+import numpy as np
+
+from shopping import STORE_INDEX, normalise_name
+
+# Per-item, per-store prices from a local price book.
+#
+# The book is an item x store matrix of unit prices (per kg, per litre, each,
+# or per tin/jar/...), loaded once per process from CSV or SQLite. A basket is
+# priced by turning its lines into a quantity vector in the book's units and
+# multiplying through, so every store's total comes out of one array op, and
+# many baskets (families) can be priced together. Items the book doesn't
+# know, or a store doesn't stock, fall back to the line's own est_price
+# scaled by STORE_INDEX.
+#
+#   python prices.py [price_book.csv]   # timings on a synthetic catalogue
+
+BASIS = {"kg": ("g", "", 1000), "l": ("ml", "", 1000), "each": ("count", "", 1)}
+PRICE_BOOK = "price_book.csv"
+
+def basis(unit):
+    # Book unit -> (basket dim, basket unit, basket amount per book unit)
+    return BASIS.get(unit, ("count", unit, 1))
+
+
+class PriceBook:
+    def __init__(self, rows, stores):
+        # rows: [(item, unit, [price or None per store])]
+        self.stores = list(stores)
+        self.prices = np.full((len(rows), len(self.stores)), np.nan)
+        self.scale = np.ones(len(rows))
+        self.index = {} # (name, dim, unit) -> row
+        for i, (item, unit, prices) in enumerate(rows):
+            dim, u, scale = basis(unit)
+            self.index[(normalise_name(item), dim, u)] = i
+            self.scale[i] = scale
+            self.prices[i] = [np.nan if p is None else p for p in prices]
+        self.store_index = np.array([STORE_INDEX.get(s, 1.0) for s in self.stores])
+        self._rows = {} # basket key -> row or None, filled on first sight
+
+    @classmethod
+    def from_csv(cls, path=PRICE_BOOK):
+        # item,unit,<store>,<store>,...; an empty cell means not stocked
+        with open(path, encoding="utf-8", newline="") as f:
+            reader = csv.reader(line for line in f if not line.startswith("#"))
+            header = next(reader)
+            rows = [(r[0], r[1], [float(p) if p.strip() else None for p in r[2:]]) for r in reader if r]
+        return cls(rows, header[2:])
+
+    @classmethod
+    def from_sqlite(cls, path, table="prices"):
+        # Long format: one (item, unit, store, price) row per stocked item
+        conn = sqlite3.connect(path)
+        try:
+            records = conn.execute(f"SELECT item, unit, store, price FROM {table}").fetchall()
+        finally:
+            conn.close()
+        stores = sorted({r[2] for r in records})
+        col = {s: j for j, s in enumerate(stores)}
+        items = {}
+        for item, unit, store, price in records:
+            items.setdefault((item, unit), [None] * len(stores))[col[store]] = price
+        return cls([(item, unit, prices) for (item, unit), prices in items.items()], stores)
+
+    def __len__(self):
+        return len(self.index)
+
+    def row(self, key):
+        # Longest run of words in the name the book knows: "basmati rice" -> "rice"
+        if key not in self._rows:
+            name, dim, unit = key
+            words = name.split()
+            found = None
+            for size in range(len(words), 0, -1):
+                for start in range(len(words) - size + 1):
+                    found = self.index.get((" ".join(words[start:start + size]), dim, unit))
+                    if found is not None:
+                        break
+                if found is not None:
+                    break
+            self._rows[key] = found
+        return self._rows[key]
+
+    def cost(self, lines):
+        # lines: [(key, amount, est)] -> (items x stores) line costs, known mask
+        rows = [self.row(key) if amount is not None else None for key, amount, _ in lines]
+        known = np.array([r is not None for r in rows], dtype=bool)
+        idx = np.array([r or 0 for r in rows], dtype=int)
+        qty = np.array([amount or 0.0 for _, amount, _ in lines]) / self.scale[idx]
+        est = np.array([e for _, _, e in lines], dtype=float)
+        book = self.prices[idx] * qty[:, None]
+        fallback = est[:, None] * self.store_index[None, :]
+        return np.where(known[:, None] & ~np.isnan(book), book, fallback), known
+
+    def compare(self, lines):
+        # Whole basket at each store, cheapest first
+        if not lines:
+            return []
+        cost, known = self.cost(lines)
+        totals = cost.sum(axis=0)
+        return sorted(({"store": s, "total": round(float(t), 2), "from_book": int(known.sum())}
+                       for s, t in zip(self.stores, totals)), key=lambda x: x["total"])
+
+    def best_split(self, lines, max_stores=2, trip_cost=0.0):
+        # Cheapest way to buy the basket across at most max_stores shops, each
+        # line from whichever chosen shop has it cheapest. Every shop past the
+        # first must save at least trip_cost to be worth the extra trip.
+        if not lines:
+            return None
+        cost, _ = self.cost(lines)
+        best = single = None
+        for k in range(1, min(max_stores, len(self.stores)) + 1):
+            combos = np.array(list(itertools.combinations(range(len(self.stores)), k)))
+            # lines x combos x k -> cheapest shop per line within each combo
+            totals = cost[:, combos].min(axis=2).sum(axis=0)
+            i = int(totals.argmin())
+            if single is None:
+                single = float(totals[i])
+            if best is None or totals[i] + trip_cost * (k - 1) < best[0] + trip_cost * (len(best[1]) - 1) - 1e-9:
+                best = (float(totals[i]), combos[i])
+        total, combo = best
+        pick = combo[cost[:, combo].argmin(axis=1)]
+        names = [key[0].title() for key, _, _ in lines]
+        return {
+            "stores": [self.stores[j] for j in combo],
+            "total": round(total, 2),
+            "saving": round(single - total, 2),
+            "items": {self.stores[j]: [n for n, p in zip(names, pick) if p == j] for j in combo},
+        }
+
+    def totals_many(self, baskets):
+        # Many baskets at once -> (baskets x stores) totals
+        lines = [line for basket in baskets for line in basket]
+        out = np.zeros((len(baskets), len(self.stores)))
+        if not lines:
+            return out
+        cost, _ = self.cost(lines)
+        sizes = np.array([len(b) for b in baskets])
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        filled = sizes > 0
+        out[filled] = np.add.reduceat(cost, starts[filled], axis=0)
+        return out
+
+
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    book = PriceBook.from_csv(sys.argv[1] if len(sys.argv) > 1 else PRICE_BOOK)
+    print(f"{len(book)} items x {len(book.stores)} stores")
+
+    # Synthetic catalogue and families, to see how it scales
+    rng = random.Random(0)
+    stores = [f"Store {j}" for j in range(12)]
+    word = lambda i: "".join(chr(97 + int(d, 26)) for d in np.base_repr(i, 26).rjust(3, "0"))
+    rows = [(f"item x{word(i)}", rng.choice(["kg", "l", "each"]), [None if rng.random() < 0.1 else round(rng.uniform(0.2, 20), 2)
+                                                            for _ in stores]) for i in range(5000)]
+    big = PriceBook(rows, stores)
+    dims = {"kg": ("g", ""), "l": ("ml", ""), "each": ("count", "")}
+    baskets = []
+    for _ in range(500):
+        picks = rng.sample(rows, 40)
+        baskets.append([((name, *dims[unit]), rng.uniform(1, 1000), 1.0) for name, unit, _ in picks])
+    start = time.perf_counter()
+    big.totals_many(baskets)
+    print(f"{len(baskets)} baskets x {len(stores)} stores over {len(big)} items: {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    for b in baskets[:50]:
+        big.best_split(b, max_stores=3)
+    print(f"best 3-store split: {(time.perf_counter() - start) / 50 * 1000:.2f} ms per basket")
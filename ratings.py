@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from lazy import lazy_module
+from styles import match_style
+
+firestore = lazy_module("firebase_admin.firestore")
+# Newer SDKs no longer re-export FieldPath from firebase_admin.firestore
+field_path = lazy_module("google.cloud.firestore_v1.field_path")
+
+RATING_DELTA = {"like": 1, "dislike": -1}
+
+def style_field(style):
+    # Style labels contain spaces and brackets, so the path segment is quoted
+    return field_path.FieldPath("style_preferences", style).to_api_repr()
+
+def record_rating(db, fam_ref, name, rating, user, style):
+    batch = db.batch()
+    batch.set(fam_ref.collection("meal_history").document(), {
+        "meal": name, "rating": rating, "user": user, "style": style, "date": datetime.now().isoformat()
+    })
+    matched = match_style(style)
+    delta = RATING_DELTA.get(rating, 0)
+    if matched and delta:
+        # Increment is applied by the server, so simultaneous taps all count
+        batch.update(fam_ref, {style_field(matched): firestore.Increment(delta)})
+    batch.commit()
+    return matched
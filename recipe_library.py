@@ -0,0 +1,146 @@
+import copy
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from shopping import normalise_name, parse_ingredient
+from styles import match_style
+
+# Local library of every meal the model has generated, so a reroll can be
+# answered from past weeks instead of a fresh call. Meals persist in SQLite;
+# an in-memory inverted index maps terms ("type:dinner", "style:<style>",
+# "ing:<ingredient>") to meal keys for picking. Meals served recently are
+# skipped so rerolls don't bring last week straight back.
+
+RECENT_DAYS = 14
+
+def meal_key(name):
+    return re.sub(r"\s+", " ", (name or "").lower()).strip()
+
+def ingredient_terms(meal):
+    terms = set()
+    for text in meal.get('ingredients', []):
+        parsed = parse_ingredient(text)
+        name = parsed.name if parsed else normalise_name(text)
+        if name:
+            terms.add(name)
+    return terms
+
+
+class RecipeLibrary:
+    def __init__(self, path="recipe_library.sqlite3", recent_days=RECENT_DAYS):
+        self.path = path
+        self.recent_days = recent_days
+        self.hits = 0
+        self.misses = 0
+        self._meals = {} # key -> {"meal", "meal_type", "style", "ingredients", "last_served"}
+        self._index = {} # term -> set of keys
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meals ("
+            " key TEXT PRIMARY KEY, meal_type TEXT, data TEXT,"
+            " created REAL, last_served REAL)"
+        )
+        self._conn.commit()
+        for key, meal_type, data, last_served in self._conn.execute("SELECT key, meal_type, data, last_served FROM meals"):
+            self._index_meal(key, meal_type, json.loads(data), last_served)
+
+    def _index_meal(self, key, meal_type, meal, last_served):
+        old = self._meals.get(key)
+        if old:
+            for term in self._terms(old):
+                self._index.get(term, set()).discard(key)
+        entry = {
+            "meal": meal, "meal_type": meal_type, "style": match_style(meal.get('style_tag')),
+            "ingredients": ingredient_terms(meal), "last_served": last_served,
+        }
+        self._meals[key] = entry
+        for term in self._terms(entry):
+            self._index.setdefault(term, set()).add(key)
+
+    def _terms(self, entry):
+        terms = {f"type:{entry['meal_type']}"} | {f"ing:{i}" for i in entry['ingredients']}
+        if entry['style']:
+            terms.add(f"style:{entry['style']}")
+        return terms
+
+    def _add(self, meal, meal_type, served, now):
+        key = meal_key(meal.get('name'))
+        if not key or not meal.get('ingredients'):
+            return
+        meal = {k: v for k, v in meal.items() if k != 'locked'}
+        old = self._meals.get(key)
+        if old and 'recipe_details' not in meal and 'recipe_details' in old['meal']:
+            meal['recipe_details'] = old['meal']['recipe_details']
+        last_served = now if served else (old['last_served'] if old else None)
+        self._index_meal(key, meal_type, meal, last_served)
+        self._conn.execute(
+            "INSERT INTO meals (key, meal_type, data, created, last_served) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET meal_type = excluded.meal_type, data = excluded.data,"
+            " last_served = excluded.last_served",
+            (key, meal_type, json.dumps(meal), now, last_served),
+        )
+
+    def add(self, meal, meal_type, served=True):
+        with self._lock:
+            self._add(meal, meal_type, served, time.time())
+            self._conn.commit()
+
+    def add_plan(self, plan):
+        # Everything in a saved plan counts as served now
+        now = time.time()
+        with self._lock:
+            for day in plan.get('days', []):
+                for m_type, meal in day.get('meals', {}).items():
+                    self._add(meal, m_type, True, now)
+            self._conn.commit()
+
+    def pick(self, meal_type, favorites=(), disliked=(), exclude=(), week_ingredients=(), style=None):
+        # Best-fitting stored meal for the slot, or None. Disliked styles and
+        # recently served or excluded names are never picked; favourite styles,
+        # ingredients the week already buys and a stored recipe score up, with
+        # a little jitter so repeated rerolls vary.
+        cutoff = time.time() - self.recent_days * 24 * 3600
+        exclude = {meal_key(n) for n in exclude}
+        disliked = set(disliked)
+        favorites = set(favorites)
+        with self._lock:
+            keys = set(self._index.get(f"type:{meal_type}", ()))
+            if style:
+                keys &= self._index.get(f"style:{style}", set())
+            shared = {}
+            for ing in week_ingredients:
+                for key in self._index.get(f"ing:{ing}", ()):
+                    shared[key] = shared.get(key, 0) + 1
+            best, best_score = None, None
+            for key in keys:
+                entry = self._meals[key]
+                if key in exclude or entry['style'] in disliked:
+                    continue
+                if entry['last_served'] and entry['last_served'] > cutoff:
+                    continue
+                score = random.random()
+                if entry['style'] in favorites:
+                    score += 3
+                score += min(2, 0.5 * shared.get(key, 0))
+                if 'recipe_details' in entry['meal']:
+                    score += 1
+                if best_score is None or score > best_score:
+                    best, best_score = key, score
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(self._meals[best]['meal'])
+
+    def stats(self):
+        with self._lock:
+            by_type = {}
+            for entry in self._meals.values():
+                by_type[entry['meal_type']] = by_type.get(entry['meal_type'], 0) + 1
+            return {"meals": len(self._meals), "by_type": by_type, "terms": len(self._index),
+                    "hits": self.hits, "misses": self.misses}
@@ -1,17 +1,33 @@
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
+import argparse
 import datetime
+import os
+import random
 
-# 1. Initialize Firebase
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+from styles import ALL_STYLES
+
+# Seeds Firestore with the demo family, and optionally N synthetic ones for
+# load tests (batch_plan.py plans them all).
+#
+#   python seed_db.py                              # demo family (serviceAccountKey.json)
+#   python seed_db.py --families 500               # plus fam_load_0000 .. fam_load_0499
+#   python seed_db.py --families 500 --emulator    # against FIRESTORE_EMULATOR_HOST
+
+# 1. Connect to Firebase (or the emulator)
+def connect_firestore(emulator=False):
+    if emulator:
+        # The emulator takes any project id and no credentials
+        os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "localhost:8080")
+        from google.cloud import firestore
+        return firestore.Client(project=os.environ.get("GCLOUD_PROJECT", "demo-family-os"))
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate("serviceAccountKey.json"))
+    return firestore.client()
 
 # 2. Define the "Source of Truth" (Our Schema)
 family_data = {
     "family_id": "fam_8829_xyz",
-    "created_at": datetime.datetime.now(),
     "members": [
         {
             "name": "Sarah",
@@ -21,9 +37,9 @@ family_data = {
         {
             "name": "Leo",
             "dob": "2020-05-15",  # He is 5 years old
-            "dietary_flags": ["peanut_allergy"], 
+            "dietary_flags": ["peanut_allergy"],
             "sensory_profile": {
-                "texture_aversion": ["mushy"], 
+                "texture_aversion": ["mushy"],
                 "spiciness_tolerance": "low"
             }
         }
@@ -35,8 +51,59 @@ family_data = {
     }
 }
 
-# 3. Push to Firestore
-# We use .set() to overwrite if it exists, ensuring a clean state
-db.collection("families").document("fam_8829_xyz").set(family_data)
+# 3. Synthetic families, the same shape with random contents
+PARENTS = ["Sarah", "Tom", "Priya", "James", "Aisha", "Dan", "Mei", "Olu"]
+CHILDREN = ["Leo", "Ava", "Sam", "Isla", "Noah", "Zara", "Finn", "Ruby"]
+DISLIKES = ["cilantro", "lamb", "mushrooms", "olives", "fish", "spicy food", "aubergine"]
+FLAGS = ["peanut_allergy", "vegetarian", "dairy_free", "gluten_free"]
+EQUIPMENT = ["air_fryer", "microwave", "slow_cooker", "wok", "blender"]
+STAPLES = ["pasta", "rice", "canned tomatoes", "flour", "oats", "olive oil", "stock cubes"]
+INVENTORY = ["spinach (needs using)", "chicken breast", "carrots", "cheddar", "eggs", "minced beef"]
+
+def load_family_id(i):
+    return f"fam_load_{i:04d}"
+
+def synthetic_family(i, rng):
+    members = [{"name": n, "role": "parent", "dislikes": rng.sample(DISLIKES, rng.randint(0, 2))}
+               for n in rng.sample(PARENTS, rng.randint(1, 2))]
+    for n in rng.sample(CHILDREN, rng.randint(0, 4)):
+        members.append({"name": n, "dob": f"{rng.randint(2008, 2023)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                        "dietary_flags": rng.sample(FLAGS, rng.choice([0, 0, 1]))})
+    return {
+        "family_id": load_family_id(i),
+        "members": members,
+        "kitchen_profile": {
+            "equipment": rng.sample(EQUIPMENT, rng.randint(1, 3)),
+            "pantry_staples": rng.sample(STAPLES, rng.randint(2, 5)),
+            "current_inventory": rng.sample(INVENTORY, rng.randint(0, 3)),
+        },
+        "style_preferences": {s: rng.choice([-2, 3]) for s in rng.sample(ALL_STYLES, rng.randint(0, 4))},
+    }
+
+def seed(db, families=0, seed=0):
+    # The demo family plus `families` synthetic ones, written in batches -> their ids
+    rng = random.Random(seed)
+    now = datetime.datetime.now()
+    db.collection("families").document(family_data["family_id"]).set({**family_data, "created_at": now})
+    ids = []
+    for start in range(0, families, 400):
+        batch = db.batch()
+        for i in range(start, min(start + 400, families)):
+            fam = synthetic_family(i, rng)
+            batch.set(db.collection("families").document(fam["family_id"]), {**fam, "created_at": now})
+            ids.append(fam["family_id"])
+        batch.commit()
+    return ids
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--families", type=int, default=0, help="synthetic families to add for load tests")
+    ap.add_argument("--emulator", action="store_true", help="use the Firestore emulator")
+    args = ap.parse_args()
 
-print("✅ Database seeded! Family profile is live in the cloud.")
\ No newline at end of file
+    # 4. Push to Firestore
+    # We use .set() to overwrite if it exists, ensuring a clean state
+    ids = seed(connect_firestore(args.emulator), args.families)
+    print("✅ Database seeded! Family profile is live in the cloud."
+          + (f" Plus {len(ids)} synthetic families ({ids[0]} .. {ids[-1]})." if ids else ""))
@@ -0,0 +1,462 @@
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+# Local ingredient engine: parses "500g Beef Mince" style strings, normalises
+# the item name and sums quantities per item without asking the LLM.
+# Amounts are kept in a base unit per dimension: grams, millilitres, or a
+# count of some unit ("" for plain items like "4 Burger Buns").
+
+Parsed = namedtuple("Parsed", "amount dim unit name")
+
+MASS_UNITS = {
+    "g": 1, "gr": 1, "gram": 1, "grams": 1,
+    "kg": 1000, "kgs": 1000, "kilo": 1000, "kilos": 1000, "kilogram": 1000, "kilograms": 1000,
+    "oz": 28.35, "lb": 453.6, "lbs": 453.6,
+}
+VOLUME_UNITS = {
+    "ml": 1, "millilitre": 1, "millilitres": 1, "milliliter": 1, "milliliters": 1,
+    "cl": 10, "l": 1000, "litre": 1000, "litres": 1000, "liter": 1000, "liters": 1000,
+    "tsp": 5, "teaspoon": 5, "teaspoons": 5, "tbsp": 15, "tablespoon": 15, "tablespoons": 15,
+    "cup": 240, "cups": 240, "pint": 568, "pints": 568,
+}
+COUNT_UNITS = [
+    "slice", "clove", "piece", "tin", "can", "jar", "pack", "packet", "bunch", "handful",
+    "pinch", "sprig", "stick", "head", "bag", "bottle", "fillet", "rasher", "sheet", "knob",
+    "drizzle", "splash", "dash", "box", "loaf", "punnet", "pot", "tub", "stalk", "ball",
+]
+# Plurals the suffix rules get wrong; other "-ves" words just drop the "s"
+IRREGULAR = {"loaves": "loaf", "leaves": "leaf", "halves": "half", "knives": "knife", "calves": "calf",
+             "shelves": "shelf"}
+CONTAINERS = {"tin", "can", "jar", "pack", "packet", "bag", "bottle", "box", "pot", "tub", "punnet"}
+
+FRACTIONS = {"½": 0.5, "¼": 0.25, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3, "⅛": 0.125}
+
+DESCRIPTORS = {
+    "large", "small", "medium", "fresh", "freshly", "chopped", "diced", "sliced", "minced",
+    "grated", "finely", "roughly", "ripe", "boneless", "skinless", "thinly", "peeled",
+    "crushed", "shredded", "cooked", "uncooked", "dried", "halved", "quartered", "beaten",
+    "softened", "melted", "rinsed", "drained", "optional", "approx", "about", "extra",
+}
+ALIASES = {
+    "cilantro": "coriander",
+    "scallion": "spring onion",
+    "green onion": "spring onion",
+    "zucchini": "courgette",
+    "eggplant": "aubergine",
+    "ground beef": "beef mince",
+    "minced beef": "beef mince",
+    "cheddar cheese": "cheddar",
+    "feta cheese": "feta",
+    "parmesan cheese": "parmesan",
+}
+VAGUE = re.compile(r"\b(to taste|as needed|for serving|to serve|for garnish)\b", re.I)
+
+_NUM = r"(?:\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?(?:\s*[½¼¾⅓⅔⅛])?|[½¼¾⅓⅔⅛])"
+_QTY = re.compile(
+    rf"^(?P<a>{_NUM})(?:\s+(?P<frac>\d+\s*/\s*\d+))?(?:\s*(?:-|–|to)\s*(?P<b>{_NUM}))?\s*"
+)
+_MULT = re.compile(r"^(?:x|×)\s*", re.I)
+_ARTICLE = re.compile(r"^(?:a|an|one)\s+", re.I)
+_COUNT_FORMS = {form: u for u in COUNT_UNITS for form in (u, u + "s", u + "es")}
+_COUNT_FORMS.update({plural: u for plural, u in IRREGULAR.items() if u in COUNT_UNITS})
+_ALL_UNITS = sorted(list(MASS_UNITS) + list(VOLUME_UNITS) + list(_COUNT_FORMS), key=len, reverse=True)
+_UNIT = re.compile(rf"^(?P<u>{'|'.join(map(re.escape, _ALL_UNITS))})\b\.?\s*(?:of\s+)?", re.I)
+_CONTAINER_WORD = re.compile(
+    rf"^(?:{'|'.join(sorted(CONTAINERS, key=len, reverse=True))})(?:e?s)?\b\s*(?:of\s+)?", re.I
+)
+_PACK = re.compile(rf"^\(\s*(?P<n>{_NUM})\s*(?P<u>[a-z]+)\.?(?:\s+each)?\s*\)\s*", re.I)
+
+
+def _number(text):
+    text = text.replace(",", ".").strip()
+    total = 0.0
+    for ch, val in FRACTIONS.items():
+        if ch in text:
+            total += val
+            text = text.replace(ch, "")
+    text = text.strip()
+    if not text:
+        return total
+    if "/" in text:
+        num, den = text.split("/")
+        return total + float(num) / float(den)
+    return total + float(text)
+
+
+def _singular(word):
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def _unit_info(word):
+    w = word.lower().rstrip(".")
+    if w in MASS_UNITS:
+        return "g", "", MASS_UNITS[w]
+    if w in VOLUME_UNITS:
+        return "ml", "", VOLUME_UNITS[w]
+    if w in _COUNT_FORMS:
+        return "count", _COUNT_FORMS[w], 1
+    return None
+
+
+def normalise_name(text):
+    name = re.sub(r"\([^)]*\)", " ", text.lower())
+    name = VAGUE.sub(" ", name).split(",")[0]
+    name = re.sub(r"^\s*of\s+", "", name)
+    words = [w for w in re.findall(r"[a-z][a-z'&-]*", name) if w not in DESCRIPTORS]
+    if words and words[-1] in ("and", "or", "for", "with"):
+        words = words[:-1]
+    if not words:
+        return ""
+    words[-1] = _singular(words[-1])
+    name = " ".join(words)
+    return ALIASES.get(name, name)
+
+
+def parse_ingredient(text):
+    # Returns Parsed, or None when the string doesn't look like "<qty> <item>"
+    s = text.strip().lstrip("-•* ").strip()
+    if not s:
+        return None
+
+    m = _QTY.match(s)
+    if m:
+        amount = _number(m.group("b") or m.group("a"))
+        if m.group("frac") and not m.group("b"):
+            amount += _number(m.group("frac"))
+        s = s[m.end():]
+        mult = _MULT.match(s)
+        if mult:
+            # "2 x 400g tins Chopped Tomatoes"
+            s = s[mult.end():]
+            inner = _QTY.match(s)
+            if inner:
+                amount *= _number(inner.group("a"))
+                s = s[inner.end():]
+    elif _ARTICLE.match(s):
+        amount = 1.0
+        s = s[_ARTICLE.match(s).end():]
+    elif VAGUE.search(s):
+        name = normalise_name(s)
+        return Parsed(None, "count", "", name) if name else None
+    else:
+        return None
+
+    dim, unit, factor = "count", "", 1
+    u = _UNIT.match(s)
+    if u:
+        dim, unit, factor = _unit_info(u.group("u"))
+        s = s[u.end():]
+    amount *= factor
+    if dim != "count":
+        # "400g tins Chopped Tomatoes": the weight already says how much
+        s = _CONTAINER_WORD.sub("", s)
+
+    pack = _PACK.match(s)
+    if pack:
+        info = _unit_info(pack.group("u"))
+        # "1 tin (400g) Chickpeas" buys by weight; "(400g each)" too
+        if info and info[0] != "count" and (unit in CONTAINERS or dim == "count"):
+            amount = amount / factor * _number(pack.group("n")) * info[2]
+            dim, unit = info[0], ""
+        s = s[pack.end():]
+    elif dim == "count" and unit in CONTAINERS:
+        # "2 tins 400g Tomatoes"
+        inner = re.match(rf"^({_NUM})\s*([a-z]+)\b\s*", s, re.I)
+        info = _unit_info(inner.group(2)) if inner else None
+        if info and info[0] != "count":
+            amount *= _number(inner.group(1)) * info[2]
+            dim, unit = info[0], ""
+            s = s[inner.end():]
+
+    name = normalise_name(s)
+    if dim == "count":
+        words = name.split()
+        if not name and unit:
+            # "3 Cloves": the unit word is all there is, so it's the item
+            name, unit = unit, ""
+        elif not unit and len(words) > 1 and words[-1] in COUNT_UNITS:
+            # "4 Garlic Cloves" is "4 cloves Garlic"
+            rest = " ".join(words[:-1])
+            name, unit = ALIASES.get(rest, rest), words[-1]
+    if not name or amount <= 0:
+        return None
+    return Parsed(amount, dim, unit, name)
+
+
+# --- PRICING HINTS ---
+# Rough UK prices (GBP per kg, per litre, or each) so the local engine can
+# fill est_price without a model call. Longest matching keyword wins.
+PRICE_HINTS = {
+    "g": {
+        "beef mince": 7.0, "beef": 12.0, "steak": 16.0, "chicken": 6.0, "lamb": 12.0, "pork": 7.0,
+        "bacon": 10.0, "sausage": 6.0, "chorizo": 12.0, "ham": 10.0, "salmon": 18.0, "cod": 15.0,
+        "fish": 12.0, "prawn": 15.0, "tuna": 9.0, "cheese": 9.0, "cheddar": 8.0, "feta": 10.0,
+        "parmesan": 20.0, "mozzarella": 8.0, "halloumi": 11.0, "butter": 8.0, "pasta": 1.5,
+        "spaghetti": 1.5, "noodle": 3.0, "rice": 2.0, "couscous": 2.5, "flour": 1.0, "sugar": 1.0,
+        "oat": 1.5, "potato": 1.0, "onion": 1.0, "carrot": 0.8, "tomato": 3.0, "spinach": 6.0,
+        "mushroom": 4.0, "broccoli": 2.5, "lentil": 3.0, "chickpea": 2.0, "bean": 2.0,
+        "bread": 2.0, "granola": 5.0, "tofu": 6.0, "yogurt": 2.5, "berry": 8.0, "nut": 12.0,
+    },
+    "ml": {
+        "milk": 1.1, "cream": 4.0, "oil": 4.0, "olive oil": 7.0, "stock": 1.5, "yogurt": 2.5,
+        "soy sauce": 5.0, "vinegar": 3.0, "juice": 1.5, "honey": 8.0, "passata": 1.5, "sauce": 4.0,
+        "coconut milk": 3.0, "wine": 8.0,
+    },
+    "count": {
+        "egg": 0.3, "bun": 0.25, "wrap": 0.3, "tortilla": 0.3, "pitta": 0.2, "naan": 0.6,
+        "lemon": 0.35, "lime": 0.3, "onion": 0.15, "avocado": 0.8, "banana": 0.15, "apple": 0.3,
+        "pepper": 0.5, "cucumber": 0.6, "lettuce": 0.6, "courgette": 0.4, "aubergine": 0.8,
+        "potato": 0.2, "carrot": 0.1, "tomato": 0.2, "croissant": 0.5, "bagel": 0.4, "muffin": 0.5,
+    },
+    "unit": {
+        "slice": 0.06, "clove": 0.05, "tin": 0.7, "can": 0.7, "jar": 1.5, "pack": 2.0, "packet": 2.0,
+        "bunch": 0.8, "bag": 1.5, "bottle": 2.0, "fillet": 2.0, "rasher": 0.25, "sheet": 0.2,
+        "pinch": 0.0, "dash": 0.0, "splash": 0.0, "drizzle": 0.0, "handful": 0.3, "knob": 0.1,
+    },
+}
+DEFAULT_PRICE = {"g": 5.0, "ml": 2.0, "count": 0.5}
+# How each shop prices against Sainsbury's; used when there's no price book
+# (prices.py) or it doesn't know an item
+STORE_INDEX = {"Waitrose": 1.22, "Sainsbury's": 1.0, "Tesco": 0.96, "Asda": 0.92, "Aldi": 0.83}
+
+
+def estimate_price(name, dim, unit, amount):
+    if amount is None:
+        return 0.0
+    if dim == "count" and unit in PRICE_HINTS["unit"]:
+        return round(amount * PRICE_HINTS["unit"][unit], 2)
+    table = PRICE_HINTS[dim]
+    hits = [k for k in table if k in name]
+    rate = table[max(hits, key=len)] if hits else DEFAULT_PRICE[dim]
+    scale = 1000 if dim in ("g", "ml") else 1
+    return round(amount / scale * rate, 2)
+
+
+def _plural(unit, amount):
+    if not unit or amount == 1:
+        return unit
+    return unit + ("es" if unit.endswith(("ch", "sh")) else "s")
+
+
+def format_quantity(amount, dim, unit=""):
+    if amount is None:
+        return ""
+    if dim == "g":
+        return f"{round(amount / 1000, 2):g}kg" if amount >= 1000 else f"{round(amount):g}g"
+    if dim == "ml":
+        if amount < 60 and (amount / 15).is_integer():
+            return f"{amount / 15:g} tbsp"
+        if amount < 60 and (amount * 4 / 5).is_integer():
+            return f"{amount / 5:g} tsp"
+        return f"{round(amount / 1000, 2):g}l" if amount >= 1000 else f"{round(amount):g}ml"
+    amount = round(amount, 2)
+    return f"{amount:g} {_plural(unit, amount)}".strip()
+
+
+class Basket:
+    # Running totals per (name, dim, unit); add(p, sign=-1) takes one back out
+    def __init__(self, totals=None):
+        self.totals = {} if totals is None else totals
+
+    def add(self, parsed, sign=1, price=None):
+        key = (parsed.name, parsed.dim, parsed.unit)
+        entry = self.totals.setdefault(key, {"amount": None, "unpriced": 0.0, "priced": 0.0, "n": 0})
+        if parsed.amount is not None:
+            entry["amount"] = (entry["amount"] or 0) + sign * parsed.amount
+            if price is None:
+                entry["unpriced"] += sign * parsed.amount
+        if price is not None:
+            entry["priced"] += sign * price
+        entry["n"] += sign
+        if entry["n"] <= 0:
+            del self.totals[key]
+
+    def price(self, key):
+        e = self.totals.get(key)
+        return e["priced"] + estimate_price(*key, e["unpriced"]) if e else 0.0
+
+    def item(self, key):
+        name, dim, unit = key
+        return {"item": name.title(), "quantity": format_quantity(self.totals[key]["amount"], dim, unit),
+                "est_price": round(self.price(key), 2)}
+
+    def items(self):
+        return [self.item(key) for key in sorted(self.totals)]
+
+
+def have_names(strings):
+    # Pantry / inventory entries as item names ("spinach (needs using)" -> "spinach")
+    return {n for n in (normalise_name(s) for s in strings) if n}
+
+def is_held(name, have):
+    # "rice" covers "basmati rice"
+    return any(name == h or name.endswith(" " + h) for h in have)
+
+
+# --- PER-SLOT LEDGER ---
+# The week's list kept as the sum of what each meal slot contributes
+# (Day_meal -> parsed ingredients). Replacing a slot takes its old lines back
+# out of the totals and adds the new ones, and the grand total moves by the
+# price change of just those items. The ledger is stored as is on the
+# family doc; changes() names the slots and items to write back.
+
+TOTAL_FIELDS = ("amount", "unpriced", "priced", "n")
+
+def total_key(key):
+    return "|".join(key)
+
+def src_hash(strings):
+    # Stands in for a slot's ingredient strings, to spot a changed meal
+    return hashlib.sha1(json.dumps(strings, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+class ShoppingLedger:
+    def __init__(self, stored=None):
+        stored = stored or {}
+        self.slots = dict(stored.get("slots", {}))
+        self.basket = Basket({tuple(k.split("|")): dict(zip(TOTAL_FIELDS, e)) for k, e in stored.get("totals", {}).items()})
+        self.total = stored.get("total", 0.0)
+        self._changed_slots = set()
+        self._changed_keys = set()
+
+    def needs(self, slot, src):
+        # False when the slot already holds exactly these ingredient strings
+        held = self.slots.get(slot)
+        if not src:
+            return held is not None
+        return held is None or held.get("src") != src_hash(src)
+
+    def _stored_total(self, key):
+        e = self.basket.totals.get(key)
+        return [e[f] for f in TOTAL_FIELDS] if e else None
+
+    def set_slot(self, slot, src, entries, unlisted=()):
+        # entries: [(Parsed, price or None)]; unlisted: strings left off the list
+        stored = None
+        if src:
+            stored = {"src": src_hash(src), "items": [list(p) + [price] for p, price in entries]}
+            if unlisted:
+                stored["unlisted"] = list(unlisted)
+        self.put_slot(slot, stored)
+
+    def put_slot(self, slot, stored):
+        # A slot as set_slot stores it (None = no ingredients), e.g. from
+        # another copy of the ledger; the totals move by the difference
+        old = [(Parsed(*row[:4]), row[4]) for row in self.slots.get(slot, {}).get("items", [])]
+        new = [(Parsed(*row[:4]), row[4]) for row in (stored or {}).get("items", [])]
+        keys = {(p.name, p.dim, p.unit) for p, _ in old + new}
+        before = sum(self.basket.price(k) for k in keys)
+        for p, price in old:
+            self.basket.add(p, sign=-1, price=price)
+        for p, price in new:
+            self.basket.add(p, price=price)
+        self.total = round(self.total + sum(self.basket.price(k) for k in keys) - before, 2)
+        if stored is not None:
+            self.slots[slot] = stored
+        else:
+            self.slots.pop(slot, None)
+        self._changed_slots.add(slot)
+        self._changed_keys |= keys
+
+    def changes(self):
+        # (("slots", slot) | ("totals", key) | ("total",)) -> new value, None if removed
+        out = {("slots", s): self.slots.get(s) for s in self._changed_slots}
+        for key in self._changed_keys:
+            out[("totals", total_key(key))] = self._stored_total(key)
+        if out:
+            out[("total",)] = self.total
+        return out
+
+    def to_dict(self):
+        return {"slots": self.slots, "totals": {total_key(k): self._stored_total(k) for k in self.basket.totals},
+                "total": self.total}
+
+    def items(self, have=()):
+        have = have_names(have)
+        return [self.basket.item(k) for k in sorted(self.basket.totals) if not is_held(k[0], have)]
+
+    def total_for(self, have=()):
+        # Grand total less what's already in the cupboard
+        have = have_names(have)
+        return round(self.total - sum(self.basket.price(k) for k in self.basket.totals if is_held(k[0], have)), 2)
+
+    def lines(self, have=()):
+        # (key, amount, est_price) per item still to buy, for prices.PriceBook
+        have = have_names(have)
+        return [(k, e["amount"], self.basket.price(k)) for k, e in sorted(self.basket.totals.items())
+                if not is_held(k[0], have)]
+
+    def unlisted(self):
+        return [s for slot in self.slots.values() for s in slot.get("unlisted", [])]
+
+
+def consolidate(strings):
+    # -> (items, unparsed strings the caller may send off for normalisation)
+    basket = Basket()
+    unparsed = []
+    for s in strings:
+        p = parse_ingredient(s)
+        if p is None:
+            unparsed.append(s)
+        else:
+            basket.add(p)
+    return basket, unparsed
+
+
+def parsed_from_llm(entry):
+    # Shape returned by the normalisation prompt: item / amount / unit (+ est_price)
+    name = normalise_name(str(entry.get("item", "")))
+    if not name:
+        return None
+    unit = str(entry.get("unit", "count")).lower()
+    info = _unit_info(unit) if unit not in ("count", "each", "") else ("count", "", 1)
+    dim, unit, factor = info or ("count", "", 1)
+    try:
+        amount = float(entry.get("amount")) * factor
+    except (TypeError, ValueError):
+        amount = None
+    return Parsed(amount, dim, unit, name)
+
+
+if __name__ == "__main__":
+    import time
+
+    def expected(fields):
+        # "2 | count | clove | garlic" -> Parsed, "-" -> None
+        if fields == ["-"]:
+            return None
+        amount, dim, unit, name = fields
+        return Parsed(None if amount == "-" else float(amount), dim, unit, name)
+
+    def same(got, want):
+        # Amounts to 3 places: the corpus writes 453.6, not 453.59999
+        if got is None or want is None or (got.amount is None) != (want.amount is None):
+            return got == want
+        return got[1:] == want[1:] and (got.amount is None or abs(got.amount - want.amount) < 1e-3)
+
+    with open("ingredient_corpus.txt", encoding="utf-8") as f:
+        cases = [[part.strip() for part in line.split("|")] for line in f if line.strip() and not line.startswith("#")]
+    corpus = [case[0] for case in cases]
+    start = time.perf_counter()
+    basket, unparsed = consolidate(corpus)
+    elapsed = time.perf_counter() - start
+    print(f"{len(corpus)} strings, {len(basket.totals)} items, {len(unparsed)} unparsed, "
+          f"{elapsed / len(corpus) * 1e6:.1f} µs/ingredient")
+    wrong = 0
+    for s, *fields in cases:
+        got, want = parse_ingredient(s), expected(fields)
+        if not same(got, want):
+            wrong += 1
+            print(f"  ✗ {s!r}: got {got}, expected {want}")
+    raise SystemExit(1 if wrong else 0)
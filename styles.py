@@ -0,0 +1,58 @@
+import re
+
+ALL_STYLES = [
+    "Jamie Oliver 15-Minute Meals (Quick, fresh, rustic)",
+    "Ottolenghi (Middle Eastern, veg-heavy, complex spices)",
+    "Italian Nonna (Classic pasta, slow sauces, comfort)",
+    "Mexican Street Food (Tacos, fresh salsas, grilled meats)",
+    "Japanese Izakaya (Rice bowls, teriyaki, miso, clean flavors)",
+    "Modern British (Roasts, pies, seasonal veg)",
+    "Thai Street Food (Pad Thai, curries, zesty salads)",
+    "Mediterranean Diet (Grilled fish, olive oil, salads)",
+    "American Diner (Burgers, mac n cheese, ribs)",
+    "French Bistro (Steak frites, quiches, rich sauces)",
+    "Indian Curry House (Rich curries, naan, tandoori)",
+    "Greek Taverna (Souvlaki, fresh salads, feta)"
+]
+
+# Short codes the compact prompts use instead of the full labels
+STYLE_CODES = dict(zip(
+    ["JAM", "OTT", "ITA", "MEX", "JAP", "BRI", "THA", "MED", "AME", "FRE", "IND", "GRE"],
+    ALL_STYLES,
+))
+CODE_FOR_STYLE = {style: code for code, style in STYLE_CODES.items()}
+
+# Too generic to identify a style on their own
+GENERIC_WORDS = {"meals", "minute", "house", "modern", "street", "food"}
+
+def _norm(text):
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+def _build_lookup():
+    # Exact keys per style: the full label, the name before "(", and any word
+    # of that name no other style shares ("italian", "british", "izakaya").
+    # Built once at import.
+    heads = {style: _norm(style.split("(")[0]) for style in ALL_STYLES}
+    counts = {}
+    for head in heads.values():
+        for word in set(head.split(" ")):
+            counts[word] = counts.get(word, 0) + 1
+    lookup = {}
+    for style, head in heads.items():
+        lookup.setdefault(_norm(style), style)
+        lookup.setdefault(head, style)
+        for word in head.split(" "):
+            if counts[word] == 1 and word not in GENERIC_WORDS and not word.isdigit():
+                lookup.setdefault(word, style)
+    return lookup
+
+STYLE_LOOKUP = _build_lookup()
+
+def match_style(tag):
+    # style_tag as written by the model -> one of ALL_STYLES, or None
+    if not tag:
+        return None
+    for key in (_norm(tag), _norm(tag.split("(")[0])):
+        if key in STYLE_LOOKUP:
+            return STYLE_LOOKUP[key]
+    return next((STYLE_LOOKUP[w] for w in _norm(tag).split(" ") if w in STYLE_LOOKUP), None)